@@ -0,0 +1,179 @@
+"""Deterministic offline stand-ins for the LLM, embedding and arXiv backends.
+
+Everything here is seeded from the input text, so two runs over the same
+inputs produce the same outputs, and simulated latency is the only thing
+that takes wall time:
+
+- ``FakeChatModel`` - a LangChain chat model shaped like ``ChatOpenAI``
+  (``model_name`` / ``temperature`` / ``max_tokens``, ``usage_metadata``,
+  streaming) that waits ``latency`` seconds before the first token and then
+  emits ``tokens_per_second``;
+- ``FakeEmbeddings`` - unit vectors drawn from a generator seeded by the
+  text's hash;
+- ``LocalArxiv`` - an ``ArxivTool`` look-alike over a synthetic corpus,
+  ranked by word overlap.
+
+``fake_client_factory`` plugs the chat model into ``ModelRegistry`` /
+``build_graph(client_factory=...)``.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+import xxhash
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.tools.arxiv_tool import ArxivPaper
+
+WORDS = (
+    "attention retrieval graph sparse transformer embedding benchmark latency agent memory "
+    "index vector token prompt corpus citation survey method dataset evaluation baseline "
+    "scaling inference training gradient quantization cache pipeline synthesis gap review"
+).split()
+
+
+def _seed(text: str) -> int:
+    return xxhash.xxh64_intdigest(text)
+
+
+def _words(text: str, count: int) -> List[str]:
+    rng = np.random.default_rng(_seed(text))
+    return [WORDS[i] for i in rng.integers(0, len(WORDS), size=count)]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model with simulated latency and deterministic replies.
+    Usage:
+        llm = FakeChatModel(latency=0.05, tokens_per_second=400, response_tokens=64)
+        llm.invoke("prompt").content
+    """
+    model_name: str = "fake-gpt"
+    temperature: float = 0.0
+    max_tokens: int = 4096
+    latency: float = 0.05
+    tokens_per_second: float = 400.0
+    response_tokens: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        return [w + " " for w in _words(prompt, min(self.response_tokens, self.max_tokens))]
+
+    def _usage(self, messages: List[BaseMessage], tokens: List[str]) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return {"input_tokens": prompt_tokens, "output_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)}
+
+    def _duration(self, tokens: List[str]) -> float:
+        return self.latency + len(tokens) / self.tokens_per_second
+
+    def _result(self, messages, tokens) -> ChatResult:
+        message = AIMessage(content="".join(tokens).strip(), usage_metadata=self._usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        tokens = self._reply(messages)
+        time.sleep(self._duration(tokens))
+        return self._result(messages, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._reply(messages)
+        await asyncio.sleep(self._duration(tokens))
+        return self._result(messages, tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self._reply(messages)
+        time.sleep(self.latency)
+        for i in range(len(tokens)):
+            if i:
+                time.sleep(1 / self.tokens_per_second)
+            yield self._chunk(messages, tokens, i)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for i in range(len(tokens)):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield self._chunk(messages, tokens, i)
+
+    def _chunk(self, messages, tokens, i) -> ChatGenerationChunk:
+        # Usage rides on the last chunk, as with OpenAI's stream_options.
+        usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+        return ChatGenerationChunk(message=AIMessageChunk(content=tokens[i], usage_metadata=usage))
+
+
+def fake_client_factory(latency: float = 0.05, tokens_per_second: float = 400.0, response_tokens: int = 64):
+    """A ``ModelRegistry`` client factory returning ``FakeChatModel`` instances."""
+    def create(model_name, temperature, max_tokens):
+        return FakeChatModel(
+            model_name=model_name, temperature=temperature, max_tokens=max_tokens,
+            latency=latency, tokens_per_second=tokens_per_second, response_tokens=response_tokens,
+        )
+    return create
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors; ``latency`` is charged once per call."""
+    def __init__(self, dimension: int = 128, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.model = f"fake-embedding-{dimension}"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class LocalArxiv:
+    """
+    ``ArxivTool`` stand-in: ``search`` yields ``ArxivPaper`` records from a
+    synthetic corpus of ``size`` papers, best word overlap first.
+    """
+    def __init__(self, size: int = 500, abstract_words: int = 150, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.papers = []
+        for i in range(size):
+            title = " ".join(_words(f"title-{seed}-{i}", 6)).title()
+            self.papers.append(ArxivPaper(
+                arxiv_id=f"2401.{i:05d}",
+                title=title,
+                authors=[f"Author {i % 97}", f"Author {(i * 7) % 89}"],
+                abstract=" ".join(_words(f"abstract-{seed}-{i}", abstract_words)),
+                published="2024-01-01",
+                url=f"http://arxiv.org/abs/2401.{i:05d}",
+            ))
+        self._terms = [set((p.title + " " + p.abstract).lower().split()) for p in self.papers]
+
+    def search(self, query: str, max_results: Optional[int] = None) -> Iterator[ArxivPaper]:
+        if self.latency:
+            time.sleep(self.latency)
+        words = set(query.lower().split())
+        scores = [len(words & terms) for terms in self._terms]
+        ranked = sorted(range(len(self.papers)), key=lambda i: (-scores[i], i))
+        for i in ranked[: max_results or 10]:
+            yield self.papers[i]
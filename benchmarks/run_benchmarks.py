@@ -0,0 +1,318 @@
+"""
+Offline performance benchmarks for the research graph and the FAISS store.
+
+Usage::
+
+    python -m benchmarks.run_benchmarks                  # run, compare with baselines.json
+    python -m benchmarks.run_benchmarks --quick          # fewer runs / smaller corpora
+    python -m benchmarks.run_benchmarks --save-baseline  # record the current numbers
+    python -m benchmarks.run_benchmarks --quick --shards 1,2,4,8,16   # other shard counts
+
+Nothing touches the network: the real graph from ``build_graph`` runs with
+the stand-ins of ``benchmarks/fakes.py`` (simulated LLM latency and token
+rate, hash-seeded embeddings, a synthetic arXiv corpus).  Measured:
+
+- ``graph.*`` - ``runs`` end-to-end ``graph.ainvoke`` calls, ``concurrency``
+  at a time: throughput, p50 / p99 latency, and the peak Python heap
+  allocated by one run (tracemalloc, sequential runs);
+- ``faiss.*@N`` - ``FAISSTool`` add throughput and p50 query latency for a
+  corpus of N documents, unfiltered and with a metadata filter matching a
+  fifth of the corpus;
+- ``shards.*@N`` - ``ShardedFAISSTool`` with N worker processes (the
+  profile's ``shard_counts``, or ``--shards 1,2,4,8,16``) over one random
+  corpus of ``shard_corpus`` vectors: add throughput, p50 query latency, and
+  query throughput with 8 client threads querying at once.  Speed-ups need
+  N free cores.
+
+Each metric family has a direction and a tolerance in ``THRESHOLDS``; a
+metric worse than its ``baselines.json`` value by more than the tolerance
+(and the absolute slack) is a regression and the command exits with status 1.
+A metric with no baseline value is listed as such, since it cannot be
+checked; re-record the baselines whenever a benchmark gains a metric.
+Baselines are machine-specific: record them on the machine (or CI runner
+class) that compares against them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from benchmarks.fakes import FakeEmbeddings, LocalArxiv, fake_client_factory
+from src.orchestration.config import load_config
+from src.orchestration.graph_builder import build_graph
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+
+# direction: which way is better; tolerance: allowed relative regression;
+# slack: absolute change always tolerated (keeps sub-millisecond timings from flapping).
+THRESHOLDS = {
+    "graph.throughput_runs_per_s": {"direction": "higher", "tolerance": 0.25},
+    "graph.latency_p50_ms": {"direction": "lower", "tolerance": 0.25, "slack": 20.0},
+    "graph.latency_p99_ms": {"direction": "lower", "tolerance": 0.40, "slack": 50.0},
+    "graph.memory_peak_kib_per_run": {"direction": "lower", "tolerance": 0.25, "slack": 64.0},
+    "faiss.add_docs_per_s": {"direction": "higher", "tolerance": 0.35},
+    "faiss.query_p50_ms": {"direction": "lower", "tolerance": 0.50, "slack": 0.25},
+    "faiss.filtered_query_p50_ms": {"direction": "lower", "tolerance": 0.50, "slack": 0.25},
+    "shards.add_vectors_per_s": {"direction": "higher", "tolerance": 0.35},
+    "shards.query_p50_ms": {"direction": "lower", "tolerance": 0.50, "slack": 0.5},
+    "shards.queries_per_s": {"direction": "higher", "tolerance": 0.35},
+}
+
+PROFILES = {
+    "full": {"runs": 64, "concurrency": 8, "memory_runs": 5, "corpus_sizes": [1000, 10000, 50000],
+             "shard_counts": [1, 2, 4], "shard_corpus": 200000},
+    "quick": {"runs": 16, "concurrency": 4, "memory_runs": 2, "corpus_sizes": [1000, 5000],
+              "shard_counts": [2], "shard_corpus": 20000},
+}
+
+EMBEDDING_DIMENSION = 128
+
+
+def benchmark_config() -> dict:
+    """config.yaml with everything that would touch disk or the network switched to local stand-ins."""
+    cfg = load_config()
+    cfg.update(
+        model_name="gpt-4o-mini",
+        checkpointer={"backend": "memory"},
+        artifact_store={"backend": "memory"},
+        llm_cache={"enabled": False},
+        vector_store_path=None,
+        embedding_dimension=EMBEDDING_DIMENSION,
+        vector_index={"type": "flat"},
+        embedding_cache=None,
+    )
+    search_cfg = dict(cfg.get("literature_search") or {})
+    search_cfg["sources"] = ["arxiv", "faiss"]
+    cfg["literature_search"] = search_cfg
+    return cfg
+
+
+def job(i: int) -> dict:
+    """Input of benchmark run ``i``: distinct questions, content large enough for real prompts."""
+    words = " ".join(f"finding {j} on sparse attention for retrieval" for j in range(200))
+    return {
+        "topic": "efficient transformers",
+        "research_question": f"How does sparse attention affect retrieval quality? (variant {i})",
+        "inclusion_criteria": ["peer reviewed", "2020 or later"],
+        "artifacts": {"to_summarize": words, "to_analyze": words, "extracted_data": words,
+                      "query_text": "sparse attention", "k": 5},
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_graph(runs: int, concurrency: int, memory_runs: int, llm_latency: float, tokens_per_second: float) -> Dict[str, float]:
+    research = build_graph(
+        benchmark_config(),
+        client_factory=fake_client_factory(latency=llm_latency, tokens_per_second=tokens_per_second),
+        arxiv_tool=LocalArxiv(),
+        embeddings=FakeEmbeddings(EMBEDDING_DIMENSION),
+    )
+    graph = research.graph
+    research.vector_index.faiss_tool.add_documents(
+        [Document(page_content=p.abstract, metadata={"title": p.title}) for p in LocalArxiv(size=200, seed=1).papers]
+    )
+
+    async def run_one(i: int, slots: asyncio.Semaphore, latencies: List[float]):
+        async with slots:
+            start = time.perf_counter()
+            await graph.ainvoke(job(i), {"configurable": {"thread_id": f"bench-{i}"}})
+            latencies.append(time.perf_counter() - start)
+
+    async def run_all() -> List[float]:
+        slots = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        await asyncio.gather(*(run_one(i, slots, latencies) for i in range(runs)))
+        return latencies
+
+    asyncio.run(run_one(-1, asyncio.Semaphore(1), []))   # warm-up: lazy clients, imports
+    start = time.perf_counter()
+    latencies = asyncio.run(run_all())
+    wall = time.perf_counter() - start
+
+    peaks = []
+    tracemalloc.start()
+    for i in range(memory_runs):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        asyncio.run(run_one(runs + i, asyncio.Semaphore(1), []))
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    research.close()
+
+    return {
+        "graph.throughput_runs_per_s": runs / wall,
+        "graph.latency_p50_ms": percentile(latencies, 50) * 1000,
+        "graph.latency_p99_ms": percentile(latencies, 99) * 1000,
+        "graph.memory_peak_kib_per_run": statistics.mean(peaks) / 1024,
+    }
+
+
+def bench_faiss(corpus_sizes: List[int], queries: int = 50) -> Dict[str, float]:
+    from src.tools.faiss_tool import FAISSTool
+
+    embeddings = FakeEmbeddings(EMBEDDING_DIMENSION)
+    corpus = LocalArxiv(size=max(corpus_sizes), abstract_words=60, seed=2).papers
+    results = {}
+    for size in corpus_sizes:
+        tool = FAISSTool(embeddings, dimension=EMBEDDING_DIMENSION)
+        docs = [Document(page_content=f"{p.arxiv_id} {p.abstract}", metadata={"year": 2015 + i % 10})
+                for i, p in enumerate(corpus[:size])]
+        start = time.perf_counter()
+        for batch in range(0, size, 1000):
+            tool.add_documents(docs[batch: batch + 1000])
+        results[f"faiss.add_docs_per_s@{size}"] = size / (time.perf_counter() - start)
+        timings = []
+        for q in range(queries):
+            start = time.perf_counter()
+            tool.similarity_search(f"query {q} sparse attention retrieval", k=10)
+            timings.append(time.perf_counter() - start)
+        results[f"faiss.query_p50_ms@{size}"] = percentile(timings, 50) * 1000
+        timings = []
+        for q in range(queries):
+            start = time.perf_counter()
+            tool.similarity_search(f"query {q} sparse attention retrieval", k=10, filter={"year": {"$gte": 2023}})
+            timings.append(time.perf_counter() - start)
+        results[f"faiss.filtered_query_p50_ms@{size}"] = percentile(timings, 50) * 1000
+    return results
+
+
+def bench_shards(shard_counts: List[int], corpus_size: int, queries: int = 200,
+                 clients: int = 8) -> Dict[str, float]:
+    from src.tools.sharded_faiss import ShardedFAISSTool
+
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((corpus_size, EMBEDDING_DIMENSION), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probes = vectors[rng.choice(corpus_size, queries, replace=False)]
+    texts = [f"doc {i}" for i in range(corpus_size)]
+    results = {}
+    for shards in shard_counts:
+        with ShardedFAISSTool(FakeEmbeddings(EMBEDDING_DIMENSION), shards=shards,
+                              dimension=EMBEDDING_DIMENSION) as tool:
+            start = time.perf_counter()
+            for batch in range(0, corpus_size, 10000):
+                tool.add_embeddings(texts[batch: batch + 10000], vectors[batch: batch + 10000])
+            results[f"shards.add_vectors_per_s@{shards}"] = corpus_size / (time.perf_counter() - start)
+            timings = []
+            for probe in probes:
+                start = time.perf_counter()
+                tool.similarity_search_by_vectors([probe], k=10)
+                timings.append(time.perf_counter() - start)
+            results[f"shards.query_p50_ms@{shards}"] = percentile(timings, 50) * 1000
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                start = time.perf_counter()
+                list(pool.map(lambda probe: tool.similarity_search_by_vectors([probe], k=10), probes))
+                results[f"shards.queries_per_s@{shards}"] = queries / (time.perf_counter() - start)
+    return results
+
+
+def threshold_for(metric: str) -> dict:
+    return THRESHOLDS[metric.split("@", 1)[0]]
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float]) -> List[str]:
+    """Human-readable regressions of ``current`` against ``baseline``."""
+    regressions = []
+    for metric, base in baseline.items():
+        if metric not in current or not base:
+            continue
+        rule = threshold_for(metric)
+        delta = current[metric] - base
+        if rule["direction"] == "higher":
+            delta = -delta
+        worse = delta / base
+        if worse > rule["tolerance"] and delta > rule.get("slack", 0.0):
+            regressions.append(
+                f"{metric}: {current[metric]:.2f} vs baseline {base:.2f} "
+                f"({worse:+.0%} worse, tolerance {rule['tolerance']:.0%})"
+            )
+    return regressions
+
+
+def unbaselined(current: Dict[str, float], baseline: Dict[str, float]) -> List[str]:
+    """Metrics of ``current`` that ``compare`` cannot check because ``baseline`` lacks them."""
+    return [metric for metric in current if metric not in baseline]
+
+
+def profile_metrics(profile: str, shard_counts: Optional[List[int]] = None) -> List[str]:
+    """Names of the metrics ``run(profile)`` reports."""
+    settings = PROFILES[profile]
+    metrics = [metric for metric in THRESHOLDS if metric.startswith("graph.")]
+    for size in settings["corpus_sizes"]:
+        metrics += [f"{metric}@{size}" for metric in THRESHOLDS if metric.startswith("faiss.")]
+    for shards in shard_counts or settings["shard_counts"]:
+        metrics += [f"{metric}@{shards}" for metric in THRESHOLDS if metric.startswith("shards.")]
+    return metrics
+
+
+def run(profile: str, llm_latency: float, tokens_per_second: float, shard_counts: Optional[List[int]] = None,
+        shard_corpus: Optional[int] = None) -> Dict[str, float]:
+    settings = PROFILES[profile]
+    results = bench_graph(settings["runs"], settings["concurrency"], settings["memory_runs"],
+                          llm_latency, tokens_per_second)
+    results.update(bench_faiss(settings["corpus_sizes"]))
+    results.update(bench_shards(shard_counts or settings["shard_counts"], shard_corpus or settings["shard_corpus"]))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline graph and FAISS benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="Smaller run counts and corpora.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_PATH.name}.")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file to compare with.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM time to first token (s).")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Fake LLM output rate.")
+    parser.add_argument("--shards", help="Comma-separated shard counts for the sharded-index benchmark, "
+                                         "e.g. 1,2,4,8,16 (default: the profile's).")
+    parser.add_argument("--shard-corpus", type=int, help="Vectors in the sharded-index corpus (default: the profile's).")
+    args = parser.parse_args(argv)
+
+    profile = "quick" if args.quick else "full"
+    shard_counts = [int(n) for n in args.shards.split(",")] if args.shards else None
+    results = run(profile, args.llm_latency, args.tokens_per_second, shard_counts, args.shard_corpus)
+    for metric, value in results.items():
+        print(f"{metric:40s} {value:12.2f}")
+
+    baseline_path = Path(args.baseline)
+    baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if args.save_baseline:
+        baselines[profile] = {
+            "metrics": {k: round(v, 3) for k, v in results.items()},
+            "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                            "llm_latency": args.llm_latency, "tokens_per_second": args.tokens_per_second},
+        }
+        baseline_path.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"Saved {profile} baseline to {baseline_path}")
+        return 0
+
+    if profile not in baselines:
+        print(f"No {profile} baseline in {baseline_path}; run with --save-baseline first.")
+        return 0
+    regressions = compare(results, baselines[profile]["metrics"])
+    for metric in unbaselined(results, baselines[profile]["metrics"]):
+        print("NO BASELINE", metric)
+    for line in regressions:
+        print("REGRESSION", line)
+    print("OK" if not regressions else f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,9 @@ registered in a ``StateGraph``.
 
 The key improvements over the previous per-file implementations are:
 --------------------------------------------------------------------
-• **Single-source LLM initialisation** - all nodes call ``initialize_llm`` to
-  ensure consistent temperature / token limits across the workflow.
+• **Single-source LLM initialisation** - all nodes get their model from a
+  ``ModelRegistry`` (per-role settings from config.yaml, clients and HTTP
+  connection pools shared) or, without one, from ``initialize_llm``.
 • **Unified response handling** - agent-specific post-processing is delegated
   to ``handle_agent_response``, guaranteeing state updates follow a standard
   schema recognised by downstream components.
@@ -17,21 +18,62 @@ The key improvements over the previous per-file implementations are:
   parsing the response) lives in the private helper ``_invoke_and_route``.
 • **Easier maintenance** - adding a new role requires only a specialised
   ``build_prompt`` callback (if the default signature isn't sufficient).
+• **Sync and async execution** - every factory returns a runnable carrying both
+  a blocking and a coroutine implementation, so ``graph.invoke`` and
+  ``graph.ainvoke`` use the same node definitions.
+• **Response caching** - factories accept an optional ``LLMResponseCache`` that
+  ``_invoke_and_route`` consults before calling the model.
+• **Request coalescing** - concurrent identical calls (same model settings
+  and prompt) share one provider request.
+• **Instrumentation** - every LLM call (latency, time to first token, tokens,
+  estimated cost, cache hits) is reported to the node's span; see
+  ``src/orchestration/instrumentation.py``.
+• **Routing plans** - the supervisor's reply is a structured plan that lets
+  a pass skip agents and bounds the review loop; see
+  ``src/orchestration/routing.py``.
+• **Token budgets** - the summarizer and synthesizer accept a ``TokenBudget``;
+  content that does not fit is map-reduce summarized first
+  (``src/agents/map_reduce.py``) and the final prompt is capped.
 """
 from __future__ import annotations
 
-from typing import Callable, Any, Dict
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Any, Dict
 
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from src.agents.map_reduce import MapReduceSummarizer
+from src.orchestration.instrumentation import FirstTokenTimer, record_llm_call, timed_call_config
+from src.orchestration.llm_cache import LLMResponseCache, is_cache_bypassed, llm_identity, make_cache_key
+from src.orchestration.rate_limit import estimate_tokens, limiter_for
+from src.orchestration.routing import RoutingPolicy, parse_plan
+from src.orchestration.single_flight import SingleFlight
 from src.orchestration.llm_model import (
+    ModelRegistry,
     initialize_llm,
     handle_agent_response,
+    parse_llm_response,
 )
 from src.prompts.prompt_manager import PromptManager
+from src.prompts.token_budget import TokenBudget
 from src.orchestration.state import AppState, format_dynamic_block
+from src.tools.multi_source_search import (
+    ArxivSource,
+    MultiSourceSearch,
+    compact_records,
+    document_record,
+    format_search_results,
+)
 
-# Optional tool imports - only initialised inside the node to avoid heavy
-# imports when not required.
-from langchain_openai import ChatOpenAI  # type: ignore  # used for type hints
+# Provider SDKs are only imported when a client is created (see ModelRegistry);
+# importing this module stays cheap.
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# Identical LLM calls in flight at the same time (concurrent runs of the same
+# question) are made once; see src/orchestration/single_flight.py.
+LLM_FLIGHTS = SingleFlight("llm")
 
 # --------------------------------------------------------------------------------------
 # Internal helpers
@@ -42,6 +84,8 @@ def _invoke_and_route(
     llm: ChatOpenAI,
     prompt: str,
     extra_update: Dict[str, Any] | None = None,
+    cache: LLMResponseCache | None = None,
+    config: RunnableConfig | None = None,
 ) -> Dict[str, Any]:
     """Run the LLM *once* and map its output to a LangGraph state update.
 
@@ -56,10 +100,103 @@ def _invoke_and_route(
     extra_update : dict | None
         Optional additional mutations to merge into ``handle_agent_response``
         output (e.g. raw search results).
+    cache : LLMResponseCache | None
+        Optional response cache consulted before calling the LLM.
+    config : RunnableConfig | None
+        The node's run config; ``configurable["bypass_llm_cache"]`` disables
+        ``cache`` for this run and ``configurable["rate_limits"]`` schedules
+        the call against a provider rate limiter.
     """
-    raw_response = llm.invoke(prompt)
-    update_dict = handle_agent_response(agent_name, raw_response)
-
+    cache, key = _cache_lookup_key(llm, prompt, cache, config)
+    raw_response = cache.get(key) if cache else None
+    if raw_response is None:
+        def call():
+            limiter = limiter_for(llm, config)
+            if limiter:
+                estimate = estimate_tokens(llm, prompt)
+                limiter.acquire(estimate)
+            timer = FirstTokenTimer()
+            response = llm.invoke(prompt, config=timed_call_config(timer))
+            _record_call(llm, prompt, response, timer)
+            if limiter:
+                limiter.settle(estimate, response)
+            if cache:
+                cache.set(key, parse_llm_response(response))
+            return response
+
+        # An identical call already in flight (another run, same prompt) is shared.
+        raw_response, leader = LLM_FLIGHTS.do(_flight_key(llm, prompt), call)
+        if not leader:
+            record_llm_call(llm, prompt, coalesced=True)
+    elif cache:
+        record_llm_call(llm, prompt, cached=True)
+    return _merge_update(handle_agent_response(agent_name, raw_response), extra_update)
+
+
+async def _ainvoke_and_route(
+    agent_name: str,
+    llm: ChatOpenAI,
+    prompt: str,
+    extra_update: Dict[str, Any] | None = None,
+    cache: LLMResponseCache | None = None,
+    config: RunnableConfig | None = None,
+) -> Dict[str, Any]:
+    """Async counterpart of ``_invoke_and_route`` using ``llm.ainvoke``."""
+    cache, key = _cache_lookup_key(llm, prompt, cache, config)
+    raw_response = cache.get(key) if cache else None
+    if raw_response is None:
+        async def call():
+            limiter = limiter_for(llm, config)
+            if limiter:
+                estimate = estimate_tokens(llm, prompt)
+                await limiter.aacquire(estimate)
+            timer = FirstTokenTimer()
+            response = await llm.ainvoke(prompt, config=timed_call_config(timer))
+            _record_call(llm, prompt, response, timer)
+            if limiter:
+                limiter.settle(estimate, response)
+            if cache:
+                cache.set(key, parse_llm_response(response))
+            return response
+
+        raw_response, leader = await LLM_FLIGHTS.ado(_flight_key(llm, prompt), call)
+        if not leader:
+            record_llm_call(llm, prompt, coalesced=True)
+    elif cache:
+        record_llm_call(llm, prompt, cached=True)
+    return _merge_update(handle_agent_response(agent_name, raw_response), extra_update)
+
+
+def _flight_key(llm: ChatOpenAI, prompt: str) -> str:
+    return make_cache_key(*llm_identity(llm), prompt)
+
+
+def _cache_lookup_key(
+    llm: ChatOpenAI,
+    prompt: str,
+    cache: LLMResponseCache | None,
+    config: RunnableConfig | None,
+) -> tuple:
+    """Return ``(cache, key)``, or ``(None, None)`` if caching is off for this run."""
+    if cache is None or is_cache_bypassed(config):
+        return None, None
+    return cache, cache.key_for(llm, prompt)
+
+
+def _record_call(llm, prompt: str, response, timer: FirstTokenTimer) -> None:
+    """Report a completed (uncached) call to the node's instrumentation span."""
+    record_llm_call(
+        llm, prompt, response,
+        seconds=time.perf_counter() - timer.start,
+        first_token=timer.first_token,
+    )
+
+
+def _merge_update(
+    update_dict: Dict[str, Any],
+    extra_update: Dict[str, Any] | None,
+) -> Dict[str, Any]:
+    """Merge ``extra_update`` into a ``handle_agent_response`` result."""
     if extra_update:
         # Merge without clobbering existing keys.
         target = update_dict.setdefault("update", {})
@@ -72,42 +209,158 @@ def _invoke_and_route(
     return update_dict
 
 
+def _llm_for(role: str, models: ModelRegistry | None):
+    """
+    The role's configured model, or the ``initialize_llm`` default. Registry
+    clients are deferred: building the graph creates no provider client.
+    """
+    return models.for_role(role, lazy=True) if models is not None else initialize_llm()
+
+
+def _budget_kwargs(reducer: MapReduceSummarizer | None) -> Dict[str, Any]:
+    """``PromptManager.build`` arguments capping the prompt at the budget."""
+    if reducer is None:
+        return {}
+    return {"token_budget": reducer.budget.max_input_tokens, "model": reducer.model}
+
+
+def _fit_content(
+    reducer: MapReduceSummarizer | None,
+    prompt_manager: PromptManager,
+    prompt_kwargs: Dict[str, Any],
+    content: str,
+    config: RunnableConfig | None,
+) -> str:
+    """Map-reduce ``content`` down to the room the rest of the prompt leaves."""
+    if reducer is None:
+        return content
+    room = prompt_manager.available_tokens(**prompt_kwargs, **_budget_kwargs(reducer))
+    return reducer.reduce_to(content, room, config)
+
+
+async def _afit_content(
+    reducer: MapReduceSummarizer | None,
+    prompt_manager: PromptManager,
+    prompt_kwargs: Dict[str, Any],
+    content: str,
+    config: RunnableConfig | None,
+) -> str:
+    """Async counterpart of ``_fit_content``."""
+    if reducer is None:
+        return content
+    room = prompt_manager.available_tokens(**prompt_kwargs, **_budget_kwargs(reducer))
+    return await reducer.areduce_to(content, room, config)
+
+
+def _as_node(name: str, func: Callable, afunc: Callable) -> RunnableLambda:
+    """Bundle the sync and async implementations of a node into one runnable."""
+    return RunnableLambda(func, afunc=afunc, name=name)
+
+
 # --------------------------------------------------------------------------------------
 # Public factory functions
 # --------------------------------------------------------------------------------------
 
-def supervisor_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]:
-    llm = initialize_llm()
+def supervisor_node(
+    prompt_manager: PromptManager,
+    cache: LLMResponseCache | None = None,
+    models: ModelRegistry | None = None,
+    policy: RoutingPolicy | None = None,
+    corpus: Any = None,
+) -> RunnableLambda:
+    """The Supervisor issues a directive and the routing plan for the pass.
+
+    The reply is read as a ``SupervisorPlan`` and ``policy`` applies its
+    rules on top (``src/orchestration/routing.py``); ``corpus`` (the
+    VectorIndex node) is checked for documents that already answer the
+    question.  Writes ``plan``, ``iteration_count`` and, when the corpus
+    replaces the literature search, ``artifacts.corpus_hits``.
+    """
+    llm = _llm_for("supervisor", models)
+    policy = policy or RoutingPolicy()
+    prompt_manager.validate(role="expert_supervisor", fields=("dynamic_state",))
 
-    def node(state: AppState):
-        prompt = prompt_manager.build(
+    def build_prompt(state: AppState) -> str:
+        return prompt_manager.build(
             role="expert_supervisor",
             dynamic_state=format_dynamic_block(state),
         )
-        return _invoke_and_route("supervisor", llm, prompt)
 
-    return node
+    def with_plan(state: AppState, result: Dict[str, Any], hits: list) -> Dict[str, Any]:
+        update = result["update"]
+        plan = policy.plan(state, parse_plan(update["supervisor_directives"][0]), hits)
+        update["supervisor_directives"] = [plan.directive] if plan.directive else []
+        update["plan"] = plan.to_state()
+        update["iteration_count"] = state.get("iteration_count", 0) + 1
+        if hits and "LiteratureSearch" in plan.skip and not plan.done:
+            records = [document_record(doc) for doc, _ in hits]
+            update.setdefault("artifacts", {})["corpus_hits"] = compact_records(records)
+        return result
+
+    def node(state: AppState, config: RunnableConfig):
+        hits = policy.corpus_hits(corpus, state)
+        result = _invoke_and_route(
+            "supervisor", llm, build_prompt(state), cache=cache, config=config
+        )
+        return with_plan(state, result, hits)
 
+    async def anode(state: AppState, config: RunnableConfig):
+        hits = await asyncio.to_thread(policy.corpus_hits, corpus, state)
+        result = await _ainvoke_and_route(
+            "supervisor", llm, build_prompt(state), cache=cache, config=config
+        )
+        return with_plan(state, result, hits)
 
-def summarizer_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]:
-    llm = initialize_llm()
+    return _as_node("Supervisor", node, anode)
 
-    def node(state: AppState):
-        prompt = prompt_manager.build(
-            role="synthesizer_writer",
-            dynamic_state=format_dynamic_block(state),
-            content=state.get("artifacts", {}).get("to_summarize", ""),
+
+def summarizer_node(
+    prompt_manager: PromptManager,
+    cache: LLMResponseCache | None = None,
+    budget: TokenBudget | None = None,
+    models: ModelRegistry | None = None,
+) -> RunnableLambda:
+    llm = _llm_for("summarizer", models)
+    prompt_manager.validate(role="synthesizer_writer", fields=("dynamic_state", "content"))
+    reducer = MapReduceSummarizer(llm, prompt_manager, budget, cache=cache) if budget else None
+
+    def prompt_kwargs(state: AppState) -> Dict[str, Any]:
+        return dict(role="synthesizer_writer", dynamic_state=format_dynamic_block(state))
+
+    def content_of(state: AppState) -> str:
+        return str(state.get("artifacts", {}).get("to_summarize", ""))
+
+    def build_prompt(state: AppState, content: str) -> str:
+        return prompt_manager.build(**prompt_kwargs(state), content=content, **_budget_kwargs(reducer))
+
+    def node(state: AppState, config: RunnableConfig):
+        content = _fit_content(reducer, prompt_manager, prompt_kwargs(state), content_of(state), config)
+        return _invoke_and_route(
+            "summarizer", llm, build_prompt(state, content), cache=cache, config=config
+        )
+
+    async def anode(state: AppState, config: RunnableConfig):
+        content = await _afit_content(reducer, prompt_manager, prompt_kwargs(state), content_of(state), config)
+        return await _ainvoke_and_route(
+            "summarizer", llm, build_prompt(state, content), cache=cache, config=config
         )
-        return _invoke_and_route("summarizer", llm, prompt)
 
-    return node
+    return _as_node("Summarizer", node, anode)
 
 
-def gap_finder_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]:
-    llm = initialize_llm()
+def gap_finder_node(
+    prompt_manager: PromptManager,
+    cache: LLMResponseCache | None = None,
+    models: ModelRegistry | None = None,
+) -> RunnableLambda:
+    llm = _llm_for("gap_finder", models)
+    prompt_manager.validate(
+        role="screening_specialist",
+        fields=("dynamic_state", "content", "research_topic", "existing_research", "desired_outcome"),
+    )
 
-    def node(state: AppState):
-        prompt = prompt_manager.build(
+    def build_prompt(state: AppState) -> str:
+        return prompt_manager.build(
             role="screening_specialist",
             dynamic_state=format_dynamic_block(state),
             content=state.get("artifacts", {}).get("to_analyze", ""),
@@ -115,25 +368,62 @@ def gap_finder_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]
             existing_research=state.get("artifacts", {}).get("existing_research", ""),
             desired_outcome=state.get("artifacts", {}).get("desired_outcome", ""),
         )
-        return _invoke_and_route("gap_finder", llm, prompt)
-
-    return node
 
+    def node(state: AppState, config: RunnableConfig):
+        return _invoke_and_route(
+            "gap_finder", llm, build_prompt(state), cache=cache, config=config
+        )
 
-def synthesizer_writer_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]:
-    llm = initialize_llm()
+    async def anode(state: AppState, config: RunnableConfig):
+        return await _ainvoke_and_route(
+            "gap_finder", llm, build_prompt(state), cache=cache, config=config
+        )
 
-    def node(state: AppState):
-        prompt = prompt_manager.build(
+    return _as_node("GapFinder", node, anode)
+
+
+def synthesizer_writer_node(
+    prompt_manager: PromptManager,
+    cache: LLMResponseCache | None = None,
+    budget: TokenBudget | None = None,
+    models: ModelRegistry | None = None,
+) -> RunnableLambda:
+    llm = _llm_for("synthesizer_writer", models)
+    prompt_manager.validate(
+        role="synthesizer_writer", fields=("dynamic_state", "content", "literature_summary", "gaps")
+    )
+    reducer = MapReduceSummarizer(llm, prompt_manager, budget, cache=cache) if budget else None
+
+    def prompt_kwargs(state: AppState) -> Dict[str, Any]:
+        artifacts = state.get("artifacts", {})
+        # Without a literature search this pass, the corpus hits stand in for its summary.
+        literature = artifacts.get("literature_summary") or format_search_results(artifacts.get("corpus_hits") or [])
+        return dict(
             role="synthesizer_writer",
             dynamic_state=format_dynamic_block(state),
-            content=state.get("artifacts", {}).get("extracted_data", ""),
-            literature_summary=state.get("artifacts", {}).get("literature_summary", ""),
-            gaps=state.get("artifacts", {}).get("gaps", ""),
+            literature_summary=literature,
+            gaps=artifacts.get("gaps", ""),
         )
-        return _invoke_and_route("synthesizer_writer", llm, prompt)
 
-    return node
+    def content_of(state: AppState) -> str:
+        return str(state.get("artifacts", {}).get("extracted_data", ""))
+
+    def build_prompt(state: AppState, content: str) -> str:
+        return prompt_manager.build(**prompt_kwargs(state), content=content, **_budget_kwargs(reducer))
+
+    def node(state: AppState, config: RunnableConfig):
+        content = _fit_content(reducer, prompt_manager, prompt_kwargs(state), content_of(state), config)
+        return _invoke_and_route(
+            "synthesizer_writer", llm, build_prompt(state, content), cache=cache, config=config
+        )
+
+    async def anode(state: AppState, config: RunnableConfig):
+        content = await _afit_content(reducer, prompt_manager, prompt_kwargs(state), content_of(state), config)
+        return await _ainvoke_and_route(
+            "synthesizer_writer", llm, build_prompt(state, content), cache=cache, config=config
+        )
+
+    return _as_node("SynthesizerWriter", node, anode)
 
 
 # ------------------------
@@ -141,27 +431,67 @@ def synthesizer_writer_node(prompt_manager: PromptManager) -> Callable[[AppState
 # ------------------------
 
 
-def literature_search_node(prompt_manager: PromptManager) -> Callable[[AppState], Dict]:
-    """The only agent that *also* calls an external search tool before the LLM."""
-    llm = initialize_llm()
-    from src.tools.arxiv_tool import ArxivTool
-    arxiv_tool = ArxivTool()
-
-    def node(state: AppState):
-        query = state.get("research_question", "")
-        results = arxiv_tool.run(query)
-
-        prompt = prompt_manager.build(
+def literature_search_node(
+    prompt_manager: PromptManager,
+    cache: LLMResponseCache | None = None,
+    searcher: MultiSourceSearch | None = None,
+    abstract_chars: int = 1200,
+    models: ModelRegistry | None = None,
+    index_results: Callable[[list], Any] | None = None,
+) -> RunnableLambda:
+    """The only agent that *also* calls external search tools before the LLM.
+
+    ``searcher`` fans the question out to every configured source (arXiv by
+    default) and returns fused, deduplicated records.  Abstracts are cut to
+    ``abstract_chars`` per paper in both the prompt and the stored artifact.
+    ``index_results`` is handed the full records of every search, e.g.
+    ``VectorIndexNode.submit_records`` to grow the local corpus.
+    """
+    llm = _llm_for("literature_search", models)
+    prompt_manager.validate(role="search_specialist", fields=("dynamic_state", "content"))
+    if searcher is None:
+        from src.tools.arxiv_tool import ArxivTool
+        searcher = MultiSourceSearch([ArxivSource(ArxivTool())])
+
+    def search(state: AppState) -> Dict[str, Any]:
+        report = searcher.search(state.get("research_question", ""), state.get("topic", ""))
+        if index_results is not None and report["results"]:
+            index_results(report["results"])
+        return report
+
+    def build_prompt(state: AppState, results: list) -> str:
+        return prompt_manager.build(
             role="search_specialist",
             dynamic_state=format_dynamic_block(state),
-            content=str(results),
+            content=format_search_results(results, abstract_chars=abstract_chars),
         )
 
-        # Use handle_agent_response to structure the summary; then merge in raw results.
-        extra = {"artifacts": {"literature_results": results}}
-        return _invoke_and_route("literature_search", llm, prompt, extra_update=extra)
+    def extra_update(report: Dict[str, Any]) -> Dict[str, Any]:
+        # Structure the summary via handle_agent_response; then merge in the records.
+        stats = {k: v for k, v in report.items() if k != "results"}
+        return {
+            "artifacts": {
+                "literature_results": compact_records(report["results"], abstract_chars),
+                "literature_search_report": stats,
+            }
+        }
+
+    def node(state: AppState, config: RunnableConfig):
+        report = search(state)
+        return _invoke_and_route(
+            "literature_search", llm, build_prompt(state, report["results"]),
+            extra_update=extra_update(report), cache=cache, config=config,
+        )
+
+    async def anode(state: AppState, config: RunnableConfig):
+        # Source clients are blocking; keep them off the event loop.
+        report = await asyncio.to_thread(search, state)
+        return await _ainvoke_and_route(
+            "literature_search", llm, build_prompt(state, report["results"]),
+            extra_update=extra_update(report), cache=cache, config=config,
+        )
 
-    return node
+    return _as_node("LiteratureSearch", node, anode)
 
 
 # --------------------------------------------------------------------------------------
@@ -0,0 +1,126 @@
+"""Chunked map-reduce summarization for content larger than a prompt budget.
+
+``MapReduceSummarizer.reduce_to`` leaves text that already fits untouched.
+Otherwise it splits the text into ``chunk_tokens`` chunks, summarizes the
+chunks in parallel (``llm.batch`` / ``llm.abatch``, at most
+``max_concurrency`` in flight), joins the partial summaries and repeats on
+the result until it fits - a hierarchical reduce.  After ``max_depth``
+levels the remainder is truncated, so the number of LLM calls and hence
+latency and cost stay bounded whatever the corpus size.
+
+Chunk summaries go through the same ``LLMResponseCache`` as whole-node
+calls, so re-running over mostly unchanged content only pays for new chunks,
+and are scheduled against the run's provider rate limiter, if any.
+"""
+from __future__ import annotations
+
+import time
+from typing import List
+
+from langchain_core.runnables import RunnableConfig
+
+from src.orchestration.instrumentation import record_llm_call
+from src.orchestration.llm_cache import LLMResponseCache, is_cache_bypassed
+from src.orchestration.llm_model import parse_llm_response
+from src.orchestration.rate_limit import estimate_tokens, limiter_for
+from src.prompts.prompt_manager import PromptManager
+from src.prompts.token_budget import (
+    TokenBudget,
+    count_tokens,
+    model_name_of,
+    split_into_chunks,
+    truncate_to_tokens,
+)
+
+
+class MapReduceSummarizer:
+    """
+    Shrink oversized content with the ``summary_prompt`` template.
+    Usage:
+        reducer = MapReduceSummarizer(llm, prompt_manager, TokenBudget(chunk_tokens=3000))
+        text = reducer.reduce_to(long_text, max_tokens=8000)
+    """
+    def __init__(
+        self,
+        llm,
+        prompt_manager: PromptManager,
+        budget: TokenBudget | None = None,
+        template: str = "summary_prompt",
+        cache: LLMResponseCache | None = None,
+    ):
+        self.llm = llm
+        self.prompt_manager = prompt_manager
+        self.budget = budget or TokenBudget()
+        self.template = template
+        self.cache = cache
+        self.model = model_name_of(llm)
+
+    def reduce_to(self, text: str, max_tokens: int, config: RunnableConfig | None = None) -> str:
+        for _ in range(self.budget.max_depth):
+            if count_tokens(text, self.model) <= max_tokens:
+                return text
+            text = "\n\n".join(self._map(self._prompts(text), config))
+        return truncate_to_tokens(text, max_tokens, self.model)
+
+    async def areduce_to(self, text: str, max_tokens: int, config: RunnableConfig | None = None) -> str:
+        for _ in range(self.budget.max_depth):
+            if count_tokens(text, self.model) <= max_tokens:
+                return text
+            text = "\n\n".join(await self._amap(self._prompts(text), config))
+        return truncate_to_tokens(text, max_tokens, self.model)
+
+    def _prompts(self, text: str) -> List[str]:
+        return [
+            self.prompt_manager.build(
+                self.template, content=chunk,
+                token_budget=self.budget.max_input_tokens, model=self.model,
+            )
+            for chunk in split_into_chunks(text, self.budget.chunk_tokens, self.model)
+        ]
+
+    def _map(self, prompts: List[str], config: RunnableConfig | None) -> List[str]:
+        outputs, missing = self._cached(prompts, config)
+        if missing:
+            limiter = limiter_for(self.llm, config)
+            if limiter:
+                for i in missing:
+                    limiter.acquire(estimate_tokens(self.llm, prompts[i]))
+            start = time.perf_counter()
+            responses = self.llm.batch(
+                [prompts[i] for i in missing], config={"max_concurrency": self.budget.max_concurrency}
+            )
+            self._store(prompts, missing, responses, outputs, config, time.perf_counter() - start)
+        return outputs
+
+    async def _amap(self, prompts: List[str], config: RunnableConfig | None) -> List[str]:
+        outputs, missing = self._cached(prompts, config)
+        if missing:
+            limiter = limiter_for(self.llm, config)
+            if limiter:
+                for i in missing:
+                    await limiter.aacquire(estimate_tokens(self.llm, prompts[i]))
+            start = time.perf_counter()
+            responses = await self.llm.abatch(
+                [prompts[i] for i in missing], config={"max_concurrency": self.budget.max_concurrency}
+            )
+            self._store(prompts, missing, responses, outputs, config, time.perf_counter() - start)
+        return outputs
+
+    def _cached(self, prompts: List[str], config: RunnableConfig | None):
+        """Return per-prompt outputs filled from the cache and the indexes still missing."""
+        use_cache = self.cache is not None and not is_cache_bypassed(config)
+        outputs = [self.cache.get(self.cache.key_for(self.llm, p)) if use_cache else None for p in prompts]
+        if use_cache:
+            for prompt, output in zip(prompts, outputs):
+                if output is not None:
+                    record_llm_call(self.llm, prompt, cached=True)
+        return outputs, [i for i, out in enumerate(outputs) if out is None]
+
+    def _store(self, prompts, missing, responses, outputs, config, seconds: float) -> None:
+        use_cache = self.cache is not None and not is_cache_bypassed(config)
+        for i, response in zip(missing, responses):
+            # Calls of one batch run concurrently; each reports the batch's wall time.
+            record_llm_call(self.llm, prompts[i], response, seconds=seconds)
+            outputs[i] = parse_llm_response(response)
+            if use_cache:
+                self.cache.set(self.cache.key_for(self.llm, prompts[i]), outputs[i])
@@ -1,13 +1,145 @@
-from fastapi import FastAPI
-from src.orchestration.graph_builder import graph
+from contextlib import asynccontextmanager
+from uuid import uuid4
 
-app = FastAPI()
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from src.orchestration.config import load_config
+from src.orchestration.graph_builder import aclose_default_graph, default_graph
+from src.orchestration.instrumentation import METRICS
+from src.orchestration.llm_cache import BYPASS_CONFIG_KEY
+from src.orchestration.single_flight import SingleFlight, normalize_request
+from src.deployment.streaming import StreamBusy, StreamRegistry, format_sse, stream_run
+from src.deployment.worker_pool import GraphWorkerPool, PoolSaturated
+
+cfg = load_config()
+server_cfg = cfg.get("server", {}) or {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The shared async HTTP pool belongs to this loop; the rest of the graph closes at exit.
+    await aclose_default_graph()
+
+# The graph is built on first use (default_graph), not at import.
+app = FastAPI(lifespan=lifespan)
+pool = GraphWorkerPool(
+    max_concurrency=server_cfg.get("max_concurrency", 4),
+    max_queue=server_cfg.get("max_queue", 16),
+)
+RETRY_AFTER_SECONDS = str(server_cfg.get("retry_after_seconds", 5))
+# Identical concurrent /invoke requests share one graph run.
+runs = SingleFlight("invoke")
+streams = StreamRegistry(
+    max_events=server_cfg.get("stream_buffer_events", 5000),
+    retention_seconds=server_cfg.get("stream_retention_seconds", 600),
+)
+
+def _run_config(user_input: dict) -> dict:
+    # The checkpointer needs a thread id; callers may pin one to continue a run.
+    thread_id = str(user_input.pop("thread_id", None) or uuid4().hex)
+    config = {"configurable": {"thread_id": thread_id}}
+    if user_input.pop(BYPASS_CONFIG_KEY, False):
+        config["configurable"][BYPASS_CONFIG_KEY] = True
+    return config
+
+def _saturated(e: PoolSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Research worker pool is saturated ({e}); retry later.",
+        headers={"Retry-After": RETRY_AFTER_SECONDS},
+    )
+
+def _event_stream(log, thread_id: str, last_event_id: int) -> StreamingResponse:
+    async def body():
+        async for event in log.follow(last_event_id):
+            yield format_sse(event)
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Thread-Id": thread_id},
+    )
+
+def _flight_key(user_input: dict):
+    """Coalescing key of an /invoke request, or None for runs continuing a pinned thread."""
+    if user_input.get("thread_id"):
+        return None
+    return normalize_request({**user_input, BYPASS_CONFIG_KEY: bool(user_input.get(BYPASS_CONFIG_KEY))})
 
 @app.post("/invoke")
 async def invoke_agent(user_input: dict):
-    response = graph.invoke(user_input)
+    """
+    Run the graph to completion. Requests that match one already running
+    (same input up to case, whitespace and trailing punctuation, no pinned
+    thread_id) wait for that run and return its result instead of starting
+    another; the run is only abandoned when every such request is gone.
+    """
+    key = _flight_key(user_input)
+    config = _run_config(user_input)
+
+    async def run():
+        research = default_graph()
+        # Artifact references are resolved once, by the run's leader.
+        return research.resolve(await pool.run(research.graph.ainvoke, user_input, config))
+
+    try:
+        if key is None:
+            response = await run()
+        else:
+            response, _ = await runs.ado(key, run)
+    except PoolSaturated as e:
+        raise _saturated(e)
     return response
 
+@app.post("/stream")
+async def stream_agent(user_input: dict):
+    """
+    Start a run and stream it as Server-Sent Events: ``node`` per finished
+    node, ``token`` per LLM token. The run continues if the client
+    disconnects; reconnect with GET /stream/{thread_id}.
+    """
+    config = _run_config(user_input)
+    thread_id = config["configurable"]["thread_id"]
+    try:
+        log = streams.start(thread_id)
+    except StreamBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        research = default_graph()
+        task = pool.submit(stream_run, research.graph, user_input, config, log, research.resolve)
+    except PoolSaturated as e:
+        log.close()
+        raise _saturated(e)
+    # Failures are reported as an ``error`` event; don't log them as unretrieved.
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return _event_stream(log, thread_id, last_event_id=0)
+
+@app.get("/stream/{thread_id}")
+async def resume_stream(thread_id: str, last_event_id: int = Header(0)):
+    """Replay events after the ``Last-Event-ID`` header and follow the run to its end."""
+    log = streams.get(thread_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail=f"No stream for thread {thread_id}")
+    return _event_stream(log, thread_id, last_event_id)
+
+@app.get("/stats")
+async def pool_stats():
+    stats = pool.stats()
+    stats["streams"] = streams.stats()
+    stats["coalesced_runs"] = runs.stats()
+    llm_cache = default_graph().llm_cache
+    if llm_cache is not None:
+        stats["llm_cache"] = llm_cache.stats()
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Node, LLM and tool metrics plus pool and stream gauges, in the Prometheus text format."""
+    pool_stats = pool.stats()
+    gauges = {f"pool_{k}": pool_stats[k] for k in ("running", "queued", "max_concurrency", "max_queue")}
+    gauges.update({f"streams_{k}": v for k, v in streams.stats().items()})
+    counters = {f"pool_{k}_total": pool_stats[k] for k in ("completed", "failed", "rejected")}
+    return PlainTextResponse(METRICS.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,177 @@
+"""Server-Sent Events streaming of research runs.
+
+``stream_run`` drives ``graph.astream`` with the ``updates`` and ``messages``
+stream modes and publishes one event per completed node (``node``) and per
+LLM token (``token``), framed by ``start`` and ``end`` (or ``error``) events.
+
+Events go to a per-thread ``ThreadEventLog`` rather than straight to the
+HTTP response: the run keeps going if the client disconnects, and a client
+can reconnect with the thread id and the standard ``Last-Event-ID`` header
+to replay what it missed and follow the rest.  Event ids increase
+monotonically per thread, across successive runs on the same thread.  Each
+log holds at most ``max_events`` events; finished logs are dropped
+``retention_seconds`` after their run ended.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+KEEPALIVE_SECONDS = 15.0
+
+Event = Tuple[int, str, Any]   # (id, event name, JSON-serialisable data)
+
+
+class StreamBusy(Exception):
+    """A run is already streaming on this thread."""
+
+
+class ThreadEventLog:
+    """Bounded, replayable event log for one thread."""
+    def __init__(self, max_events: int = 5000):
+        self.events: deque = deque(maxlen=max_events)
+        self.next_id = 1
+        self.running = False
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str, data: Any) -> int:
+        event_id = self.next_id
+        self.next_id += 1
+        self.events.append((event_id, event, data))
+        self._wake()
+        return event_id
+
+    def open(self) -> None:
+        self.running = True
+        self.finished_at = None
+
+    def close(self) -> None:
+        self.running = False
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def since(self, last_event_id: int) -> list:
+        return [e for e in self.events if e[0] > last_event_id]
+
+    def _wake(self) -> None:
+        # Waiters hold the previous Event object; swap in a fresh one for the next round.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self, last_event_id: int = 0, keepalive: float = KEEPALIVE_SECONDS) -> AsyncIterator[Optional[Event]]:
+        """
+        Yield events after ``last_event_id``, then new ones as they are
+        published, until the run ends. Yields None after ``keepalive``
+        seconds without events.
+        """
+        if self.events and last_event_id + 1 < self.events[0][0]:
+            # Part of the requested range was evicted from the buffer.
+            yield (0, "gap", {"missed_until": self.events[0][0] - 1})
+        while True:
+            changed = self._changed
+            pending = self.since(last_event_id)
+            for event in pending:
+                last_event_id = event[0]
+                yield event
+            if pending:
+                continue
+            if not self.running:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class StreamRegistry:
+    """
+    Event logs by thread id.
+    Usage:
+        registry = StreamRegistry()
+        log = registry.start(thread_id)
+        asyncio.create_task(stream_run(graph, user_input, config, log))
+        async for event in log.follow(last_event_id):
+            ...
+    """
+    def __init__(self, max_events: int = 5000, retention_seconds: float = 600.0):
+        self.max_events = max_events
+        self.retention_seconds = retention_seconds
+        self._logs: Dict[str, ThreadEventLog] = {}
+
+    def start(self, thread_id: str) -> ThreadEventLog:
+        """Open the thread's log for a new run; raises StreamBusy if one is running."""
+        self._expire()
+        log = self._logs.get(thread_id)
+        if log is None:
+            log = self._logs[thread_id] = ThreadEventLog(self.max_events)
+        elif log.running:
+            raise StreamBusy(f"thread {thread_id} is already streaming")
+        log.open()
+        return log
+
+    def get(self, thread_id: str) -> Optional[ThreadEventLog]:
+        self._expire()
+        return self._logs.get(thread_id)
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._logs),
+            "running": sum(log.running for log in self._logs.values()),
+            "buffered_events": sum(len(log.events) for log in self._logs.values()),
+        }
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.retention_seconds
+        for thread_id, log in list(self._logs.items()):
+            if not log.running and log.finished_at is not None and log.finished_at < cutoff:
+                del self._logs[thread_id]
+
+
+async def stream_run(graph, user_input: dict, config: dict, log: ThreadEventLog, resolve=None) -> None:
+    """
+    Run ``graph`` and publish its node updates and LLM tokens to ``log``.
+    ``resolve`` (e.g. ``ResearchGraph.resolve``) replaces artifact references
+    in the updates by their values.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    log.publish("start", {"thread_id": thread_id})
+    try:
+        async for mode, chunk in graph.astream(user_input, config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message, metadata = chunk
+                text = _message_text(message)
+                if text:
+                    log.publish("token", {"node": metadata.get("langgraph_node"), "content": text})
+            else:
+                for node, update in chunk.items():
+                    if resolve is not None and isinstance(update, dict):
+                        update = resolve(update)
+                    log.publish("node", {"node": node, "update": update})
+        log.publish("end", {"thread_id": thread_id})
+    except Exception as e:
+        log.publish("error", {"thread_id": thread_id, "error": str(e)})
+        raise
+    finally:
+        log.close()
+
+
+def _message_text(message) -> str:
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    # Content blocks (e.g. Anthropic / Gemini chunks).
+    return "".join(b.get("text", "") for b in content if isinstance(b, dict))
+
+
+def format_sse(event: Optional[Event]) -> str:
+    """Frame an event (or a keepalive for None) for a ``text/event-stream`` response."""
+    if event is None:
+        return ": keepalive\n\n"
+    event_id, name, data = event
+    payload = json.dumps(data, default=str)
+    prefix = f"id: {event_id}\n" if event_id else ""
+    return f"{prefix}event: {name}\ndata: {payload}\n\n"
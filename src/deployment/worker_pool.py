@@ -0,0 +1,103 @@
+"""Bounded execution pool for running compiled LangGraph workflows.
+
+The FastAPI server hands every research run to a ``GraphWorkerPool``.  At most
+``max_concurrency`` runs execute at once; up to ``max_queue`` further runs wait
+for a slot, and anything beyond that is rejected immediately with
+``PoolSaturated`` so the caller can answer with HTTP 429 instead of piling up
+work it cannot serve.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class PoolSaturated(Exception):
+    """Raised when both the execution slots and the wait queue are full."""
+
+
+class GraphWorkerPool:
+    """
+    Admission-controlled async pool with queue-depth accounting.
+    Usage:
+        pool = GraphWorkerPool(max_concurrency=4, max_queue=16)
+        result = await pool.run(graph.ainvoke, user_input, config)
+    """
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 16):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must be non-negative")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._running = 0
+        self._queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of runs waiting for an execution slot."""
+        return self._queued
+
+    def is_saturated(self) -> bool:
+        # Admitted runs count as queued until they get a slot.
+        return self._running + self._queued >= self.max_concurrency + self.max_queue
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Await ``func(*args, **kwargs)`` once a slot is free.
+        Raises PoolSaturated without waiting if the queue is already full.
+        """
+        self._admit()
+        return await self._execute(func, *args, **kwargs)
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> asyncio.Task:
+        """
+        Admit a run immediately and execute it as a background task, so the
+        caller can respond before it finishes (e.g. streaming endpoints).
+        Raises PoolSaturated like ``run``.
+        """
+        self._admit()
+        return asyncio.ensure_future(self._execute(func, *args, **kwargs))
+
+    def _admit(self) -> None:
+        if self.is_saturated():
+            self._rejected += 1
+            raise PoolSaturated(
+                f"{self._running} runs in progress and {self._queued} queued"
+            )
+        self._queued += 1
+
+    async def _execute(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        self._running += 1
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException:
+            self._failed += 1
+            raise
+        else:
+            self._completed += 1
+            return result
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of pool occupancy and lifetime counters."""
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
@@ -4,35 +4,106 @@
 # data = memory_store.get('agent_name', 'session_id')
 # memory_store.delete('agent_name', 'session_id')
 # keys = memory_store.list_keys('agent_name')
+# memory_store.save_many('agent_name', {'k1': 'text one', 'k2': 'text two'})
+# hits = memory_store.search('agent_name', 'related text', k=5)
+
+import threading
 
 from langgraph.store.memory import InMemoryStore
-from langchain.embeddings import OpenAIEmbeddings
+from src.memory.recall_index import RecallIndex
+from src.orchestration.config import load_config
+from src.tools.embedding_service import shared_embedding_service
 
 class MemoryStore:
     """
     MemoryStore provides both short-term (in-memory) and long-term (persistent) memory for agents.
-    Supports saving, retrieving, updating, and deleting memory by namespace and key.
+    Supports saving, retrieving, updating, and deleting memory by namespace and key,
+    and semantic recall with ``search``.
+    Embeddings go through the shared EmbeddingService, so repeated texts are
+    never re-embedded and bulk writes are batched. Texts live in the LangGraph
+    store; vectors live in one ``RecallIndex`` matrix per namespace.
     """
-    def __init__(self, embedding_model="text-embedding-3-large"):
+    def __init__(self, embedding_model="text-embedding-3-large", embeddings=None, embedding_cache=None,
+                 compact_ratio=0.25):
         self.store = InMemoryStore()
-        self.embeddings = OpenAIEmbeddings(model=embedding_model)
+        self.embeddings = embeddings or shared_embedding_service(embedding_model, embedding_cache)
+        self.compact_ratio = compact_ratio
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, namespace: str) -> RecallIndex:
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = RecallIndex(compact_ratio=self.compact_ratio)
+            return index
 
     def save(self, namespace: str, key: str, text: str):
-        vec = self.embeddings.embed_query(text)
-        self.store.set(namespace, key, {"text": text, "vector": vec})
+        self.save_many(namespace, {key: text})
+
+    def save_many(self, namespace: str, items: dict):
+        """
+        Save several key -> text entries with a single batched embedding call.
+        """
+        keys = list(items)
+        if not keys:
+            return
+        vectors = self.embeddings.embed_documents([items[k] for k in keys])
+        for key in keys:
+            self.store.put((namespace,), key, {"text": items[key]})
+        self._index(namespace).add(keys, vectors)
 
     def get(self, namespace: str, key: str):
-        return self.store.get(namespace, key)
+        """The saved value (``{"text": ...}``), or None."""
+        item = self.store.get((namespace,), key)
+        return item.value if item is not None else None
 
     def delete(self, namespace: str, key: str):
-        self.store.delete(namespace, key)
+        self.store.delete((namespace,), key)
+        self._index(namespace).remove(key)
 
     def update(self, namespace: str, key: str, new_text: str):
-        vec = self.embeddings.embed_query(new_text)
-        self.store.set(namespace, key, {"text": new_text, "vector": vec})
+        self.save(namespace, key, new_text)
 
     def list_keys(self, namespace: str):
-        return self.store.list_keys(namespace)
+        return self._index(namespace).keys()
+
+    def search(self, namespace: str, query: str, k: int = 5):
+        """
+        The ``k`` memories of ``namespace`` most similar to ``query``, best first,
+        as ``{"key", "text", "score"}`` dicts (score = cosine similarity).
+        """
+        index = self._index(namespace)
+        if not len(index):
+            return []
+        hits = index.search(self.embeddings.embed_query(query), k)
+        results = []
+        for key, score in hits:
+            value = self.get(namespace, key)
+            if value is not None:   # deleted since the search started
+                results.append({"key": key, "text": value["text"], "score": score})
+        return results
+
+_memory_store = None
+_memory_store_lock = threading.Lock()
+
+
+def get_memory_store() -> MemoryStore:
+    """The process-wide store configured by config.yaml, created on first use."""
+    global _memory_store
+    with _memory_store_lock:
+        if _memory_store is None:
+            cfg = load_config()
+            _memory_store = MemoryStore(
+                embedding_model=cfg.get("embedding_model", "text-embedding-3-large"),
+                embedding_cache=cfg.get("embedding_cache"),
+            )
+        return _memory_store
+
 
-# Singleton instance for use by agents
-memory_store = MemoryStore()
\ No newline at end of file
+def __getattr__(name):
+    # ``from src.memory.memory_store import memory_store`` keeps working, but
+    # importing this module no longer reads config or builds embedding clients.
+    if name == "memory_store":
+        return get_memory_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,181 @@
+"""Exact cosine top-k over one namespace of agent memories.
+
+``RecallIndex`` keeps every vector of a namespace in one contiguous,
+L2-normalised float32 matrix with a parallel array of keys, so a query is a
+single matrix-vector product followed by ``np.argpartition`` - no per-entry
+Python work.
+
+- Appends write into spare rows; when the matrix is full its capacity is
+  doubled (amortised O(1) per append).
+- Deletes and overwrites only clear the row's ``alive`` flag (a tombstone).
+  Once tombstones exceed ``compact_ratio`` of the rows, live rows are copied
+  into a fresh matrix on a background thread.
+- Searches work on a snapshot of ``(matrix, keys, alive, rows)`` taken under
+  the lock, so they never wait for an append or a compaction to finish.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+# One compaction at a time, process-wide; compactions are short copies.
+_compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-compact")
+
+
+def normalize(vectors) -> np.ndarray:
+    """Rows of ``vectors`` as float32 unit vectors (zero vectors stay zero)."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class RecallIndex:
+    """
+    Usage:
+        index = RecallIndex()
+        index.add(["k1", "k2"], vectors)
+        index.search(query_vector, k=5)   # [("k2", 0.91), ("k1", 0.42)]
+        index.remove("k1")
+    """
+    def __init__(self, dimension: Optional[int] = None, compact_ratio: float = 0.25,
+                 background_compaction: bool = True):
+        self.dimension = dimension
+        self.compact_ratio = compact_ratio
+        self.background_compaction = background_compaction
+        self._matrix = None
+        self._keys = None
+        self._alive = None
+        self._rows = 0                      # rows written, live or tombstoned
+        self._row_of: Dict[str, int] = {}   # live key -> row
+        self._tombstones = 0
+        self._compacting = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._row_of
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._row_of)
+
+    def add(self, keys: List[str], vectors) -> None:
+        """Insert or overwrite ``keys``; overwritten rows become tombstones."""
+        block = normalize(vectors)
+        if len(keys) != len(block):
+            raise ValueError(f"{len(keys)} keys for {len(block)} vectors")
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = block.shape[1]
+            elif block.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {block.shape[1]} != index dimension {self.dimension}")
+            self._reserve(self._rows + len(keys))
+            for key in keys:
+                self._kill(key)
+            start, end = self._rows, self._rows + len(keys)
+            self._matrix[start:end] = block
+            self._keys[start:end] = keys
+            self._alive[start:end] = True
+            self._rows = end
+            # A key repeated within the block: the last occurrence wins.
+            for offset, key in enumerate(keys):
+                if key in self._row_of:
+                    self._alive[self._row_of[key]] = False
+                    self._tombstones += 1
+                self._row_of[key] = start + offset
+        self._maybe_compact()
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            removed = self._kill(key)
+        if removed:
+            self._maybe_compact()
+        return removed
+
+    def search(self, query_vector, k: int = 5) -> List[Tuple[str, float]]:
+        """The ``k`` live keys most cosine-similar to ``query_vector``, best first."""
+        with self._lock:
+            if not self._row_of or k <= 0:
+                return []
+            rows = self._rows
+            matrix, keys, alive = self._matrix[:rows], self._keys[:rows], self._alive[:rows].copy()
+        query = normalize(query_vector)[0]
+        scores = matrix @ query
+        scores[~alive] = -np.inf
+        k = min(k, int(alive.sum()))
+        top = np.argpartition(-scores, k - 1)[:k] if k < rows else np.arange(rows)
+        top = top[np.argsort(-scores[top], kind="stable")][:k]
+        return [(str(keys[i]), float(scores[i])) for i in top]
+
+    def compact(self) -> None:
+        """Copy the live rows into a fresh matrix, dropping tombstones."""
+        with self._lock:
+            self._compacting = False
+            if not self._tombstones:
+                return
+            live = np.flatnonzero(self._alive[: self._rows])
+            capacity = max(INITIAL_CAPACITY, 2 * len(live))
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            keys = np.empty(capacity, dtype=object)
+            alive = np.zeros(capacity, dtype=bool)
+            matrix[: len(live)] = self._matrix[live]
+            keys[: len(live)] = self._keys[live]
+            alive[: len(live)] = True
+            # New arrays rather than in-place moves: in-flight searches keep
+            # reading the old snapshot.
+            self._matrix, self._keys, self._alive = matrix, keys, alive
+            self._rows = len(live)
+            self._row_of = {key: row for row, key in enumerate(keys[: len(live)])}
+            self._tombstones = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._row_of),
+                "tombstones": self._tombstones,
+                "capacity": 0 if self._matrix is None else len(self._matrix),
+                "dimension": self.dimension,
+            }
+
+    def _kill(self, key: str) -> bool:
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self._tombstones += 1
+        return True
+
+    def _reserve(self, rows: int) -> None:
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        matrix = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        keys = np.empty(new_capacity, dtype=object)
+        alive = np.zeros(new_capacity, dtype=bool)
+        if capacity:
+            matrix[: self._rows] = self._matrix[: self._rows]
+            keys[: self._rows] = self._keys[: self._rows]
+            alive[: self._rows] = self._alive[: self._rows]
+        self._matrix, self._keys, self._alive = matrix, keys, alive
+
+    def _maybe_compact(self) -> None:
+        with self._lock:
+            due = (not self._compacting and self._tombstones
+                   and self._tombstones > self.compact_ratio * self._rows)
+            if due:
+                self._compacting = True
+        if not due:
+            return
+        if self.background_compaction:
+            _compactor.submit(self.compact)
+        else:
+            self.compact()
@@ -0,0 +1,344 @@
+"""
+Content-addressed store for large artifacts.
+
+A checkpointer saves a new version of the ``artifacts`` channel whenever any
+key in it changes, so a 50 KB literature summary would otherwise be
+serialized again into every snapshot taken after it was written.  Instead,
+artifact values whose serialized size reaches ``inline_limit`` bytes are
+written once to an ``ArtifactStore``, keyed by the xxh3-128 hash of their
+bytes, and the state holds a small reference in their place::
+
+    {"$artifact": "9f2c41...", "size": 51234}
+
+``dependency_graph.timed_node`` handles both directions for every node: the
+node reads ``state["artifacts"]`` through an ``ArtifactView``, which resolves
+references on access, and large artifacts in its update are offloaded before
+LangGraph sees them.  Code reading a finished run's state (the server, the
+batch runner) calls ``resolve`` to get plain values back.
+
+Backends:
+
+- in memory (``path=None``): lives as long as the process; only pair it with
+  the in-memory checkpointer.  Blobs are kept in least-recently-used order
+  and evicted past ``max_memory_bytes`` or after ``ttl_seconds`` unused, and
+  a run whose artifacts were evicted can no longer be resolved, so size the
+  limit for the runs the process still serves;
+- SQLite: a WAL-mode file shared across processes and restarts, blobs
+  optionally zstd-compressed; entries unused for ``ttl_seconds`` are deleted,
+  so keep that at least as long as the checkpointer's ``thread_ttl_seconds``.
+
+Values are serialized with LangGraph's ``JsonPlusSerializer`` (the same as
+checkpoints), and recently used values are kept decoded in a small LRU.
+Resolved values are shared objects: treat them as read-only.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import xxhash
+import zstandard
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+ARTIFACT_KEY = "$artifact"
+TTL_SWEEP_INTERVAL = 300      # seconds between sweeps of expired entries
+ACCESS_REFRESH_INTERVAL = 3600  # seconds before a read refreshes an entry's last-use time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    key      TEXT PRIMARY KEY,
+    type     TEXT NOT NULL,
+    codec    TEXT NOT NULL,
+    value    BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_accessed ON artifacts(accessed);
+"""
+
+
+def is_ref(value: Any) -> bool:
+    """True for an artifact reference written by ``ArtifactStore.put``."""
+    return isinstance(value, dict) and ARTIFACT_KEY in value
+
+
+class ArtifactView(Mapping):
+    """Read-only mapping over a state's ``artifacts`` that resolves references on access."""
+    __slots__ = ("raw", "_store")
+
+    def __init__(self, raw: Mapping, store: "ArtifactStore"):
+        self.raw = raw
+        self._store = store
+
+    def __getitem__(self, key: str) -> Any:
+        return self._store.resolve_value(self.raw[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __repr__(self) -> str:
+        return f"ArtifactView({self.raw!r})"
+
+
+class ArtifactStore:
+    """
+    Write-once store for artifact values, addressed by content hash.
+    Usage:
+        store = ArtifactStore("data/artifacts.sqlite")
+        update = store.offload_update({"artifacts": {"synthesis": text}})   # -> references
+        state = store.resolve(final_state)                                  # -> plain values
+    """
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        inline_limit: int = 2048,
+        compress: bool = True,
+        compression_level: int = 3,
+        ttl_seconds: Optional[float] = None,
+        cache_entries: int = 64,
+        max_memory_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.inline_limit = inline_limit
+        self.ttl_seconds = ttl_seconds
+        self.cache_entries = cache_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.serde = JsonPlusSerializer()
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if compress else None
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        # key -> (value, last time the entry's use was recorded in the backend)
+        self._decoded: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        # Memory backend, least recently used first: key -> (type, codec, blob, last use).
+        self._blobs: "OrderedDict[str, Tuple[str, str, bytes, float]]" = OrderedDict()
+        self._blob_bytes = 0
+        self._last_sweep = 0.0
+        self._counts = {"offloaded": 0, "deduplicated": 0, "bytes_offloaded": 0, "bytes_stored": 0,
+                        "reads": 0, "cache_hits": 0, "evicted": 0}
+        self._conn = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    # -- single values --------------------------------------------------
+
+    def put(self, value: Any) -> Any:
+        """A reference to ``value``, or ``value`` itself if it is small (or already a reference)."""
+        if value is None or isinstance(value, (bool, int, float)) or is_ref(value):
+            return value
+        if isinstance(value, str) and len(value) < self.inline_limit // 4:
+            # Cannot reach the limit even at 4 bytes per character; skip serializing.
+            return value
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) < self.inline_limit:
+            return value
+        h = xxhash.xxh3_128()
+        h.update(type_.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(data)
+        key = h.hexdigest()
+        self._write(key, type_, data)
+        self._remember(key, value, time.time())
+        return {ARTIFACT_KEY: key, "size": len(data)}
+
+    def get(self, ref: Any) -> Any:
+        """The value behind a reference (or a bare key); KeyError if the store does not have it."""
+        key = ref[ARTIFACT_KEY] if is_ref(ref) else ref
+        now = time.time()
+        with self._lock:
+            self._counts["reads"] += 1
+            cached = self._decoded.get(key)
+            if cached is not None:
+                self._counts["cache_hits"] += 1
+                self._decoded.move_to_end(key)
+        if cached is not None:
+            value, touched = cached
+            if self._conn is not None and now - touched > ACCESS_REFRESH_INTERVAL:
+                self._touch(key, now)
+                self._remember(key, value, now)
+            return value
+        type_, codec, data = self._read(key, now)
+        if codec == "zstd":
+            data = self._decompressor.decompress(data)
+        value = self.serde.loads_typed((type_, data))
+        self._remember(key, value, now)
+        return value
+
+    def resolve_value(self, value: Any) -> Any:
+        return self.get(value) if is_ref(value) else value
+
+    # -- state helpers ----------------------------------------------------
+
+    def offload_update(self, update: dict) -> dict:
+        """``update`` with its large ``artifacts`` values replaced by references."""
+        artifacts = update.get("artifacts")
+        if not isinstance(artifacts, dict) or not artifacts:
+            return update
+        return {**update, "artifacts": {k: self.put(v) for k, v in artifacts.items()}}
+
+    def view(self, state: dict) -> dict:
+        """Shallow copy of ``state`` whose ``artifacts`` resolve references lazily."""
+        artifacts = state.get("artifacts")
+        if not artifacts or isinstance(artifacts, ArtifactView):
+            return state
+        return {**state, "artifacts": ArtifactView(artifacts, self)}
+
+    def resolve(self, state: Optional[dict]) -> Optional[dict]:
+        """Shallow copy of ``state`` with every artifact reference replaced by its value."""
+        if not state or not state.get("artifacts"):
+            return state
+        artifacts = state["artifacts"]
+        if isinstance(artifacts, ArtifactView):
+            artifacts = artifacts.raw
+        return {**state, "artifacts": {k: self.resolve_value(v) for k, v in artifacts.items()}}
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts)
+            stats["cached"] = len(self._decoded)
+            if self._conn is None:
+                stats["bytes_in_memory"] = self._blob_bytes
+        stats["entries"] = len(self)
+        return stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                return len(self._blobs)
+            return self._conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+    # -- backend ------------------------------------------------------------
+
+    def _write(self, key: str, type_: str, data: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._counts["offloaded"] += 1
+            self._counts["bytes_offloaded"] += len(data)
+            if self._conn is None:
+                if key in self._blobs:
+                    self._counts["deduplicated"] += 1
+                    self._blobs[key] = self._blobs[key][:3] + (now,)
+                    self._blobs.move_to_end(key)
+                    return
+            else:
+                cached = self._decoded.get(key)
+                if cached is not None and now - cached[1] <= ACCESS_REFRESH_INTERVAL:
+                    # Stored (or read) recently by this process: nothing to write.
+                    self._counts["deduplicated"] += 1
+                    return
+        codec, blob = "raw", data
+        if self._compressor is not None:
+            codec, blob = "zstd", self._compressor.compress(data)
+        with self._lock:
+            if self._conn is None:
+                if key in self._blobs:
+                    self._counts["deduplicated"] += 1
+                    return
+                self._blobs[key] = (type_, codec, blob, now)
+                self._blob_bytes += len(blob)
+                self._counts["bytes_stored"] += len(blob)
+                self._evict(now)
+                return
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO artifacts (key, type, codec, value, size, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, type_, codec, blob, len(blob), now),
+            ).rowcount
+            if inserted:
+                self._counts["bytes_stored"] += len(blob)
+            else:
+                self._counts["deduplicated"] += 1
+                self._conn.execute("UPDATE artifacts SET accessed = ? WHERE key = ?", (now, key))
+            self._sweep(now)
+            self._conn.commit()
+
+    def _read(self, key: str, now: float) -> Tuple[str, str, bytes]:
+        with self._lock:
+            if self._conn is None:
+                row = self._blobs.get(key)
+                if row is not None:
+                    self._blobs[key] = row[:3] + (now,)
+                    self._blobs.move_to_end(key)
+                    row = row[:3]
+            else:
+                row = self._conn.execute(
+                    "SELECT type, codec, value, accessed FROM artifacts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if now - row[3] > ACCESS_REFRESH_INTERVAL:
+                        self._conn.execute("UPDATE artifacts SET accessed = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                    row = row[:3]
+        if row is None:
+            raise KeyError(f"Artifact {key} is not in the store")
+        return row
+
+    def _touch(self, key: str, now: float) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("UPDATE artifacts SET accessed = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+
+    def _sweep(self, now: float) -> None:
+        if self.ttl_seconds is None or now - self._last_sweep < TTL_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        self._conn.execute("DELETE FROM artifacts WHERE accessed < ?", (now - self.ttl_seconds,))
+
+    def _evict(self, now: float) -> None:
+        """Drop memory-backend blobs past ``max_memory_bytes`` or unused for ``ttl_seconds``, oldest first."""
+        expired = now - self.ttl_seconds if self.ttl_seconds is not None else None
+        while self._blobs:
+            key, (_, _, blob, used) = next(iter(self._blobs.items()))
+            if self._blob_bytes <= self.max_memory_bytes and (expired is None or used >= expired):
+                break
+            del self._blobs[key]
+            self._blob_bytes -= len(blob)
+            self._counts["evicted"] += 1
+
+    def _remember(self, key: str, value: Any, touched: float) -> None:
+        with self._lock:
+            self._decoded[key] = (value, touched)
+            self._decoded.move_to_end(key)
+            while len(self._decoded) > self.cache_entries:
+                self._decoded.popitem(last=False)
+
+
+def artifact_store_from_config(section: Optional[dict]) -> Optional[ArtifactStore]:
+    """
+    Build an ``ArtifactStore`` from the ``artifact_store`` section of config.yaml.
+    Returns None (artifacts stay inline in the state) when the section is
+    missing or ``enabled`` is false.
+    """
+    if not section or not section.get("enabled", True):
+        return None
+    backend = section.get("backend", "sqlite")
+    if backend not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown artifact_store backend: {backend}")
+    return ArtifactStore(
+        path=section.get("path", "data/artifacts.sqlite") if backend == "sqlite" else None,
+        inline_limit=section.get("inline_limit", 2048),
+        compress=section.get("compress", True),
+        ttl_seconds=section.get("ttl_seconds"),
+        cache_entries=section.get("cache_entries", 64),
+        max_memory_bytes=section.get("max_memory_bytes", 256 * 1024 * 1024),
+    )
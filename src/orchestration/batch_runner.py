@@ -0,0 +1,232 @@
+"""
+Batch execution of many research jobs through the compiled graph.
+
+Usage::
+
+    python -m src.orchestration.batch_runner jobs.jsonl --output results.jsonl
+
+Each input line is a job::
+
+    {"id": "q17", "topic": "...", "research_question": "...",
+     "criteria": {"inclusion": ["..."], "exclusion": ["..."]}}
+
+(``inclusion_criteria`` / ``exclusion_criteria`` may be given directly; ``id``
+defaults to a hash of the job.)
+
+Jobs run concurrently (``batch.max_concurrency``) while every LLM call is
+scheduled against the per-provider RPM/TPM token buckets of the
+``rate_limits`` config section.  A failed job is retried with full-jitter
+exponential backoff; retries reuse the job's thread id, so with a persistent
+checkpointer the graph resumes from the last completed step instead of
+starting over.
+
+Results are appended to the output file one JSON line per job as soon as
+the job finishes.  The output doubles as the batch's progress record: on
+restart, jobs that already have an ``ok`` line are skipped.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import xxhash
+
+from src.orchestration.config import load_config
+from src.orchestration.rate_limit import RATE_LIMIT_CONFIG_KEY, RateLimits
+
+RESULT_FIELDS = ("topic", "research_question", "artifacts", "issues_log")
+
+
+def load_jobs(path: str) -> List[dict]:
+    """Read and normalise a JSONL job file (blank lines and ``#`` comments are skipped)."""
+    jobs = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                jobs.append(normalize_job(json.loads(line)))
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{path}:{line_no}: invalid job ({e})") from e
+    ids = [job["id"] for job in jobs]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"{path}: duplicate job ids")
+    return jobs
+
+
+def normalize_job(raw: dict) -> dict:
+    if not raw.get("research_question"):
+        raise KeyError("research_question")
+    criteria = raw.get("criteria") or {}
+    job = {
+        "topic": raw.get("topic", ""),
+        "research_question": raw["research_question"],
+        "inclusion_criteria": list(raw.get("inclusion_criteria", criteria.get("inclusion", []))),
+        "exclusion_criteria": list(raw.get("exclusion_criteria", criteria.get("exclusion", []))),
+    }
+    job["id"] = str(raw.get("id") or xxhash.xxh3_64_hexdigest(json.dumps(job, sort_keys=True)))
+    return job
+
+
+def completed_job_ids(output_path: str) -> set:
+    """Ids of jobs with an ``ok`` result in an existing output file."""
+    done = set()
+    path = Path(output_path)
+    if not path.exists():
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class BatchRunner:
+    """
+    Run jobs through ``graph`` with bounded concurrency, rate limits and retries.
+    Usage:
+        runner = BatchRunner(graph, rate_limits=RateLimits(cfg["rate_limits"]))
+        summary = asyncio.run(runner.run(load_jobs("jobs.jsonl"), "results.jsonl"))
+    """
+    def __init__(
+        self,
+        graph,
+        rate_limits: Optional[RateLimits] = None,
+        max_concurrency: int = 8,
+        max_attempts: int = 4,
+        backoff_base_seconds: float = 2.0,
+        backoff_max_seconds: float = 60.0,
+        batch_name: str = "batch",
+        resolve: Optional[Callable[[dict], dict]] = None,
+    ):
+        self.graph = graph
+        # Replaces artifact references in a finished state (ResearchGraph.resolve).
+        self.resolve = resolve
+        self.rate_limits = rate_limits
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.batch_name = batch_name
+
+    async def run(self, jobs: Iterable[dict], output_path: str) -> Dict[str, Any]:
+        """Execute every job without an ``ok`` result in ``output_path``; return counts."""
+        done = completed_job_ids(output_path)
+        pending = [job for job in jobs if job["id"] not in done]
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        slots = asyncio.Semaphore(self.max_concurrency)
+        counts = {"skipped": len(done), "ok": 0, "error": 0}
+        start = time.monotonic()
+
+        with open(output_path, "a") as out:
+            async def run_one(job):
+                async with slots:
+                    record = await self._run_job(job)
+                # One write per finished job keeps the file line-atomic for resume.
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                counts[record["status"]] += 1
+
+            await asyncio.gather(*(run_one(job) for job in pending))
+
+        counts["seconds"] = round(time.monotonic() - start, 3)
+        if self.rate_limits is not None:
+            counts["rate_limits"] = self.rate_limits.stats()
+        return counts
+
+    async def _run_job(self, job: dict) -> dict:
+        config = {"configurable": {"thread_id": f"{self.batch_name}-{job['id']}"}}
+        if self.rate_limits is not None:
+            config["configurable"][RATE_LIMIT_CONFIG_KEY] = self.rate_limits
+        inputs = {k: v for k, v in job.items() if k != "id"}
+        start = time.monotonic()
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                state = await self.graph.ainvoke(await self._resume_input(inputs, config), config)
+                if self.resolve is not None:
+                    state = self.resolve(state)
+                return {
+                    "id": job["id"],
+                    "status": "ok",
+                    "attempts": attempt,
+                    "seconds": round(time.monotonic() - start, 3),
+                    "result": {k: state.get(k) for k in RESULT_FIELDS if k in state},
+                }
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff_base_seconds, self.backoff_max_seconds))
+        return {
+            "id": job["id"],
+            "status": "error",
+            "attempts": self.max_attempts,
+            "seconds": round(time.monotonic() - start, 3),
+            "error": error,
+        }
+
+    async def _resume_input(self, inputs: dict, config: dict):
+        """``None`` (continue from the checkpoint) if an earlier attempt stopped mid-graph."""
+        if getattr(self.graph, "checkpointer", None) is None:
+            return inputs
+        snapshot = await self.graph.aget_state(config)
+        return None if snapshot.next else inputs
+
+
+def runner_from_config(graph, cfg: dict, batch_name: str = "batch", resolve=None) -> BatchRunner:
+    batch_cfg = cfg.get("batch", {}) or {}
+    return BatchRunner(
+        graph,
+        rate_limits=RateLimits(cfg.get("rate_limits")),
+        max_concurrency=batch_cfg.get("max_concurrency", 8),
+        max_attempts=batch_cfg.get("max_attempts", 4),
+        backoff_base_seconds=batch_cfg.get("backoff_base_seconds", 2.0),
+        backoff_max_seconds=batch_cfg.get("backoff_max_seconds", 60.0),
+        batch_name=batch_name,
+        resolve=resolve,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of research jobs through the graph.")
+    parser.add_argument("jobs", help="JSONL file with one job per line.")
+    parser.add_argument("--output", help="Results JSONL (default: <jobs>.results.jsonl); also used to resume.")
+    parser.add_argument("--concurrency", type=int, help="Override batch.max_concurrency.")
+    args = parser.parse_args(argv)
+
+    from src.orchestration.graph_builder import build_graph
+
+    cfg = load_config()
+    output = args.output or str(Path(args.jobs).with_suffix(".results.jsonl"))
+    research = build_graph(cfg)
+    runner = runner_from_config(research.graph, cfg, batch_name=Path(args.jobs).stem, resolve=research.resolve)
+    if args.concurrency:
+        runner.max_concurrency = args.concurrency
+
+    async def run_batch():
+        try:
+            return await runner.run(load_jobs(args.jobs), output)
+        finally:
+            await research.aclose()
+
+    summary = asyncio.run(run_batch())
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
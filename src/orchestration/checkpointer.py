@@ -0,0 +1,445 @@
+"""
+Durable LangGraph checkpointer backed by SQLite.
+
+``SQLiteCheckpointer`` implements LangGraph's ``BaseCheckpointSaver`` with the
+same storage layout as ``MemorySaver`` - checkpoints, per-channel value
+blobs (stored once per version, shared by the checkpoints that reference
+them) and pending task writes - but in a WAL-mode SQLite file, so threads
+survive restarts and do not live in process memory.
+
+Writes are batched: task writes reported through ``put_writes`` are buffered
+and committed together with the next checkpoint in a single transaction
+(reads flush the buffer first).  A crash can therefore lose the writes of
+the superstep in flight, which LangGraph simply re-runs on resume.
+
+Compaction bounds storage per thread:
+
+- only the newest ``keep_last`` checkpoints of a thread are kept; blobs and
+  writes no longer referenced are deleted with them;
+- append-only channels listed in ``log_channels`` are stored with only their
+  last ``log_window`` entries; for string logs a marker entry records how
+  many earlier entries were dropped;
+- threads idle for more than ``thread_ttl_seconds`` are deleted.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+DEFAULT_LOG_CHANNELS = ("progress_log", "issues_log", "supervisor_directives", "messages", "node_timings")
+TTL_SWEEP_INTERVAL = 300  # seconds between idle-thread sweeps
+_TRUNCATED_TEMPLATE = "[{} earlier entries truncated]"
+_TRUNCATED = re.compile(r"\[(\d+) earlier entries truncated\]")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id     TEXT,
+    type          TEXT,
+    checkpoint    BLOB,
+    metadata_type TEXT,
+    metadata      BLOB,
+    created       REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_versions (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, channel)
+);
+CREATE INDEX IF NOT EXISTS checkpoint_versions_blob
+    ON checkpoint_versions (thread_id, checkpoint_ns, channel, version);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT,
+    value         BLOB,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Persistent, compacting drop-in replacement for ``MemorySaver``.
+    Usage:
+        checkpointer = SQLiteCheckpointer("data/checkpoints.sqlite", keep_last=10)
+        graph = builder.compile(checkpointer=checkpointer)
+    """
+    def __init__(
+        self,
+        path: str,
+        keep_last: int = 10,
+        log_window: int = 200,
+        log_channels: Sequence[str] = DEFAULT_LOG_CHANNELS,
+        thread_ttl_seconds: Optional[float] = None,
+        max_buffered_writes: int = 256,
+        serde: SerializerProtocol | None = None,
+    ):
+        super().__init__(serde=serde)
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.keep_last = keep_last
+        self.log_window = log_window
+        self.log_channels = set(log_channels)
+        self.thread_ttl_seconds = thread_ttl_seconds
+        self.max_buffered_writes = max_buffered_writes
+        self._lock = threading.RLock()
+        self._buffer: list[tuple] = []
+        self._last_sweep = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ------------------------------------------------------------------
+    # BaseCheckpointSaver interface
+    # ------------------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params: list = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            self._flush()
+            row = self._conn.execute(query, params).fetchone()
+            return self._tuple(row) if row else None
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                f"SELECT * FROM checkpoints{where} ORDER BY checkpoint_id DESC", params
+            ).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(self._tuple(row, metadata))
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (thread_id, checkpoint_ns, k, str(v),
+             *(self.serde.dumps_typed(self._windowed(k, values[k])) if k in values else ("empty", b"")))
+            for k, v in new_versions.items()
+        ]
+        versions = [
+            (thread_id, checkpoint_ns, checkpoint["id"], k, str(v))
+            for k, v in checkpoint["channel_versions"].items()
+        ]
+        row = (
+            thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+            *self.serde.dumps_typed(c),
+            *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_buffer()
+                self._conn.executemany("INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+                self._conn.executemany("INSERT OR REPLACE INTO checkpoint_versions VALUES (?, ?, ?, ?, ?)", versions)
+                self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                self._compact(thread_id, checkpoint_ns)
+                self._sweep_idle_threads()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(c, idx), c,
+             *self.serde.dumps_typed(v), task_path)
+            for idx, (c, v) in enumerate(writes)
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.max_buffered_writes:
+                self._flush()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._flush()
+            self._conn.execute("BEGIN IMMEDIATE")
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_versions", "checkpoint_writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("COMMIT")
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        # Only touches the in-memory buffer unless it is full.
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def flush(self) -> None:
+        """Commit buffered task writes."""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = lambda sql: self._conn.execute(sql).fetchone()[0]
+            return {
+                "threads": count("SELECT COUNT(DISTINCT thread_id) FROM checkpoints"),
+                "checkpoints": count("SELECT COUNT(*) FROM checkpoints"),
+                "blobs": count("SELECT COUNT(*) FROM checkpoint_blobs"),
+                "writes": count("SELECT COUNT(*) FROM checkpoint_writes") + len(self._buffer),
+            }
+
+    # ------------------------------------------------------------------
+    # Internals (callers hold self._lock)
+    # ------------------------------------------------------------------
+
+    def _flush(self) -> None:
+        if self._buffer:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._write_buffer()
+            self._conn.execute("COMMIT")
+
+    def _write_buffer(self) -> None:
+        # Regular writes (idx >= 0) are idempotent per task; special channels overwrite.
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [r for r in self._buffer if r[4] >= 0],
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [r for r in self._buffer if r[4] < 0],
+        )
+        self._buffer.clear()
+
+    def _windowed(self, channel: str, value: Any) -> Any:
+        if channel not in self.log_channels or not isinstance(value, list) or len(value) <= self.log_window:
+            return value
+        kept = value[-self.log_window:]
+        if not all(isinstance(v, str) for v in kept):
+            return kept
+        # kept[0] makes way for the marker.
+        dropped = len(value) - len(kept) + 1
+        marker = _TRUNCATED.fullmatch(value[0]) if isinstance(value[0], str) else None
+        if marker:
+            # The marker itself was one of the dropped entries.
+            dropped += int(marker.group(1)) - 1
+        return [_TRUNCATED_TEMPLATE.format(dropped)] + kept[1:]
+
+    def _compact(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = [
+            r[0] for r in self._conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.keep_last),
+            )
+        ]
+        if not stale:
+            return
+        for table in ("checkpoints", "checkpoint_versions", "checkpoint_writes"):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, cid) for cid in stale],
+            )
+        self._conn.execute(
+            "DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND NOT EXISTS ("
+            " SELECT 1 FROM checkpoint_versions v WHERE v.thread_id = checkpoint_blobs.thread_id"
+            " AND v.checkpoint_ns = checkpoint_blobs.checkpoint_ns AND v.channel = checkpoint_blobs.channel"
+            " AND v.version = checkpoint_blobs.version)",
+            (thread_id, checkpoint_ns),
+        )
+
+    def _sweep_idle_threads(self) -> None:
+        now = time.time()
+        if self.thread_ttl_seconds is None or now - self._last_sweep < TTL_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        idle = [
+            r[0] for r in self._conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created) < ?",
+                (now - self.thread_ttl_seconds,),
+            )
+        ]
+        for table in ("checkpoints", "checkpoint_blobs", "checkpoint_versions", "checkpoint_writes"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in idle])
+
+    def _tuple(self, row: tuple, metadata: dict | None = None) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, ctype, cblob, mtype, mblob, _ = row
+        checkpoint: Checkpoint = self.serde.loads_typed((ctype, cblob))
+        channel_values = {}
+        for channel, btype, value in self._conn.execute(
+            "SELECT b.channel, b.type, b.value FROM checkpoint_versions v JOIN checkpoint_blobs b"
+            " ON b.thread_id = v.thread_id AND b.checkpoint_ns = v.checkpoint_ns"
+            " AND b.channel = v.channel AND b.version = v.version"
+            " WHERE v.thread_id = ? AND v.checkpoint_ns = ? AND v.checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ):
+            if btype != "empty":
+                channel_values[channel] = self.serde.loads_typed((btype, value))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=metadata if metadata is not None else self.serde.loads_typed((mtype, mblob)),
+            pending_writes=[(task_id, c, self.serde.loads_typed((t, v))) for task_id, c, t, v in writes],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+        )
+
+
+def checkpointer_from_config(checkpoint_cfg: Optional[dict]):
+    """
+    Build the checkpointer described by the ``checkpointer`` section of
+    config.yaml; ``backend: memory`` (or no section) keeps ``MemorySaver``.
+    """
+    checkpoint_cfg = dict(checkpoint_cfg or {})
+    if checkpoint_cfg.pop("backend", "memory") == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    return SQLiteCheckpointer(
+        checkpoint_cfg.pop("path", "data/checkpoints.sqlite"),
+        **checkpoint_cfg,
+    )
@@ -0,0 +1,17 @@
+"""Configuration loading shared by the CLI, the server and the graph builder."""
+import os
+
+import yaml
+
+DEFAULT_CONFIG_PATH = "config/config.yaml"
+
+
+def load_config(path: str = None) -> dict:
+    """
+    Load the YAML configuration.
+    Resolution order: explicit ``path``, the ``CONFIG_PATH`` environment variable
+    (set by docker-compose), then ``config/config.yaml``.
+    """
+    path = path or os.environ.get("CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,257 @@
+"""
+Dependency-aware construction of PolyScholar's LangGraph workflow.
+
+Each node is declared with the state keys it reads and writes
+(``NodeSpec``).  Artifact entries are addressed as ``"artifacts.<name>"``.
+``build_dependency_graph`` derives the edges from those declarations: a node
+waits only for the nodes producing something it reads, so independent agents
+run as parallel branches in the same LangGraph superstep, and nodes whose
+outputs nobody consumes lead to END.
+
+Every node is wrapped to record its wall-clock span in ``node_timings``;
+``critical_path_report`` turns those spans into a per-run timing summary.
+
+A ``skippable`` node does nothing when the Supervisor's plan
+(``state["plan"]["skip"]``) names it, but still completes, so joins waiting
+on it fire.  A sink node may declare a ``route`` (state -> node name or END)
+instead of its edge to END, e.g. to loop back to the Supervisor; see
+``src/orchestration/routing.py``.
+
+Append-only logs (``progress_log``, ``issues_log``) must not be declared as
+reads: every node writes them, so treating them as data dependencies would
+serialise the whole graph again.
+
+With an ``ArtifactStore`` (see ``src/orchestration/artifact_store.py``)
+nodes read ``artifacts`` through a view that resolves references, and large
+artifacts they write are replaced by references; nodes starting the graph
+also offload large artifacts supplied with the run's input.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langgraph.graph import StateGraph, START, END
+
+from src.orchestration.artifact_store import ArtifactStore, is_ref
+from src.orchestration.instrumentation import NodeSpan, node_span
+
+
+@dataclass
+class NodeSpec:
+    name: str
+    node: Callable | Runnable
+    reads: tuple = ()
+    writes: tuple = ()
+    after: tuple = field(default=())   # explicit ordering on top of data dependencies
+    skippable: bool = False            # honour state["plan"]["skip"]
+    route: Callable | None = None      # sink only: conditional successor (node name or END)
+
+
+def resolve_dependencies(specs: Iterable[NodeSpec]) -> Dict[str, set]:
+    """
+    Map each node name to the set of nodes it must wait for, after
+    transitive reduction (an edge A -> C is dropped when A -> B -> C exists).
+    Raises ValueError for keys with several producers and for cycles.
+    """
+    specs = list(specs)
+    producers: Dict[str, str] = {}
+    for spec in specs:
+        for key in spec.writes:
+            if key in producers:
+                raise ValueError(f"State key '{key}' is written by both {producers[key]} and {spec.name}")
+            producers[key] = spec.name
+
+    names = {spec.name for spec in specs}
+    deps: Dict[str, set] = {}
+    for spec in specs:
+        wanted = {producers[k] for k in spec.reads if k in producers} | set(spec.after)
+        unknown = wanted - names
+        if unknown:
+            raise ValueError(f"{spec.name} depends on unknown nodes: {sorted(unknown)}")
+        wanted.discard(spec.name)
+        deps[spec.name] = wanted
+
+    order = topological_order(deps)
+    ancestors: Dict[str, set] = {}
+    for name in order:
+        ancestors[name] = set()
+        for dep in deps[name]:
+            ancestors[name] |= {dep} | ancestors[dep]
+    return {
+        name: {d for d in direct if not any(d in ancestors[other] for other in direct - {d})}
+        for name, direct in deps.items()
+    }
+
+
+def topological_order(deps: Dict[str, set]) -> List[str]:
+    """Kahn's algorithm; raises ValueError on cycles."""
+    remaining = {name: set(d) for name, d in deps.items()}
+    order = []
+    while remaining:
+        ready = sorted(name for name, d in remaining.items() if not d)
+        if not ready:
+            raise ValueError(f"Dependency cycle among nodes: {sorted(remaining)}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+        for d in remaining.values():
+            d.difference_update(ready)
+    return order
+
+
+def build_dependency_graph(state_schema, specs: Iterable[NodeSpec],
+                           artifact_store: ArtifactStore | None = None) -> StateGraph:
+    """
+    Return an (uncompiled) ``StateGraph`` whose edges follow the data
+    dependencies declared in ``specs``.
+    """
+    specs = list(specs)
+    deps = resolve_dependencies(specs)
+    builder = StateGraph(state_schema)
+    for spec in specs:
+        builder.add_node(spec.name, timed_node(
+            spec.name, spec.node, skippable=spec.skippable, store=artifact_store,
+            offload_inputs=not deps[spec.name],
+        ))
+
+    consumed = set()
+    for name, upstream in deps.items():
+        consumed |= upstream
+        if not upstream:
+            builder.add_edge(START, name)
+        elif len(upstream) == 1:
+            builder.add_edge(next(iter(upstream)), name)
+        else:
+            # Join: wait for every upstream branch before running.
+            builder.add_edge(sorted(upstream), name)
+    for spec in specs:
+        if spec.route is not None:
+            if spec.name in consumed:
+                raise ValueError(f"{spec.name} has downstream nodes; only sink nodes can declare a route")
+            builder.add_conditional_edges(spec.name, spec.route)
+        elif spec.name not in consumed:
+            builder.add_edge(spec.name, END)
+    return builder
+
+
+def timed_node(name: str, node: Callable | Runnable, skippable: bool = False,
+               store: ArtifactStore | None = None, offload_inputs: bool = False) -> RunnableLambda:
+    """
+    Wrap ``node`` so it appends ``{"node", "start", "end", "seconds"}`` to
+    ``node_timings``, the LLM and tool spans it recorded to ``trace`` (see
+    ``src/orchestration/instrumentation.py``), and returns a plain state update.
+    A ``skippable`` node named in the plan's skip list only logs the skip.
+    With a ``store``, the node sees artifacts resolved and its large artifacts
+    are offloaded; ``offload_inputs`` also offloads large inline artifacts
+    already in the state.
+    """
+    runnable = node if isinstance(node, Runnable) else RunnableLambda(node)
+
+    def run(state, config: RunnableConfig):
+        with node_span(name) as span:
+            skipped = _skip_update(name, state) if skippable else None
+            view = store.view(state) if store is not None else state
+            result = skipped if skipped is not None else runnable.invoke(view, config)
+        result = _with_timing(name, result, span, skipped=skipped is not None)
+        return _offload(store, state, result, offload_inputs) if store is not None else result
+
+    async def arun(state, config: RunnableConfig):
+        with node_span(name) as span:
+            skipped = _skip_update(name, state) if skippable else None
+            view = store.view(state) if store is not None else state
+            result = skipped if skipped is not None else await runnable.ainvoke(view, config)
+        result = _with_timing(name, result, span, skipped=skipped is not None)
+        return _offload(store, state, result, offload_inputs) if store is not None else result
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def _skip_update(name: str, state) -> dict | None:
+    plan = state.get("plan") or {}
+    if name not in plan.get("skip", ()):
+        return None
+    reason = (plan.get("reasons") or {}).get(name, "not needed")
+    return {"progress_log": [f"{name} skipped: {reason}."]}
+
+
+def _with_timing(name: str, result: Any, span: NodeSpan, skipped: bool = False) -> Any:
+    timing = {"node": name, "start": span.start, "end": span.end, "seconds": span.seconds}
+    if skipped:
+        timing["skipped"] = True
+    extra = {"node_timings": [timing]}
+    if span.spans:
+        extra["trace"] = span.spans
+    # Agent helpers return ``{"update": {...}}`` (the shape of ``Command``);
+    # LangGraph ignores unknown top-level keys, so unwrap it here.
+    if isinstance(result, dict) and set(result) == {"update"}:
+        result = result["update"]
+    if result is None:
+        result = {}
+    if isinstance(result, dict):
+        return {**result, **extra}
+    update = getattr(result, "update", None)
+    if isinstance(update, dict):
+        # Command: attach the timing to its update.
+        result.update = {**update, **extra}
+    return result
+
+
+def _offload(store: ArtifactStore, state, result: Any, offload_inputs: bool) -> Any:
+    update = result if isinstance(result, dict) else getattr(result, "update", None)
+    if not isinstance(update, dict):
+        return result
+    artifacts = dict(update.get("artifacts") or {})
+    if offload_inputs:
+        # Large artifacts supplied with the run's input: stored once from here on.
+        for key, value in (state.get("artifacts") or {}).items():
+            if key not in artifacts and not is_ref(value):
+                ref = store.put(value)
+                if is_ref(ref):
+                    artifacts[key] = ref
+    if artifacts:
+        update = {**update, "artifacts": {k: store.put(v) for k, v in artifacts.items()}}
+    if isinstance(result, dict):
+        return update
+    result.update = update
+    return result
+
+
+def critical_path_report(timings: List[dict], specs: Iterable[NodeSpec]) -> Dict[str, Any]:
+    """
+    Summarise one run: wall time, summed node time, achieved parallelism and
+    the chain of dependent nodes with the largest total duration (the
+    critical path).  Uses the most recent timing entry per node.
+    """
+    latest: Dict[str, dict] = {}
+    for t in timings:
+        latest[t["node"]] = t
+    if not latest:
+        return {"wall_seconds": 0.0, "node_seconds": 0.0, "parallelism": 0.0,
+                "critical_path": [], "critical_path_seconds": 0.0, "nodes": {}}
+
+    deps = {n: d & latest.keys() for n, d in resolve_dependencies(specs).items() if n in latest}
+    finish: Dict[str, float] = {}
+    previous: Dict[str, str | None] = {}
+    for name in topological_order(deps):
+        best = max(deps[name], key=lambda d: finish[d], default=None)
+        finish[name] = latest[name]["seconds"] + (finish[best] if best else 0.0)
+        previous[name] = best
+
+    tail = max(finish, key=finish.get)
+    path = []
+    while tail is not None:
+        path.append(tail)
+        tail = previous[tail]
+
+    wall = max(t["end"] for t in latest.values()) - min(t["start"] for t in latest.values())
+    node_seconds = sum(t["seconds"] for t in latest.values())
+    return {
+        "wall_seconds": wall,
+        "node_seconds": node_seconds,
+        "parallelism": node_seconds / wall if wall else 0.0,
+        "critical_path": path[::-1],
+        "critical_path_seconds": finish[path[0]],
+        "nodes": {n: t["seconds"] for n, t in latest.items()},
+    }
@@ -1,8 +1,34 @@
-builder.add_node(agent, name="Supervisor")
-graph = builder.compile(checkpointer=memory)
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
+"""Assembly of the research graph.
+
+``build_graph(cfg)`` wires every node for a config dict and returns a
+``ResearchGraph`` (the compiled graph plus the shared resources behind it).
+Nothing expensive happens here: provider clients are created on their first
+call (``ModelRegistry.for_role(..., lazy=True)``), the FAISS store on the
+first vector search, and provider SDKs / faiss are only imported then.
+
+The module attributes ``graph``, ``llm_cache``, ``node_specs``, ``models``
+and ``memory`` are the default graph for ``config/config.yaml``, built on
+first access::
+
+    from src.orchestration.graph_builder import graph
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
 from src.prompts.prompt_manager import PromptManager
+from src.prompts.token_budget import TokenBudget
+from src.orchestration.artifact_store import ArtifactStore, artifact_store_from_config
+from src.orchestration.checkpointer import checkpointer_from_config
+from src.orchestration.config import load_config
+from src.orchestration.instrumentation import configure_pricing, trace_summary
+from src.orchestration.llm_cache import LLMResponseCache, cache_from_config
+from src.orchestration.llm_model import ModelRegistry, registry_from_config
+from src.orchestration.routing import RoutingPolicy
 
 from src.agents.agent_nodes import (
     supervisor_node,
@@ -12,28 +38,197 @@ from src.agents.agent_nodes import (
     synthesizer_writer_node,
 )
 from src.orchestration.state import AppState
-from src.orchestration.vector_index import vector_index_node
+from src.orchestration.dependency_graph import NodeSpec, build_dependency_graph, critical_path_report
+from src.orchestration.vector_index import VectorIndexNode, vector_index_node
+from src.tools.arxiv_tool import ArxivTool
+from src.tools.multi_source_search import MultiSourceSearch, sources_from_config
+
+TEMPLATE_DIR = "src/prompts/templates"
+
+
+@dataclass
+class ResearchGraph:
+    graph: Any
+    node_specs: List[NodeSpec]
+    llm_cache: Optional[LLMResponseCache]
+    models: ModelRegistry
+    memory: Any
+    vector_index: VectorIndexNode
+    artifact_store: Optional[ArtifactStore] = None
+
+    def resolve(self, state: Optional[dict]) -> Optional[dict]:
+        """A run's state with artifact references replaced by their values."""
+        return self.artifact_store.resolve(state) if self.artifact_store is not None else state
+
+    def timing_report(self, state: dict) -> dict:
+        """Critical-path timing summary for a finished run's state."""
+        return critical_path_report(state.get("node_timings", []), self.node_specs)
+
+    def trace_summary(self, state: dict) -> dict:
+        """Per-node latency, LLM tokens, cost and cache hits of a finished run."""
+        return trace_summary(state)
+
+    async def aclose(self) -> None:
+        """``close`` for owners running the graph in an event loop: also closes the async HTTP pool."""
+        await self.models.aclose()
+        self.close()
+
+    def close(self) -> None:
+        # Compact vectors added since the last snapshot into a new one.
+        self.vector_index.close()
+        self.models.close()
+        if hasattr(self.memory, "close"):
+            self.memory.close()
+        if self.artifact_store is not None:
+            self.artifact_store.close()
+
+
+def build_graph(cfg: Optional[dict] = None, checkpointer=None, client_factory=None, arxiv_tool=None,
+                embeddings=None) -> ResearchGraph:
+    """
+    Build the research graph for ``cfg`` (default: ``load_config()``).
+    ``checkpointer`` overrides the ``checkpointer`` config section;
+    ``client_factory`` (see ``ModelRegistry``), ``arxiv_tool`` and
+    ``embeddings`` replace the provider clients, e.g. with the offline
+    stand-ins in ``benchmarks/fakes.py``.
+    """
+    cfg = load_config() if cfg is None else cfg
+    configure_pricing(cfg.get("pricing"))
+    pm = PromptManager(TEMPLATE_DIR)
+    llm_cache = cache_from_config(cfg.get("llm_cache"))
+    token_budget = TokenBudget.from_config(cfg.get("token_budget"))
+    models = registry_from_config(cfg, client_factory=client_factory)
+    policy = RoutingPolicy.from_config(cfg.get("routing"))
+    memory = checkpointer if checkpointer is not None else checkpointer_from_config(cfg.get("checkpointer"))
+    artifact_store = artifact_store_from_config(cfg.get("artifact_store"))
+
+    vector_index = vector_index_node(
+        embeddings_model=cfg.get("embedding_model", "text-embedding-3-large"),
+        persist_path=cfg.get("vector_store_path"),
+        dimension=cfg.get("embedding_dimension"),
+        snapshot_every=cfg.get("vector_snapshot_every", 1000),
+        index_spec=cfg.get("vector_index"),
+        embedding_cache=cfg.get("embedding_cache"),
+        embeddings=embeddings,
+        ingestion=cfg.get("ingestion"),
+        retrieval=cfg.get("retrieval"),
+        sharding=cfg.get("vector_shards"),
+    )
+    ingestion_cfg = cfg.get("ingestion") or {}
+
+    search_cfg = cfg.get("literature_search", {}) or {}
+    tavily_tool = None
+    if "tavily" in search_cfg.get("sources", []) and os.environ.get("TAVILY_API_KEY"):
+        from src.tools.tavily_tool import TavilyTool
+        tavily_tool = TavilyTool(api_key=os.environ["TAVILY_API_KEY"])
+    searcher = MultiSourceSearch(
+        sources_from_config(
+            search_cfg,
+            arxiv_tool=arxiv_tool or ArxivTool(search_cfg.get("arxiv")),
+            tavily_tool=tavily_tool,
+            # The node opens its FAISS store on the first search.
+            faiss_tool=vector_index,
+        ),
+        per_source_k=search_cfg.get("per_source_k", 10),
+        top_k=search_cfg.get("top_k", 10),
+        deadline=search_cfg.get("deadline", 15.0),
+        max_variants=search_cfg.get("max_variants", 3),
+        workers_per_source=search_cfg.get("workers_per_source", 8),
+    )
+
+    # Each node declares what it reads and writes; independent nodes run as
+    # parallel branches (see src/orchestration/dependency_graph.py).
+    # Every role reads the supervisor's directives through format_dynamic_block.
+    # The supervisor's plan can skip agents for a pass; after the synthesis the
+    # graph loops back to it up to routing.max_iterations times (routing.py).
+    node_specs = [
+        NodeSpec(
+            "Supervisor", supervisor_node(pm, cache=llm_cache, models=models, policy=policy, corpus=vector_index),
+            reads=("research_question", "inclusion_criteria"),
+            writes=("supervisor_directives", "plan", "iteration_count", "artifacts.corpus_hits"),
+        ),
+        NodeSpec(
+            "LiteratureSearch", literature_search_node(
+                pm, cache=llm_cache, searcher=searcher, abstract_chars=search_cfg.get("abstract_chars", 1200),
+                models=models,
+                # Papers found are added to the FAISS corpus in the background.
+                index_results=vector_index.submit_records if ingestion_cfg.get("index_literature_results") else None,
+            ),
+            reads=("research_question", "topic", "supervisor_directives"),
+            writes=("artifacts.literature_results", "artifacts.literature_summary",
+                    "artifacts.literature_search_report"),
+            skippable=True,
+        ),
+        NodeSpec(
+            "Summarizer", summarizer_node(pm, cache=llm_cache, budget=token_budget, models=models),
+            reads=("artifacts.to_summarize", "supervisor_directives"),
+            writes=("artifacts.summary",),
+            skippable=True,
+        ),
+        NodeSpec(
+            "GapFinder", gap_finder_node(pm, cache=llm_cache, models=models),
+            reads=("topic", "artifacts.to_analyze", "artifacts.existing_research",
+                   "artifacts.desired_outcome", "supervisor_directives"),
+            writes=("artifacts.gaps",),
+            skippable=True,
+        ),
+        NodeSpec(
+            "SynthesizerWriter", synthesizer_writer_node(pm, cache=llm_cache, budget=token_budget, models=models),
+            reads=("artifacts.extracted_data", "artifacts.literature_summary", "artifacts.corpus_hits",
+                   "artifacts.gaps", "supervisor_directives"),
+            writes=("artifacts.synthesis",),
+            skippable=True,
+            route=policy.next_after,
+        ),
+        NodeSpec(
+            "VectorIndex", vector_index,
+            reads=("vector_action", "artifacts.documents", "artifacts.doc_ids",
+                   "artifacts.query_text", "artifacts.k", "artifacts.filter"),
+            writes=("artifacts.vector_index_result",),
+        ),
+    ]
+
+    builder = build_dependency_graph(AppState, node_specs, artifact_store=artifact_store)
+    return ResearchGraph(
+        graph=builder.compile(checkpointer=memory),
+        node_specs=node_specs,
+        llm_cache=llm_cache,
+        models=models,
+        memory=memory,
+        vector_index=vector_index,
+        artifact_store=artifact_store,
+    )
+
+
+_default: Optional[ResearchGraph] = None
+_default_lock = threading.Lock()
+
+
+def default_graph() -> ResearchGraph:
+    """The graph for config/config.yaml, built once per process on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = build_graph()
+            atexit.register(_default.close)
+        return _default
 
-pm = PromptManager("src/prompts/templates")
-memory = MemorySaver()
-builder = StateGraph(AppState)
 
+async def aclose_default_graph() -> None:
+    """
+    Close the default graph's async HTTP pool, if it was built; await it on
+    the event loop that served the runs.  The rest is closed at exit.
+    """
+    if _default is not None:
+        await _default.models.aclose()
 
-builder.add_node("Supervisor", supervisor_node(pm))
-builder.add_node("LiteratureSearch", literature_search_node(pm))
-builder.add_node("Summarizer", summarizer_node(pm))
-builder.add_node("GapFinder", gap_finder_node(pm))
-builder.add_node("SynthesizerWriter", synthesizer_writer_node(pm))
-builder.add_node("VectorIndex", vector_index_node())
 
+def timing_report(state: dict) -> dict:
+    """Critical-path timing summary for a finished run of the default graph."""
+    return default_graph().timing_report(state)
 
-# Define transitions (linear workflow with Synthesizer/Writer)
-builder.add_edge(START, "Supervisor")
-builder.add_edge("Supervisor", "LiteratureSearch")
-builder.add_edge("LiteratureSearch", "Summarizer")
-builder.add_edge("Summarizer", "GapFinder")
-builder.add_edge("GapFinder", "SynthesizerWriter")
-builder.add_edge("SynthesizerWriter", "VectorIndex")
-builder.add_edge("VectorIndex", END)
 
-graph = builder.compile(checkpointer=memory)
\ No newline at end of file
+def __getattr__(name):
+    if name in ("graph", "llm_cache", "node_specs", "models", "memory"):
+        return getattr(default_graph(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
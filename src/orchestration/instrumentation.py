@@ -0,0 +1,325 @@
+"""
+Latency, token and cost instrumentation for nodes, LLM calls and tools.
+
+Every node runs inside ``node_span`` (``dependency_graph.timed_node`` opens
+it), which makes the node the current span through a context variable.
+While it is open:
+
+- ``_invoke_and_route`` and map-reduce summarization report each LLM call
+  with ``record_llm_call``. A call records its latency, its time to first
+  token (when the model streams), prompt and completion tokens, estimated
+  cost and whether the response cache answered it.
+- Tool calls (search sources, the FAISS store) are wrapped in ``tool_span``.
+
+Each record goes to two places:
+
+- the process-wide ``METRICS`` registry, rendered in the Prometheus text
+  format by the server's ``GET /metrics``;
+- the node's span list. ``timed_node`` appends that list to the run's
+  ``trace`` state channel, and ``trace_summary(state)`` aggregates it per
+  node.
+
+Costs use the per-model prices of the ``pricing`` config section (USD per
+million input / output tokens, matched by the longest model-name prefix).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config
+
+from src.prompts.token_budget import count_tokens, model_name_of
+
+METRIC_PREFIX = "polyscholar"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+# ----------------------------------------------------------------------
+# Prometheus-format metrics
+# ----------------------------------------------------------------------
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[l]) for l in self.labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self.values: Dict[LabelValues, list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[l]) for l in self.labels)
+        series = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (_number(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metrics:
+    """The process-wide metric families; thread-safe."""
+    def __init__(self, pricing: Optional[Dict[str, dict]] = None):
+        p = METRIC_PREFIX
+        self.pricing = dict(pricing or {})
+        self.node_seconds = Histogram(f"{p}_node_duration_seconds", "Wall time per node run.", ("node", "status"))
+        self.llm_seconds = Histogram(f"{p}_llm_latency_seconds", "LLM call latency.", ("node", "model"))
+        self.llm_ttft = Histogram(f"{p}_llm_time_to_first_token_seconds",
+                                  "Time to the first streamed token.", ("node", "model"))
+        self.llm_tokens = Counter(f"{p}_llm_tokens_total", "LLM tokens by direction.", ("node", "model", "kind"))
+        self.llm_cost = Counter(f"{p}_llm_cost_usd_total", "Estimated LLM cost in USD.", ("node", "model"))
+        self.llm_cache = Counter(f"{p}_llm_cache_requests_total", "Response cache lookups.", ("node", "result"))
+        self.tool_seconds = Histogram(f"{p}_tool_duration_seconds", "Tool call latency.", ("tool", "status"))
+        self.single_flight = Counter(f"{p}_single_flight_requests_total",
+                                     "Coalesced calls by role (leader ran it, follower shared it).", ("name", "role"))
+        self._families = (self.node_seconds, self.llm_seconds, self.llm_ttft, self.llm_tokens, self.llm_cost,
+                          self.llm_cache, self.tool_seconds, self.single_flight)
+        self.lock = threading.Lock()
+
+    def cost(self, model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimated USD cost; 0.0 for models without a ``pricing`` entry."""
+        matches = [prefix for prefix in self.pricing if (model or "").startswith(prefix)]
+        if not matches:
+            return 0.0
+        price = self.pricing[max(matches, key=len)]
+        return (prompt_tokens * price.get("input", 0.0) + completion_tokens * price.get("output", 0.0)) / 1e6
+
+    def render(self, gauges: Optional[Dict[str, float]] = None, counters: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition, plus point-in-time ``gauges`` and ``counters`` owned elsewhere."""
+        with self.lock:
+            lines = [line for family in self._families for line in family.render()]
+        for kind, values in (("gauge", gauges), ("counter", counters)):
+            for name, value in (values or {}).items():
+                lines += [f"# TYPE {METRIC_PREFIX}_{name} {kind}", f"{METRIC_PREFIX}_{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def configure_pricing(pricing_cfg: Optional[Dict[str, dict]]) -> None:
+    """Install the ``pricing`` section of config.yaml on ``METRICS``."""
+    METRICS.pricing = dict(pricing_cfg or {})
+
+
+# ----------------------------------------------------------------------
+# Spans
+# ----------------------------------------------------------------------
+
+class NodeSpan:
+    def __init__(self, node: str):
+        self.node = node
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.spans: List[dict] = []
+
+    @property
+    def seconds(self) -> float:
+        return (self.end or time.time()) - self.start
+
+
+_current: ContextVar[Optional[NodeSpan]] = ContextVar("polyscholar_node_span", default=None)
+
+
+def current_node() -> Optional[str]:
+    span = _current.get()
+    return span.node if span else None
+
+
+@contextmanager
+def node_span(node: str) -> Iterator[NodeSpan]:
+    """Make ``node`` the current span and record its duration (and failure) on exit."""
+    span = NodeSpan(node)
+    token = _current.set(span)
+    status = "error"
+    try:
+        yield span
+        status = "ok"
+    finally:
+        _current.reset(token)
+        span.end = time.time()
+        with METRICS.lock:
+            METRICS.node_seconds.observe(span.seconds, node=node, status=status)
+
+
+@contextmanager
+def tool_span(tool: str, **attributes) -> Iterator[dict]:
+    """Time a tool call; the yielded dict can take extra attributes (e.g. result counts)."""
+    record = {"kind": "tool", "tool": tool, **attributes}
+    start = time.perf_counter()
+    record["status"] = "error"
+    try:
+        yield record
+        record["status"] = "ok"
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        with METRICS.lock:
+            METRICS.tool_seconds.observe(record["seconds"], tool=tool, status=record["status"])
+        _append(record)
+
+
+def _append(record: dict) -> None:
+    span = _current.get()
+    if span is not None:
+        record.setdefault("node", span.node)
+        span.spans.append(record)
+
+
+# ----------------------------------------------------------------------
+# LLM calls
+# ----------------------------------------------------------------------
+
+class FirstTokenTimer(BaseCallbackHandler):
+    """Callback noting when the first streamed token of a call arrives."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.start
+
+
+def timed_call_config(timer: FirstTokenTimer) -> dict:
+    """
+    Config for ``llm.invoke(prompt, config=...)`` adding ``timer`` to the
+    callbacks inherited from the running node (so token streaming to the
+    caller keeps working).
+    """
+    parent = ensure_config().get("callbacks")
+    if parent is None:
+        callbacks = [timer]
+    elif isinstance(parent, list):
+        callbacks = [*parent, timer]
+    else:
+        callbacks = parent.copy()
+        callbacks.add_handler(timer, inherit=False)
+    return {"callbacks": callbacks}
+
+
+def usage_of(response, prompt: str, model: Optional[str]) -> Tuple[int, int]:
+    """``(prompt_tokens, completion_tokens)`` as reported by the provider, else estimated."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens", 0)
+    content = response if isinstance(response, str) else getattr(response, "content", "")
+    return count_tokens(prompt, model), count_tokens(str(content), model)
+
+
+def record_llm_call(
+    llm,
+    prompt: str,
+    response=None,
+    seconds: float = 0.0,
+    first_token: Optional[float] = None,
+    cached: bool = False,
+    calls: int = 1,
+    coalesced: bool = False,
+) -> dict:
+    """
+    Record one LLM call (``calls`` > 1: a batch, with summed tokens) made by
+    the current node. A ``cached`` call was answered by the response cache,
+    a ``coalesced`` one by an identical call in flight (see single_flight.py);
+    neither costs anything.
+    """
+    node = current_node() or "-"
+    model = model_name_of(llm) or type(llm).__name__
+    record = {"kind": "llm", "model": model, "calls": calls, "cached": cached, "seconds": seconds}
+    if coalesced:
+        record["coalesced"] = True
+    with METRICS.lock:
+        METRICS.llm_cache.inc(node=node, result="hit" if cached else "coalesced" if coalesced else "miss")
+    if not (cached or coalesced):
+        prompt_tokens, completion_tokens = usage_of(response, prompt, model)
+        cost = METRICS.cost(model, prompt_tokens, completion_tokens)
+        record.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_usd=cost,
+                      first_token_seconds=first_token)
+        with METRICS.lock:
+            METRICS.llm_seconds.observe(seconds, node=node, model=model)
+            if first_token is not None:
+                METRICS.llm_ttft.observe(first_token, node=node, model=model)
+            METRICS.llm_tokens.inc(prompt_tokens, node=node, model=model, kind="prompt")
+            METRICS.llm_tokens.inc(completion_tokens, node=node, model=model, kind="completion")
+            METRICS.llm_cost.inc(cost, node=node, model=model)
+    _append(record)
+    return record
+
+
+# ----------------------------------------------------------------------
+# Run summaries
+# ----------------------------------------------------------------------
+
+SUMMARY_FIELDS = ("seconds", "llm_calls", "llm_seconds", "cache_hits", "coalesced", "prompt_tokens",
+                  "completion_tokens", "cost_usd", "tool_calls", "tool_seconds")
+
+
+def trace_summary(state: dict) -> Dict[str, Any]:
+    """
+    Aggregate a run's ``trace`` and ``node_timings`` per node and in total:
+    node seconds, LLM calls / seconds / tokens / cost, cache hits, coalesced
+    calls, tool calls.
+    """
+    nodes: Dict[str, Dict[str, Any]] = {}
+
+    def entry(name):
+        return nodes.setdefault(name, {field: 0 for field in SUMMARY_FIELDS})
+
+    for timing in state.get("node_timings", []) or []:
+        entry(timing["node"])["seconds"] += timing["seconds"]
+    for span in state.get("trace", []) or []:
+        e = entry(span.get("node", "-"))
+        if span["kind"] == "llm":
+            calls = span.get("calls", 1)
+            e["llm_calls"] += calls
+            e["cache_hits"] += calls if span.get("cached") else 0
+            e["coalesced"] += calls if span.get("coalesced") else 0
+            e["llm_seconds"] += span.get("seconds", 0.0)
+            e["prompt_tokens"] += span.get("prompt_tokens", 0)
+            e["completion_tokens"] += span.get("completion_tokens", 0)
+            e["cost_usd"] += span.get("cost_usd", 0.0)
+        else:
+            e["tool_calls"] += 1
+            e["tool_seconds"] += span.get("seconds", 0.0)
+
+    total = {field: sum(n[field] for n in nodes.values()) for field in SUMMARY_FIELDS}
+    return {"nodes": nodes, "total": total}
@@ -0,0 +1,265 @@
+"""Content-addressed cache for LLM responses.
+
+Agent prompts are rendered deterministically from the state and the default
+``temperature=0.0`` makes the model output (effectively) a function of the
+prompt, so reruns of the same topic can reuse earlier answers.  Entries are
+keyed on an xxhash of ``(model, temperature, max_tokens, prompt)``.
+
+Two tiers are provided:
+
+- ``MemoryLRUTier``: bounded in-process LRU with TTL.
+- ``SQLiteTier``: zstd-compressed on-disk store with TTL and a byte budget,
+  shared across processes and restarts.
+
+``LLMResponseCache`` chains the tiers (hits in a slower tier are promoted to
+the faster ones) and keeps hit/miss counters.  A run can opt out by setting
+``configurable["bypass_llm_cache"] = True`` in its LangGraph config.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import xxhash
+import zstandard
+
+BYPASS_CONFIG_KEY = "bypass_llm_cache"
+
+
+def make_cache_key(model: str, temperature: Any, max_tokens: Any, prompt: str) -> str:
+    """Hash the parameters that determine an LLM response."""
+    h = xxhash.xxh3_128()
+    for part in (model, temperature, max_tokens):
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+def llm_identity(llm) -> tuple:
+    """Extract ``(model, temperature, max_tokens)`` from a LangChain chat model."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    return (
+        str(model),
+        getattr(llm, "temperature", None),
+        getattr(llm, "max_tokens", None),
+    )
+
+
+class MemoryLRUTier:
+    """
+    Thread-safe in-memory LRU tier.
+    Entries older than ``ttl_seconds`` (if set) are treated as misses.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created = entry
+            if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """
+    On-disk tier backed by SQLite with zstd-compressed values.
+    When the stored (compressed) size exceeds ``max_bytes`` the least recently
+    accessed entries are evicted.
+    """
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        compression_level: int = 3,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            blob, created = row
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return self._decompressor.decompress(blob).decode("utf-8")
+
+    def set(self, key: str, value: str) -> None:
+        blob = self._compressor.compress(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed ASC"
+        ).fetchall():
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class LLMResponseCache:
+    """
+    Tiered response cache in front of ``llm.invoke``.
+    Usage:
+        cache = LLMResponseCache([MemoryLRUTier(), SQLiteTier("data/llm_cache.sqlite")])
+        key = cache.key_for(llm, prompt)
+        content = cache.get(key)
+        if content is None:
+            content = parse_llm_response(llm.invoke(prompt))
+            cache.set(key, content)
+    """
+    def __init__(self, tiers: List[Any]):
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {tier.name: 0 for tier in tiers}
+        self._misses = 0
+
+    def key_for(self, llm, prompt: str) -> str:
+        return make_cache_key(*llm_identity(llm), prompt)
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                # Promote into the faster tiers so the next lookup stops earlier.
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                with self._lock:
+                    self._hits[tier.name] += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + self._misses
+            return {
+                "hits": hits,
+                "misses": self._misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "hits_by_tier": dict(self._hits),
+                "entries_by_tier": {tier.name: len(tier) for tier in self.tiers},
+            }
+
+
+def is_cache_bypassed(config: Optional[dict]) -> bool:
+    """True if the run's LangGraph config asks to skip the response cache."""
+    return bool((config or {}).get("configurable", {}).get(BYPASS_CONFIG_KEY, False))
+
+
+def cache_from_config(cache_cfg: Optional[dict]) -> Optional[LLMResponseCache]:
+    """
+    Build an ``LLMResponseCache`` from the ``llm_cache`` section of config.yaml.
+    Returns None when the section is missing or ``enabled`` is false.
+    """
+    if not cache_cfg or not cache_cfg.get("enabled", False):
+        return None
+    ttl = cache_cfg.get("ttl_seconds")
+    tiers: List[Any] = [
+        MemoryLRUTier(max_entries=cache_cfg.get("max_entries", 1024), ttl_seconds=ttl)
+    ]
+    if cache_cfg.get("path"):
+        tiers.append(
+            SQLiteTier(cache_cfg["path"], ttl_seconds=ttl, max_bytes=cache_cfg.get("max_bytes"))
+        )
+    return LLMResponseCache(tiers)
@@ -1,3 +1,176 @@
+import threading
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of chat model clients.
+    Clients are memoized by (provider, model, temperature, max_tokens), so
+    nodes configured alike share one client, and every OpenAI client uses the
+    same keep-alive httpx connection pools (one sync, one async) instead of
+    opening its own.  Gemini clients are not pooled: the Google SDK keeps its
+    own transport (gRPC by default) and takes no httpx client, so each
+    distinct Gemini setting has its own connections and ``http_pool`` does
+    not apply to them.
+    Usage:
+        models = ModelRegistry(models_cfg=cfg["models"], http_cfg=cfg["http_pool"])
+        llm = models.for_role("synthesizer_writer")
+    ``client_factory(model_name, temperature, max_tokens)`` replaces the
+    provider clients (e.g. with fakes for offline benchmarks).
+    The async pool's connections belong to the event loop that used them:
+    owners running the graph in a loop ``await models.aclose()`` there
+    before ``close()``.
+    """
+    def __init__(self, models_cfg: dict = None, http_cfg: dict = None, default_model: str = "gpt-4o-mini",
+                 client_factory=None):
+        models_cfg = models_cfg or {}
+        self.defaults = {"model": default_model, "temperature": 0.0, "max_tokens": 4096}
+        self.defaults.update(models_cfg.get("default") or {})
+        self.roles = models_cfg.get("roles") or {}
+        self.http_cfg = http_cfg or {}
+        self.client_factory = client_factory
+        self._clients = {}
+        self._http_client = None
+        self._http_async_client = None
+        self._lock = threading.Lock()
+        # Separate from _lock: http_clients() is called from _create while get() holds it.
+        self._http_lock = threading.Lock()
+
+    def get(self, model_name=None, temperature=None, max_tokens=None, lazy=False):
+        """
+        Return the shared client for these settings, creating it on first use.
+        With ``lazy=True`` a ``DeferredModel`` is returned instead and the
+        client (and its provider SDK import) is only created on its first call.
+        """
+        model_name = model_name or self.defaults["model"]
+        temperature = self.defaults["temperature"] if temperature is None else temperature
+        max_tokens = max_tokens or self.defaults["max_tokens"]
+        if lazy:
+            return DeferredModel(self, model_name, temperature, max_tokens)
+        key = (_provider(model_name), model_name, temperature, max_tokens)
+        with self._lock:
+            llm = self._clients.get(key)
+            if llm is None:
+                llm = self._clients[key] = self._create(model_name, temperature, max_tokens)
+            return llm
+
+    def for_role(self, role: str, lazy=False):
+        """Client for an agent role: the ``models.roles.<role>`` settings over ``models.default``."""
+        settings = {**self.defaults, **(self.roles.get(role) or {})}
+        return self.get(settings["model"], settings["temperature"], settings["max_tokens"], lazy=lazy)
+
+    def http_clients(self):
+        """The shared ``(httpx.Client, httpx.AsyncClient)`` pair, created lazily."""
+        with self._http_lock:
+            if self._http_client is None:
+                import httpx
+                limits = httpx.Limits(
+                    max_connections=self.http_cfg.get("max_connections", 100),
+                    max_keepalive_connections=self.http_cfg.get("max_keepalive_connections", 20),
+                    keepalive_expiry=self.http_cfg.get("keepalive_expiry", 30.0),
+                )
+                timeout = httpx.Timeout(self.http_cfg.get("timeout", 60.0), connect=self.http_cfg.get("connect_timeout", 10.0))
+                self._http_client = httpx.Client(limits=limits, timeout=timeout)
+                self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+            return self._http_client, self._http_async_client
+
+    async def aclose(self):
+        """Close the shared async connection pool; await it on the event loop that ran the clients."""
+        with self._http_lock:
+            client, self._http_async_client = self._http_async_client, None
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        """
+        Close the sync connection pool and drop the clients (see ``aclose``
+        for the async pool); later calls create fresh clients and pools.
+        """
+        with self._lock:
+            self._clients.clear()
+        with self._http_lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._http_client = self._http_async_client = None
+
+    def stats(self) -> dict:
+        return {"clients": len(self._clients), "models": sorted({key[1] for key in self._clients})}
+
+    def _create(self, model_name, temperature, max_tokens):
+        if self.client_factory is not None:
+            return self.client_factory(model_name, temperature, max_tokens)
+        provider = _provider(model_name)
+        if provider == "openai":
+            # Ensure the model name is compatible with OpenAI's API
+            from langchain_openai import ChatOpenAI
+            http_client, http_async_client = self.http_clients()
+            return ChatOpenAI(
+                model=model_name,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        if provider == "google":
+            # Initialize Gemini model (if applicable); it keeps its own transport, see the class docstring.
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            return ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        raise ValueError(f"Unsupported model name: {model_name}. Supported models are 'gpt' and 'gemini'.")
+
+
+class DeferredModel:
+    """
+    Stand-in for a registry client that is created on first use.
+    ``model_name``, ``temperature`` and ``max_tokens`` are plain attributes,
+    so cache keys, rate limiting and token counting never force creation;
+    everything else (``invoke``, ``abatch``, ...) is forwarded to the shared
+    client from ``ModelRegistry.get``.
+    """
+    def __init__(self, registry: ModelRegistry, model_name, temperature, max_tokens):
+        self.registry = registry
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def resolve(self):
+        return self.registry.get(self.model_name, self.temperature, self.max_tokens)
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set in __init__.
+        if name.startswith("__") or name == "registry":
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"DeferredModel({self.model_name!r}, temperature={self.temperature!r}, max_tokens={self.max_tokens!r})"
+
+
+def _provider(model_name):
+    if 'gpt' in model_name:
+        return "openai"
+    if 'gemini' in model_name:
+        return "google"
+    return None
+
+
+def registry_from_config(cfg: dict, client_factory=None) -> ModelRegistry:
+    """
+    Registry for the ``models`` and ``http_pool`` sections of config.yaml;
+    the top-level ``model_name`` is the default model.
+    """
+    return ModelRegistry(
+        models_cfg=cfg.get("models"),
+        http_cfg=cfg.get("http_pool"),
+        default_model=cfg.get("model_name", "gpt-4o-mini"),
+        client_factory=client_factory,
+    )
+
+
+_default_registry = ModelRegistry()
+
 
 def initialize_llm(model_name="gpt-4o-mini", temperature=0.0, max_tokens=4096):
     """
@@ -7,26 +180,10 @@ def initialize_llm(model_name="gpt-4o-mini", temperature=0.0, max_tokens=4096):
         temperature (float): Sampling temperature for the model.
         max_tokens (int): Maximum number of tokens to generate.
     Returns:
-        ChatOpenAI: An instance of the ChatOpenAI model.
+        ChatOpenAI: An instance of the ChatOpenAI model, shared with every
+        other caller asking for the same settings.
     """
-    if 'gpt' in model_name:
-        # Ensure the model name is compatible with OpenAI's API
-        from langchain_openai import ChatOpenAI
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-    elif 'gemini' in model_name:
-        # Initialize Gemini model (if applicable)
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
-    else:
-        raise ValueError(f"Unsupported model name: {model_name}. Supported models are 'gpt' and 'gemini'.")
+    return _default_registry.get(model_name, temperature, max_tokens)
 
 def parse_llm_response(response):
     """
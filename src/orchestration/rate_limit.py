@@ -0,0 +1,154 @@
+"""
+Token-bucket rate limiting of LLM calls per provider.
+
+A ``ProviderLimiter`` holds two buckets - requests per minute and tokens per
+minute - refilled continuously.  Before a call, the agent helpers reserve
+one request plus an estimate of its tokens (prompt tokens + the model's
+output cap) and wait until both buckets can pay; afterwards ``settle``
+corrects the token bucket with the usage the provider reported.
+
+Limiters reach the nodes through the run config: put a ``RateLimits``
+registry under ``configurable["rate_limits"]`` (see ``RATE_LIMIT_CONFIG_KEY``)
+and every LLM call made by ``_invoke_and_route`` / map-reduce summarization
+is scheduled against the limiter of its model's provider.  Runs without a
+registry are not limited.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from src.prompts.token_budget import count_tokens, model_name_of
+
+RATE_LIMIT_CONFIG_KEY = "rate_limits"
+DEFAULT_OUTPUT_TOKENS = 1024
+
+# Model-name prefixes -> provider keys of the ``rate_limits`` config section.
+PROVIDER_PREFIXES = {
+    "gpt": "openai",
+    "o1": "openai",
+    "o3": "openai",
+    "o4": "openai",
+    "text-embedding": "openai",
+    "gemini": "google",
+    "claude": "anthropic",
+}
+
+
+def provider_of(model_name: Optional[str]) -> str:
+    for prefix, provider in PROVIDER_PREFIXES.items():
+        if (model_name or "").startswith(prefix):
+            return provider
+    return "default"
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket of ``per_minute`` units holding at most
+    ``capacity`` (default: one minute's worth). Thread-safe; usable from
+    sync and async code.
+    """
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Take ``amount`` now (possibly going negative); return seconds to wait."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def acquire(self, amount: float = 1) -> float:
+        wait = self._reserve(amount)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, amount: float = 1) -> float:
+        wait = self._reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def refund(self, amount: float) -> None:
+        """Return (or, if negative, additionally charge) ``amount`` units."""
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+    @property
+    def level(self) -> float:
+        with self._lock:
+            return min(self.capacity, self._level + (time.monotonic() - self._updated) * self.rate)
+
+
+class ProviderLimiter:
+    """RPM and TPM buckets for one provider."""
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.waited_seconds = 0.0
+
+    def acquire(self, tokens: int) -> None:
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                self.waited_seconds += bucket.acquire(amount)
+
+    async def aacquire(self, tokens: int) -> None:
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                self.waited_seconds += await bucket.aacquire(amount)
+
+    def settle(self, estimated: int, response) -> None:
+        """Correct the token bucket with the usage reported on ``response``."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        actual = usage.get("total_tokens")
+        if self.tokens is not None and actual is not None:
+            self.tokens.refund(estimated - actual)
+
+
+class RateLimits:
+    """
+    Provider limiters built from the ``rate_limits`` section of config.yaml.
+    Usage:
+        limits = RateLimits({"openai": {"rpm": 500, "tpm": 200000}})
+        config = {"configurable": {"thread_id": "1", RATE_LIMIT_CONFIG_KEY: limits}}
+    """
+    def __init__(self, limits_cfg: Optional[Dict[str, dict]] = None):
+        self.limiters = {
+            provider: ProviderLimiter(rpm=cfg.get("rpm"), tpm=cfg.get("tpm"))
+            for provider, cfg in (limits_cfg or {}).items()
+        }
+
+    def for_model(self, model_name: Optional[str]) -> Optional[ProviderLimiter]:
+        return self.limiters.get(provider_of(model_name)) or self.limiters.get("default")
+
+    def stats(self) -> dict:
+        return {
+            provider: {
+                "waited_seconds": round(limiter.waited_seconds, 3),
+                "requests_available": limiter.requests.level if limiter.requests else None,
+                "tokens_available": limiter.tokens.level if limiter.tokens else None,
+            }
+            for provider, limiter in self.limiters.items()
+        }
+
+
+def limiter_for(llm, config) -> Optional[ProviderLimiter]:
+    """The limiter that applies to ``llm`` in this run, if any."""
+    limits = ((config or {}).get("configurable") or {}).get(RATE_LIMIT_CONFIG_KEY)
+    return limits.for_model(model_name_of(llm)) if limits is not None else None
+
+
+def estimate_tokens(llm, prompt: str) -> int:
+    """Prompt tokens plus the model's output cap."""
+    output = getattr(llm, "max_tokens", None) or DEFAULT_OUTPUT_TOKENS
+    return count_tokens(prompt, model_name_of(llm)) + output
@@ -0,0 +1,131 @@
+"""
+Supervisor plans: which agents a pass runs, and whether the graph loops.
+
+The Supervisor is asked to answer with a JSON object::
+
+    {"directive": "...", "skip": ["GapFinder"], "done": false}
+
+``parse_plan`` reads it (a reply that is not JSON is kept as a plain
+directive that skips nothing), and ``RoutingPolicy.plan`` applies the
+deterministic rules on top:
+
+- LiteratureSearch is skipped when the local FAISS corpus already answers the
+  question: its best hit has a relevance of at least ``corpus_threshold``
+  (0..1, ``FAISSTool.similarity_search_with_relevance_scores``).  The hits are
+  stored as ``artifacts.corpus_hits`` in place of the search results;
+- GapFinder is skipped when the run supplies no material to analyze;
+- ``done`` skips every agent, and is ignored until a synthesis exists.
+
+Skipped nodes still run, as no-ops (see ``dependency_graph.timed_node``), so
+joins downstream of them fire.  After SynthesizerWriter the graph goes back
+to the Supervisor (``RoutingPolicy.next_after``) until it reports ``done`` or
+``iteration_count`` reaches ``max_iterations``.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.graph import END
+
+SUPERVISOR = "Supervisor"
+# Agents the Supervisor may leave out of a pass.
+SKIPPABLE = ("LiteratureSearch", "Summarizer", "GapFinder")
+ALL_AGENTS = SKIPPABLE + ("SynthesizerWriter",)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+@dataclass
+class SupervisorPlan:
+    directive: str
+    skip: Tuple[str, ...] = ()
+    done: bool = False
+    reasons: Dict[str, str] = field(default_factory=dict)
+
+    def to_state(self) -> dict:
+        return {"skip": list(self.skip), "done": self.done, "reasons": dict(self.reasons)}
+
+
+def parse_plan(text: str) -> SupervisorPlan:
+    """Read the Supervisor's JSON plan; anything else becomes a directive that skips nothing."""
+    match = _JSON_OBJECT.search(text or "")
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return SupervisorPlan(directive=(text or "").strip())
+    skip = data.get("skip") or []
+    if isinstance(skip, str):
+        skip = [skip]
+    skip = tuple(name for name in SKIPPABLE if name in skip)
+    return SupervisorPlan(
+        directive=str(data.get("directive") or "").strip(),
+        skip=skip,
+        done=bool(data.get("done", False)),
+        reasons={name: "not needed (supervisor)" for name in skip},
+    )
+
+
+@dataclass
+class RoutingPolicy:
+    """
+    Deterministic routing rules, from the ``routing`` section of config.yaml.
+    Usage:
+        policy = RoutingPolicy.from_config(cfg.get("routing"))
+        plan = policy.plan(state, parse_plan(reply), corpus_hits)
+    """
+    max_iterations: int = 1
+    corpus_threshold: Optional[float] = None
+    corpus_k: int = 5
+
+    @classmethod
+    def from_config(cls, section: Optional[dict]) -> "RoutingPolicy":
+        section = section or {}
+        return cls(
+            max_iterations=max(1, int(section.get("max_iterations", 1))),
+            corpus_threshold=section.get("corpus_threshold"),
+            corpus_k=int(section.get("corpus_k", 5)),
+        )
+
+    def corpus_hits(self, corpus, state: dict) -> List[Tuple[Any, float]]:
+        """``(Document, relevance)`` pairs answering the question, best first; empty if the check is off."""
+        artifacts = state.get("artifacts") or {}
+        if corpus is None or self.corpus_threshold is None or artifacts.get("literature_results"):
+            return []
+        question = state.get("research_question") or ""
+        if not question:
+            return []
+        try:
+            hits = corpus.similarity_search_with_relevance_scores(question, k=self.corpus_k)
+        except Exception:
+            # An empty or unavailable corpus just means searching as usual.
+            return []
+        return sorted(hits, key=lambda hit: hit[1], reverse=True)
+
+    def plan(self, state: dict, proposed: SupervisorPlan, hits: List[Tuple[Any, float]] = ()) -> SupervisorPlan:
+        artifacts = state.get("artifacts") or {}
+        skip = dict(proposed.reasons)
+        done = proposed.done and bool(artifacts.get("synthesis"))
+        if done:
+            skip = {name: "research complete (supervisor)" for name in ALL_AGENTS}
+        if hits and hits[0][1] >= self.corpus_threshold:
+            skip.setdefault("LiteratureSearch", f"answered by the local corpus (relevance {hits[0][1]:.2f})")
+        if not artifacts.get("to_analyze"):
+            skip.setdefault("GapFinder", "no material to analyze")
+        return SupervisorPlan(
+            directive=proposed.directive,
+            skip=tuple(name for name in ALL_AGENTS if name in skip),
+            done=done,
+            reasons=skip,
+        )
+
+    def next_after(self, state: dict) -> str:
+        """Route after SynthesizerWriter: back to the Supervisor, or END."""
+        plan = state.get("plan") or {}
+        if plan.get("done") or state.get("iteration_count", 0) >= self.max_iterations:
+            return END
+        return SUPERVISOR
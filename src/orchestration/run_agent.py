@@ -2,7 +2,7 @@ import yaml
 import dotenv
 import os
 from dotenv import load_dotenv
-from src.orchestration.graph_builder import graph
+from src.orchestration.graph_builder import default_graph
 
 def main():
     with open("config/config.yaml") as f:
@@ -12,14 +12,30 @@ def main():
     user_query = cfg.get("initial_query")
     thread_id = cfg.get("thread_id")
     model_name = cfg.get("model_name")
+    research = default_graph()
+    graph = research.graph
 
-    # Start the workflow
-    response = graph.invoke(
+    # Stream the workflow: tokens as they are generated, a line per finished node
+    config = {"configurable": {"thread_id": thread_id}}
+    current_node = None
+    for mode, chunk in graph.stream(
         {"messages": [{"role": "user", "content": user_query}]},
-        {"configurable": {"thread_id": thread_id}}
-    )
-    # Print the final output (could be improved to stream or show intermediate results)
+        config,
+        stream_mode=["updates", "messages"],
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != current_node:
+                current_node = metadata.get("langgraph_node")
+                print(f"\n[{current_node}] ", end="")
+            print(message.content, end="", flush=True)
+        else:
+            for node in chunk:
+                print(f"\n-- {node} done")
+    response = research.resolve(graph.get_state(config).values)
     print(response)
+    print(research.timing_report(response))
+    print(research.trace_summary(response))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Request coalescing ("single flight") for identical concurrent work.
+
+While a call for some key is in flight, further calls with the same key do
+not start their own: they wait for the first one (the leader) and share its
+result or its exception.  Nothing is cached - the key is forgotten as soon as
+the call finishes.
+
+Both calling conventions are supported::
+
+    flights = SingleFlight("arxiv")
+    records, leader = flights.do(key, lambda: source.search(query, k))          # threads
+    response, leader = await flights.ado(key, lambda: llm.ainvoke(prompt))      # asyncio
+
+In the async form the work runs as its own task and every caller awaits it
+through ``asyncio.shield``: a caller that is cancelled (e.g. its client
+disconnected) only stops waiting, and the work is cancelled when no caller is
+left.  A leader that fails therefore never cancels its followers; they
+receive its exception, exactly as if they had made the call themselves.
+
+Results are shared objects: callers must treat them as read-only (or copy).
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from src.orchestration.instrumentation import METRICS
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive form of a query."""
+    return _SPACES.sub(" ", str(text)).strip().rstrip("?!.").strip().casefold()
+
+
+def normalize_request(value: Any) -> Any:
+    """``normalize_text`` applied to every string in a JSON-like value (dict keys sorted)."""
+    if isinstance(value, str):
+        return normalize_text(value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_request(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_request(v) for v in value)
+    return value
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key; ``name`` labels its metrics
+    (``polyscholar_single_flight_requests_total{name, role}``).
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[Any, Hashable], _AsyncCall] = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._followers = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run ``fn()`` unless a call for ``key`` is in flight; returns ``(result, leader)``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async ``do``: ``fn()`` returns an awaitable, run as a task shared by all callers."""
+        slot = (asyncio.get_running_loop(), key)
+        while True:
+            with self._lock:
+                call = self._async_calls.get(slot)
+                # A finished call may still be registered until its done callback runs.
+                leader = call is None or call.task.done()
+                if leader:
+                    call = self._async_calls[slot] = _AsyncCall(asyncio.ensure_future(fn()))
+                    call.task.add_done_callback(lambda _, call=call: self._forget(slot, call))
+                call.waiters += 1
+            self._count(leader)
+            try:
+                return await asyncio.shield(call.task), leader
+            except asyncio.CancelledError:
+                if call.task.cancelled() and not asyncio.current_task().cancelling():
+                    # Abandoned by every caller before we joined; we still want it.
+                    continue
+                with self._lock:
+                    call.waiters -= 1
+                    abandoned = call.waiters == 0
+                if abandoned:
+                    call.task.cancel()
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leaders": self._leaders, "followers": self._followers,
+                    "in_flight": len(self._calls) + len(self._async_calls)}
+
+    def _forget(self, slot, call: _AsyncCall) -> None:
+        with self._lock:
+            if self._async_calls.get(slot) is call:
+                del self._async_calls[slot]
+        # Nobody may be left to retrieve the outcome of an abandoned call.
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def _count(self, leader: bool) -> None:
+        with self._lock:
+            if leader:
+                self._leaders += 1
+            else:
+                self._followers += 1
+        with METRICS.lock:
+            METRICS.single_flight.inc(name=self.name, role="leader" if leader else "follower")
@@ -3,41 +3,81 @@ This module defines the orchestration state and dynamic context logic for PolySc
 
 - AppState: The central state container for all static inputs, dynamic artifacts, logs, and short-term memory.
 - format_dynamic_block: Helper to render a readable summary of the current state for prompt construction.
+- merge_artifacts: Reducer that lets parallel branches update different artifact keys in the same step.
+- ring_buffer: Reducer factory for the logs; each keeps only its newest LOG_LIMITS entries.
+
+Large artifact values are held as references into an ArtifactStore (see artifact_store.py).
 
 All agent nodes should treat AppState as the single source of truth for runtime facts.
 """
 
-from typing import Any
+from typing import Any, Callable
 from typing_extensions import TypedDict, Annotated
 from langgraph.graph.message import add_messages
 import operator
 
+# Entries kept per log channel; older entries drop off the front.  Timings and
+# spans outlive several passes of a multi-iteration run, so they keep more.
+LOG_LIMITS = {
+    "progress_log": 200,
+    "issues_log": 200,
+    "supervisor_directives": 50,
+    "node_timings": 500,
+    "trace": 1000,
+    "messages": 100,
+}
+
 class Issue(TypedDict):
     source_agent: str
     description: str
     status: str           # OPEN | RESOLVED
 
+def merge_artifacts(left: dict[str, Any] | None, right: dict[str, Any] | None) -> dict[str, Any]:
+    """
+    Reducer for ``artifacts``: merge by key, later writes win per key.
+    Needed because independent nodes run as parallel branches and LangGraph
+    rejects concurrent writes to a channel without a reducer.
+    """
+    return {**(left or {}), **(right or {})}
+
+def ring_buffer(maxlen: int, reducer: Callable[[list, list], list] = operator.add) -> Callable[[list, list], list]:
+    """
+    Reducer that appends with ``reducer`` and keeps the newest ``maxlen``
+    entries, so logs stay bounded in long multi-iteration runs.
+    """
+    def reduce(left: list | None, right: list | None) -> list:
+        merged = reducer(left or [], right or [])
+        return merged[-maxlen:] if len(merged) > maxlen else merged
+    reduce.__name__ = f"ring_buffer_{maxlen}"
+    return reduce
+
 class AppState(TypedDict, total=False):
     # --- static inputs ---
     topic: str
     research_question: str
     inclusion_criteria: list[str]
     exclusion_criteria: list[str]
+    vector_action: str                          # "add" | "query" for the VectorIndex node
 
     # --- dynamic artefacts ---
-    artifacts: dict[str, Any]                   # overwritten by key
-    progress_log: Annotated[list[str], operator.add]
-    issues_log:   Annotated[list[Issue], operator.add]
-    supervisor_directives: Annotated[list[str], operator.add]
+    artifacts: Annotated[dict[str, Any], merge_artifacts]   # merged by key
+    progress_log: Annotated[list[str], ring_buffer(LOG_LIMITS["progress_log"])]
+    issues_log:   Annotated[list[Issue], ring_buffer(LOG_LIMITS["issues_log"])]
+    supervisor_directives: Annotated[list[str], ring_buffer(LOG_LIMITS["supervisor_directives"])]
+    plan: dict[str, Any]                        # Supervisor's routing plan, see routing.py
     iteration_count: int
+    node_timings: Annotated[list[dict], ring_buffer(LOG_LIMITS["node_timings"])]   # see dependency_graph.timed_node
+    trace: Annotated[list[dict], ring_buffer(LOG_LIMITS["trace"])]                 # LLM / tool spans, see instrumentation.py
 
     # --- short-term memory ---
-    messages: Annotated[list, add_messages]
+    messages: Annotated[list, ring_buffer(LOG_LIMITS["messages"], add_messages)]
 
 def format_dynamic_block(state: AppState) -> str:
     """
     Render a readable summary of the current AppState for prompt construction.
     Handles missing or incomplete state gracefully.
+    Only the last three entries of each log are read, so the cost does not
+    grow with the run.
     """
     try:
         parts = [
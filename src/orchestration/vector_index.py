@@ -1,24 +1,171 @@
-from src.tools.faiss_tool import FAISSTool
-from langchain.embeddings import OpenAIEmbeddings
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.orchestration.instrumentation import tool_span
 from src.orchestration.state import format_dynamic_block
 
-def vector_index_node(embeddings_model="text-embedding-3-large"):
-    embeddings = OpenAIEmbeddings(embeddings_model)
-    faiss_tool = FAISSTool(embeddings)
-    def node(state):
+logger = logging.getLogger(__name__)
+
+
+class VectorIndexNode:
+    """
+    The VectorIndex node. The FAISS store behind it (and faiss itself) is
+    only loaded on first use, so building the graph stays cheap and a run
+    that never touches the corpus never opens it.
+    """
+    def __init__(self, embeddings_model="text-embedding-3-large", persist_path=None, dimension=None,
+                 snapshot_every=1000, index_spec=None, embedding_cache=None, embeddings=None, ingestion=None,
+                 retrieval=None, sharding=None):
+        self.embeddings_model = embeddings_model
+        self.embeddings = embeddings
+        self.persist_path = persist_path
+        self.dimension = dimension
+        self.snapshot_every = snapshot_every
+        self.index_spec = index_spec
+        self.embedding_cache = embedding_cache
+        self.ingestion = ingestion
+        self.retrieval = retrieval or {}
+        self.sharding = sharding or {}
+        self._faiss_tool = None
+        self._pipeline = None
+        self._retriever = None
+        self._background = None
+        self._lock = threading.Lock()
+
+    @property
+    def faiss_tool(self):
+        if self._faiss_tool is None:
+            with self._lock:
+                if self._faiss_tool is None:
+                    from src.tools.embedding_service import shared_embedding_service
+                    embeddings = self.embeddings or shared_embedding_service(
+                        self.embeddings_model, self.embedding_cache
+                    )
+                    options = dict(persist_path=self.persist_path, dimension=self.dimension,
+                                   snapshot_every=self.snapshot_every, index_spec=self.index_spec)
+                    if self.sharding.get("shards", 1) > 1:
+                        from src.tools.sharded_faiss import ShardedFAISSTool
+                        self._faiss_tool = ShardedFAISSTool.from_config(embeddings, self.sharding, **options)
+                    else:
+                        from src.tools.faiss_tool import FAISSTool
+                        self._faiss_tool = FAISSTool(embeddings, **options)
+        return self._faiss_tool
+
+    @property
+    def pipeline(self):
+        """Chunking / dedup / batched-embedding pipeline over the store (``src.tools.ingestion``)."""
+        if self._pipeline is None:
+            from src.tools.ingestion import IngestionPipeline
+            faiss_tool = self.faiss_tool
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = IngestionPipeline.from_config(faiss_tool, self.ingestion)
+        return self._pipeline
+
+    @property
+    def retriever(self):
+        """Hybrid BM25 + dense retriever (``src.tools.hybrid_search``), or None in dense mode."""
+        if self._retriever is None and self.retrieval.get("mode", "dense") == "hybrid":
+            from src.tools.hybrid_search import HybridRetriever
+            faiss_tool = self.faiss_tool
+            with self._lock:
+                if self._retriever is None:
+                    self._retriever = HybridRetriever.from_config(faiss_tool, self.retrieval)
+        return self._retriever
+
+    def search(self, query, k=5, filter=None):
+        """
+        Documents for ``query`` (a string), or a list of result lists for a
+        list of queries; hybrid when ``retrieval.mode`` is "hybrid".
+        """
+        retriever = self.retriever
+        if isinstance(query, str):
+            if retriever is not None:
+                return retriever.search(query, k=k, filter=filter)
+            return self.faiss_tool.similarity_search(query, k=k, filter=filter)
+        if retriever is not None:
+            return retriever.search_batch(query, k=k, filter=filter)
+        return [self.faiss_tool.similarity_search(q, k=k, filter=filter) for q in query]
+
+    def submit_records(self, records):
+        """
+        Index LiteratureSearch records in the background; the run does not
+        wait for it. Pending ingestion finishes on ``close()``.
+        """
+        with self._lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-ingest")
+        records = list(records)
+        # The store is opened on the background thread too, not in the caller's node.
+        future = self._background.submit(lambda: self.pipeline.ingest_records(records))
+        future.add_done_callback(_log_failure)
+        return future
+
+    def similarity_search(self, query, k=5, filter=None):
+        """Search the corpus (lets the node stand in for its ``FAISSTool`` as a search source)."""
+        with tool_span("faiss.query", k=k):
+            return self.search(query, k=k, filter=filter)
+
+    def similarity_search_with_relevance_scores(self, query, k=5, filter=None):
+        """``(Document, relevance)`` pairs from the corpus, relevance in [0, 1] (dense only)."""
+        with tool_span("faiss.query", k=k):
+            return self.faiss_tool.similarity_search_with_relevance_scores(query, k=k, filter=filter)
+
+    def close(self):
+        """Finish background ingestion and snapshot vectors added since the last snapshot."""
+        if self._background is not None:
+            self._background.shutdown(wait=True)
+            self._background = None
+        if self._faiss_tool is not None:
+            self._faiss_tool.close()
+
+    def __call__(self, state):
         # Add or query documents based on state
         action = state.get("vector_action", "query")
         result = None
         if action == "add":
             documents = state.get("artifacts", {}).get("documents", [])
             ids = state.get("artifacts", {}).get("doc_ids", None)
-            result = faiss_tool.add_documents(documents, ids=ids)
+            with tool_span("faiss.add", documents=len(documents)):
+                if ids is None:
+                    # Chunked, deduplicated by content hash and embedded in batches.
+                    result = self.pipeline.ingest_documents(documents).to_dict()
+                else:
+                    result = self.faiss_tool.add_documents(documents, ids=ids)
             log = "Documents added to vector index."
         else:
             query_text = state.get("artifacts", {}).get("query_text", "")
             k = state.get("artifacts", {}).get("k", 5)
             filter = state.get("artifacts", {}).get("filter", None)
-            result = faiss_tool.similarity_search(query_text, k=k, filter=filter)
+            # A list of query texts is searched as one batch.
+            with tool_span("faiss.query", k=k):
+                result = self.search(query_text, k=k, filter=filter)
             log = "Vector index query completed."
         return {"update": {"artifacts": {"vector_index_result": result}, "progress_log": [log]}}
-    return node
\ No newline at end of file
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("Background ingestion failed: %s", future.exception())
+
+
+def vector_index_node(embeddings_model="text-embedding-3-large", persist_path=None, dimension=None,
+                      snapshot_every=1000, index_spec=None, embedding_cache=None, embeddings=None,
+                      ingestion=None, retrieval=None, sharding=None):
+    """
+    Build the VectorIndex node. With ``persist_path`` the FAISS corpus is
+    warm-started from (and periodically snapshotted to) that directory;
+    ``index_spec`` selects the FAISS index type (see ``src.tools.faiss_index``).
+    Embeddings are routed through the shared, cached ``EmbeddingService``
+    unless ``embeddings`` is given. The store is opened on first use
+    (``node.faiss_tool``). Documents added without ``doc_ids`` go through the
+    ingestion pipeline configured by ``ingestion`` (``src.tools.ingestion``).
+    ``retrieval`` selects dense or hybrid BM25 + dense search
+    (``src.tools.hybrid_search``). With ``sharding.shards`` > 1 the corpus is
+    split across that many worker processes (``src.tools.sharded_faiss``).
+    """
+    return VectorIndexNode(embeddings_model, persist_path=persist_path, dimension=dimension,
+                           snapshot_every=snapshot_every, index_spec=index_spec,
+                           embedding_cache=embedding_cache, embeddings=embeddings, ingestion=ingestion,
+                           retrieval=retrieval, sharding=sharding)
@@ -1,13 +1,220 @@
+"""Compiled prompt templates with role prompts and hot reload.
+
+Two kinds of prompts are served:
+
+- ``build("summary_prompt", ...)`` renders a ``templates/*.json`` file whose
+  ``"template"`` is a format string (files holding a schema instead of a
+  string stay available in ``templates`` but cannot be built);
+- ``build(role="synthesizer_writer", ...)`` renders a role prompt: the
+  static prefix (``system_context.txt``, ``team_context.txt`` and
+  ``roles/<role>.txt``) followed by the role's template from
+  ``roles/roles.json``.
+
+Templates are compiled once at load time into literal and placeholder
+segments, and their placeholders are checked then: unsupported syntax, or a
+role without a role file, fails the load rather than a run.  Every prompt of
+a role starts with the same byte-identical prefix, which is what provider-side
+prompt caching keys on.  The template directory is polled (at most every
+``reload_interval`` seconds, from ``build``) and reloaded when a file
+changes; a reload that fails validation keeps the previous templates.
+"""
 from pathlib import Path
 import json
+import logging
+import string
+import threading
+import time
+
+from src.prompts.token_budget import PromptBudgetExceeded, count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_FILES = ("system_context.txt", "team_context.txt")
+ROLES_DIR = "roles"
+ROLES_FILE = "roles.json"
+
+
+class PromptTemplateError(ValueError):
+    """A template is malformed, or a build call does not match its placeholders."""
+
+
+class CompiledTemplate:
+    """
+    A format string split once into ``(literal, placeholder)`` segments.
+    Only plain ``{name}`` placeholders are supported; ``{{``/``}}`` escape braces.
+    """
+    def __init__(self, name: str, source: str, prefix: str = "", optional=()):
+        self.name = name
+        self.segments = []
+        try:
+            parsed = list(string.Formatter().parse(source))
+        except ValueError as e:
+            raise PromptTemplateError(f"Template '{name}': {e}") from e
+        for literal, field, spec, conversion in parsed:
+            if field is not None and (not field.isidentifier() or spec or conversion):
+                raise PromptTemplateError(
+                    f"Template '{name}': unsupported placeholder '{{{field}}}' (use plain {{name}})"
+                )
+            self.segments.append((literal, field))
+        self.placeholders = tuple(dict.fromkeys(f for _, f in self.segments if f is not None))
+        unknown = set(optional) - set(self.placeholders)
+        if unknown:
+            raise PromptTemplateError(f"Template '{name}': optional fields {sorted(unknown)} are not placeholders")
+        self.optional = frozenset(optional)
+        self.required = tuple(p for p in self.placeholders if p not in self.optional)
+        # Everything up to the first placeholder never changes between calls.
+        lead = []
+        for literal, field in self.segments:
+            lead.append(literal)
+            if field is not None:
+                break
+        self.static_prefix = prefix + "".join(lead)
+        self._prefix = prefix
+
+    def render(self, values: dict) -> str:
+        missing = [p for p in self.required if p not in values]
+        if missing:
+            raise PromptTemplateError(f"Template '{self.name}' is missing values for {missing}")
+        parts = [self._prefix]
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values.get(field, "")))
+        return "".join(parts)
+
 
 class PromptManager:
-    def __init__(self, template_dir: str):
-        self.templates = {
-            t.stem: json.loads(t.read_text())
-            for t in Path(template_dir).glob("*.json")
-        }
-
-    def build(self, name: str, **kwargs) -> str:
-        tpl = self.templates[name]
-        return tpl["template"].format(**kwargs)
\ No newline at end of file
+    def __init__(self, template_dir: str, reload_interval: float = 2.0):
+        self.template_dir = Path(template_dir)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self._signature = self._dir_signature()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Loading and hot reload
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        templates, compiled = {}, {}
+        for t in sorted(self.template_dir.glob("*.json")):
+            templates[t.stem] = json.loads(t.read_text())
+            source = templates[t.stem].get("template")
+            if isinstance(source, str):
+                compiled[t.stem] = CompiledTemplate(t.stem, source)
+
+        roles = {}
+        roles_file = self.template_dir / ROLES_DIR / ROLES_FILE
+        if roles_file.exists():
+            context = "".join(
+                (self.template_dir / f).read_text().rstrip() + "\n\n"
+                for f in CONTEXT_FILES if (self.template_dir / f).exists()
+            )
+            for role, spec in json.loads(roles_file.read_text()).items():
+                role_file = self.template_dir / ROLES_DIR / f"{role}.txt"
+                if not role_file.exists():
+                    raise PromptTemplateError(f"Role '{role}' has no {role_file}")
+                prefix = context + role_file.read_text().strip() + "\n\n"
+                roles[role] = CompiledTemplate(f"role:{role}", spec["template"], prefix, spec.get("optional", ()))
+
+        # Swap everything at once so concurrent builds never see a mix.
+        self.templates, self._compiled, self._roles = templates, compiled, roles
+
+    def reload(self) -> bool:
+        """Reload the templates now. Returns False (keeping the old ones) if they are invalid."""
+        with self._lock:
+            self._signature = self._dir_signature()
+            try:
+                self._load()
+            except (PromptTemplateError, ValueError, KeyError, OSError) as e:
+                logger.error("Prompt template reload failed, keeping previous templates: %s", e)
+                return False
+            return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self.reload_interval is None or now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        if self._dir_signature() != self._signature:
+            self.reload()
+
+    def _dir_signature(self):
+        return tuple(sorted(
+            (str(p.relative_to(self.template_dir)), p.stat().st_mtime_ns, p.stat().st_size)
+            for p in self.template_dir.rglob("*") if p.is_file() and p.suffix in (".json", ".txt")
+        ))
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    @property
+    def roles(self):
+        return tuple(self._roles)
+
+    def _template(self, name: str = None, role: str = None) -> CompiledTemplate:
+        if (name is None) == (role is None):
+            raise PromptTemplateError("Pass exactly one of a template name or role=")
+        if role is not None:
+            if role not in self._roles:
+                raise PromptTemplateError(f"Unknown role '{role}'. Known roles: {sorted(self._roles)}")
+            return self._roles[role]
+        if name not in self._compiled:
+            if name in self.templates:
+                raise PromptTemplateError(f"Template '{name}' is a schema, not a format string")
+            raise PromptTemplateError(f"Unknown template '{name}'")
+        return self._compiled[name]
+
+    def validate(self, name: str = None, role: str = None, fields=()) -> None:
+        """
+        Check that a caller supplying ``fields`` matches the template: raises
+        PromptTemplateError for missing required or unknown placeholders.
+        Node factories call this when the graph is built.
+        """
+        tpl = self._template(name, role)
+        missing = [p for p in tpl.required if p not in fields]
+        unknown = [f for f in fields if f not in tpl.placeholders]
+        if missing or unknown:
+            raise PromptTemplateError(f"Template '{tpl.name}': missing {missing}, unknown {unknown}")
+
+    def static_prefix(self, name: str = None, role: str = None) -> str:
+        """The cached, call-independent beginning of every prompt from this template."""
+        self._maybe_reload()
+        return self._template(name, role).static_prefix
+
+    def build(self, name: str = None, role: str = None, token_budget: int = None, model: str = None,
+              fit_field: str = "content", **kwargs) -> str:
+        """
+        Render template ``name`` or the prompt for ``role``. With
+        ``token_budget``, the ``fit_field`` value is truncated so the whole
+        prompt fits in that many tokens (counted for ``model``);
+        PromptBudgetExceeded is raised if even an empty ``fit_field`` does
+        not fit.
+        """
+        self._maybe_reload()
+        tpl = self._template(name, role)
+        prompt = tpl.render(kwargs)
+        if token_budget is None:
+            return prompt
+        value = str(kwargs.get(fit_field, ""))
+        # Token counts are not exactly additive; a few passes converge.
+        for _ in range(4):
+            over = count_tokens(prompt, model) - token_budget
+            if over <= 0:
+                return prompt
+            keep = count_tokens(value, model) - over
+            if keep <= 0:
+                raise PromptBudgetExceeded(
+                    f"Prompt '{tpl.name}' needs more than {token_budget} tokens without any '{fit_field}'"
+                )
+            value = truncate_to_tokens(value, keep, model)
+            prompt = tpl.render({**kwargs, fit_field: value})
+        return prompt
+
+    def available_tokens(self, *args, token_budget: int, model: str = None, fit_field: str = "content",
+                         **kwargs) -> int:
+        """Tokens left for ``fit_field`` once the rest of the prompt is rendered."""
+        fixed = self.build(*args, model=model, **{**kwargs, fit_field: ""})
+        return token_budget - count_tokens(fixed, model)
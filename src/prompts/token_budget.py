@@ -0,0 +1,110 @@
+# Token counting and budgeting for prompt assembly
+# Uses tiktoken when it (and its encoding files) are available, otherwise a chars/4 estimate
+"""Per-model token accounting used by ``PromptManager.build`` and map-reduce summarization.
+
+``count_tokens`` and ``truncate_to_tokens`` use the model's tiktoken encoding
+when one can be loaded; for unknown models (Gemini, offline machines without
+the encoding files) they fall back to ``CHARS_PER_TOKEN`` characters per
+token, which slightly over-counts English prose and so errs on the safe side.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+CHARS_PER_TOKEN = 4
+DEFAULT_ENCODING = "o200k_base"
+
+
+class PromptBudgetExceeded(ValueError):
+    """The fixed part of a prompt alone exceeds the token budget."""
+
+
+@dataclass
+class TokenBudget:
+    max_input_tokens: int = 24000    # prompt tokens allowed per LLM call
+    chunk_tokens: int = 3000         # content tokens per map-step chunk
+    max_concurrency: int = 8         # map-step calls in flight
+    max_depth: int = 3               # hierarchical reduce levels before truncating
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> "TokenBudget":
+        """Build a budget from the ``token_budget`` section of config.yaml."""
+        cfg = dict(cfg or {})
+        unknown = set(cfg) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown token_budget options: {sorted(unknown)}")
+        return cls(**cfg)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: Optional[str]):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        # Not an OpenAI model; its tokenizer is unknown, so estimate.
+        return None
+    except Exception:
+        # Encoding files could not be fetched (e.g. no network).
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Keep at most ``max_tokens`` tokens from the start of ``text``."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def split_into_chunks(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Greedily pack paragraphs (then lines, then hard token slices for
+    anything still too long) into chunks of at most ``max_tokens`` tokens.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if count_tokens(paragraph, model) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            while count_tokens(line, model) > max_tokens:
+                head = truncate_to_tokens(line, max_tokens, model)
+                pieces.append(head)
+                line = line[len(head):]
+            pieces.append(line)
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        tokens = count_tokens(piece, model) + 1   # + separator
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def model_name_of(llm) -> Optional[str]:
+    """Best-effort model name of a LangChain chat model, for token counting."""
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None)
@@ -1,39 +1,155 @@
-
 # Arxiv tool integration for LangGraph agents
 # Uses the latest LangChain community API (see arxiv_docs.txt)
-from typing import Annotated, Any
-from langchain_community.utilities.arxiv import ArxivAPIWrapper
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Iterator, List, Optional
 from langchain_core.tools import tool
 
+from src.orchestration.single_flight import SingleFlight, normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARAMS = {
+    "top_k_results": 3,
+    "ARXIV_MAX_QUERY_LENGTH": 300,
+    "load_max_docs": 3,
+    "load_all_available_meta": False,
+    "doc_content_chars_max": 40000
+}
+
+
+@dataclass
+class ArxivPaper:
+    """
+    One arXiv search hit. Metadata comes from the search response; the full
+    text is only downloaded (and cached on the record) when ``full_text()``
+    is called.
+    """
+    arxiv_id: str
+    title: str
+    authors: List[str]
+    abstract: str
+    published: str
+    url: str = ""
+    pdf_url: str = ""
+    doi: str = ""
+    categories: List[str] = field(default_factory=list)
+    max_chars: int = 40000
+    _text: Optional[str] = field(default=None, repr=False, compare=False)
+    _text_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @classmethod
+    def from_result(cls, result, max_chars: int = 40000) -> "ArxivPaper":
+        """Build a record from an ``arxiv.Result``."""
+        return cls(
+            arxiv_id=result.get_short_id(),
+            title=result.title,
+            authors=[a.name for a in result.authors],
+            abstract=result.summary,
+            published=str(result.published.date()) if result.published else "",
+            url=result.entry_id,
+            pdf_url=result.pdf_url or "",
+            doi=result.doi or "",
+            categories=list(result.categories),
+            max_chars=max_chars,
+        )
+
+    def full_text(self) -> str:
+        """Download the PDF and extract its text (once), truncated to ``max_chars``."""
+        with self._text_lock:
+            if self._text is None:
+                self._text = _pdf_text(self.pdf_url)[: self.max_chars]
+            return self._text
+
+    def to_record(self, abstract_chars: Optional[int] = None) -> dict:
+        """Compact, JSON-serialisable form for prompts, state and indexing."""
+        return {
+            "title": self.title,
+            "abstract": self.abstract[:abstract_chars] if abstract_chars else self.abstract,
+            "authors": ", ".join(self.authors),
+            "published": self.published,
+            "url": self.url,
+            "doi": self.doi,
+            "arxiv_id": self.arxiv_id,
+        }
+
+
+def _pdf_text(pdf_url: str) -> str:
+    if not pdf_url:
+        return ""
+    try:
+        import fitz
+    except ImportError:
+        raise ImportError(
+            "PyMuPDF package not found, please install it with `pip install pymupdf`"
+        )
+    import httpx
+
+    response = httpx.get(pdf_url, follow_redirects=True, timeout=60.0)
+    response.raise_for_status()
+    with fitz.open(stream=response.content, filetype="pdf") as pdf:
+        return "".join(page.get_text() for page in pdf)
+
+
 class ArxivTool:
     """
     Wrapper for the ArxivAPIWrapper to fetch academic paper metadata from arXiv.
     Usage:
         arxiv_tool = ArxivTool()
         result = arxiv_tool.run("1605.08386")
+
+    Structured results:
+        for paper in arxiv_tool.search("retrieval augmented generation", max_results=5):
+            print(paper.title, paper.abstract[:200])
+            text = paper.full_text()   # fetched on demand
     """
     def __init__(self, params: dict = None):
         
-        # Initialize the ArxivAPIWrapper with parameters.
+        # Parameters for the ArxivAPIWrapper, which is built on first use.
         # If no parameters are provided, use default values.
         if params is None:
-            params = {
-                "top_k_results": 3,
-                "ARXIV_MAX_QUERY_LENGTH": 300,
-                "load_max_docs": 3,
-                "load_all_available_meta": False,
-                "doc_content_chars_max": 40000
-            }
-        self.api = ArxivAPIWrapper(
-            arxiv_search=Any,
-            arxiv_exceptions=Any,
-            continue_on_failure=False,
-            **params
-        )
-        
+            params = dict(DEFAULT_PARAMS)
+        self.params = params
+        self._api = None
+        self._flights = SingleFlight("arxiv.run")
+
+    @property
+    def api(self):
+        """The ``ArxivAPIWrapper``, created (and langchain_community imported) on first use."""
+        if self._api is None:
+            from langchain_community.utilities.arxiv import ArxivAPIWrapper
+            self._api = ArxivAPIWrapper(
+                arxiv_search=Any,
+                arxiv_exceptions=Any,
+                continue_on_failure=False,
+                **self.params
+            )
+        return self._api
 
     def run(self, query: str) -> str:
         """
         Query arXiv for papers or authors. Returns formatted metadata string or error message.
+        Concurrent calls with the same (normalized) query share one request.
+        """
+        result, _ = self._flights.do(normalize_text(query), lambda: self.api.run(query))
+        return result
+
+    def search(self, query: str, max_results: Optional[int] = None) -> Iterator[ArxivPaper]:
+        """
+        Yield ``ArxivPaper`` records for ``query`` as result pages arrive.
+        Nothing is requested until the generator is iterated, and stopping
+        early skips the remaining pages. API errors end the stream.
         """
-        return self.api.run(query)
\ No newline at end of file
+        import arxiv
+
+        max_results = max_results or self.params.get("top_k_results", DEFAULT_PARAMS["top_k_results"])
+        max_query = self.params.get("ARXIV_MAX_QUERY_LENGTH", DEFAULT_PARAMS["ARXIV_MAX_QUERY_LENGTH"])
+        max_chars = self.params.get("doc_content_chars_max", DEFAULT_PARAMS["doc_content_chars_max"])
+        client = arxiv.Client(page_size=min(max_results, 100))
+        results = client.results(arxiv.Search(query=query[:max_query], max_results=max_results))
+        try:
+            for result in results:
+                yield ArxivPaper.from_result(result, max_chars=max_chars)
+        except arxiv.ArxivError as e:
+            logger.warning("arXiv search failed for %r: %s", query, e)
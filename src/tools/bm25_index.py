@@ -0,0 +1,131 @@
+"""Okapi BM25 keyword index over the FAISS docstore.
+
+Dense embeddings blur exact terms - method names, dataset acronyms, version
+numbers - that matter when reviewing literature.  ``BM25Index`` is a small
+inverted index (term -> {doc id: term frequency}) kept next to the vector
+index by ``FAISSTool``: documents are added and removed incrementally with
+the vectors, and the index is pickled into each store snapshot.
+
+Tokens are lower-cased runs of letters and digits, joined across inner
+hyphens, dots and underscores, so ``BERT-base``, ``GPT-4`` and ``v1.5`` stay
+single terms.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import pickle
+import re
+import threading
+from collections import Counter
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[^\W_]+(?:[-._][^\W_]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.casefold()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental BM25 index.
+    Usage:
+        index = BM25Index()
+        index.add("doc-1", "Sparse attention with BigBird on TriviaQA")
+        index.search("bigbird triviaqa", k=10)    # [("doc-1", 2.3), ...]
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._terms: Dict[str, Tuple[str, ...]] = {}   # doc id -> its distinct terms, for removal
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_documents(cls, pairs: Iterable[Tuple[str, str]], **params) -> "BM25Index":
+        """Build from ``(doc_id, text)`` pairs."""
+        index = cls(**params)
+        for doc_id, text in pairs:
+            index.add(doc_id, text)
+        return index
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index ``text`` under ``doc_id`` (replacing an earlier text for the same id)."""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._lengths:
+                self._remove(doc_id)
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._terms[doc_id] = tuple(counts)
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._lengths:
+                    self._remove(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        for term in self._terms.pop(doc_id):
+            docs = self._postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        The ``k`` best ``(doc_id, score)`` pairs for ``query``, best first;
+        ``accept`` (doc id -> bool) drops documents, e.g. for a metadata filter.
+        """
+        terms = Counter(tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            average = self._total_length / n
+            for term, query_tf in terms.items():
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._lengths[doc_id] / average)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + query_tf * idf * tf * (self.k1 + 1.0) / (tf + norm)
+        if accept is None:
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return list(islice((item for item in ranked if accept(item[0])), k))
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._lengths
+
+    def dumps(self) -> bytes:
+        """Pickle the index; safe while other threads add and remove documents."""
+        with self._lock:
+            return pickle.dumps(self)
+
+    def __getstate__(self):
+        with self._lock:
+            state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
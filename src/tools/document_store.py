@@ -0,0 +1,202 @@
+"""
+SQLite document store and write log of a persistent ``FAISSTool``.
+
+One row per stored document, keyed by its FAISS vector id::
+
+    documents(vector_id, doc_id, text, metadata, vector)
+
+Documents are read on demand (``search``), so opening a store does not load
+the corpus.  The table doubles as the store's write-ahead log: a row keeps
+its float32 ``vector`` until a snapshot of the FAISS index contains it, and
+every delete leaves a ``tombstones`` row.  Vector ids only grow, so the
+writes a snapshot is missing are the rows with ``vector_id >= next_id`` and
+the tombstones with ``seq > tombstone_seq`` at the time it was taken; the
+tool replays them on startup and prunes them with ``compacted`` once a newer
+snapshot covers them.
+
+All methods are thread-safe (one connection behind a lock).
+"""
+from __future__ import annotations
+
+import pickle
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    vector_id INTEGER PRIMARY KEY,
+    doc_id    TEXT NOT NULL UNIQUE,
+    text      TEXT NOT NULL,
+    metadata  BLOB NOT NULL,
+    vector    BLOB
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    seq       INTEGER PRIMARY KEY AUTOINCREMENT,
+    vector_id INTEGER NOT NULL,
+    doc_id    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Documents of a persistent vector store, in SQLite.
+    Usage:
+        docs = SQLiteDocstore("data/vector/documents.sqlite")
+        docs.append([(0, "doc-1", "text", {"year": 2024}, vector)], next_id=1)
+        docs.search("doc-1")        # Document, or "ID doc-1 not found."
+        docs.delete(["doc-1"])      # also records a tombstone
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # -- Docstore interface ---------------------------------------------
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, metadata FROM documents WHERE doc_id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=pickle.loads(row[1]))
+
+    def delete(self, ids: List) -> None:
+        """Delete documents (unknown IDs are ignored), recording a tombstone for each."""
+        with self._lock, self._conn:
+            for doc_id in ids:
+                row = self._conn.execute("SELECT vector_id FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM documents WHERE vector_id = ?", row)
+                self._conn.execute("INSERT INTO tombstones (vector_id, doc_id) VALUES (?, ?)", (row[0], doc_id))
+
+    # -- writes ---------------------------------------------------------
+
+    def append(self, rows: Iterable[Tuple[int, str, str, dict, np.ndarray]], next_id: int) -> None:
+        """Insert ``(vector_id, doc_id, text, metadata, vector)`` rows and record ``next_id``, atomically."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO documents (vector_id, doc_id, text, metadata, vector) VALUES (?, ?, ?, ?, ?)",
+                ((vector_id, doc_id, text, pickle.dumps(metadata or {}), np.asarray(vector, dtype=np.float32).tobytes())
+                 for vector_id, doc_id, text, metadata, vector in rows),
+            )
+            self._set("next_id", next_id)
+
+    def compacted(self, next_id: int, tombstone_seq: int) -> None:
+        """
+        Drop the log entries a snapshot now covers: the vectors below
+        ``next_id`` and the tombstones up to ``tombstone_seq``.
+        """
+        with self._lock, self._conn:
+            start = self._get("vectors_from", 0)
+            self._conn.execute(
+                "UPDATE documents SET vector = NULL WHERE vector_id >= ? AND vector_id < ?", (start, next_id)
+            )
+            self._set("vectors_from", max(start, next_id))
+            self._conn.execute("DELETE FROM tombstones WHERE seq <= ?", (tombstone_seq,))
+
+    def set_dimension(self, dimension: int) -> None:
+        with self._lock, self._conn:
+            self._set("dimension", dimension)
+
+    # -- reads ----------------------------------------------------------
+
+    @property
+    def dimension(self) -> Optional[int]:
+        with self._lock:
+            return self._get("dimension", None)
+
+    @property
+    def next_id(self) -> int:
+        with self._lock:
+            return self._get("next_id", 0)
+
+    @property
+    def tombstone_seq(self) -> int:
+        """Sequence number of the latest tombstone (0 if there is none)."""
+        with self._lock:
+            row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tombstones'").fetchone()
+        return row[0] if row else 0
+
+    def ids(self) -> Dict[int, str]:
+        """``{vector_id: doc_id}`` of every stored document."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT vector_id, doc_id FROM documents"))
+
+    def metadatas(self) -> Iterator[Tuple[int, dict]]:
+        """``(vector_id, metadata)`` of every stored document."""
+        with self._lock:
+            rows = self._conn.execute("SELECT vector_id, metadata FROM documents").fetchall()
+        for vector_id, metadata in rows:
+            yield vector_id, pickle.loads(metadata)
+
+    def texts(self, since: int = 0) -> Iterator[Tuple[str, str]]:
+        """``(doc_id, text)`` of the documents with ``vector_id >= since``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, text FROM documents WHERE vector_id >= ? ORDER BY vector_id", (since,)
+            ).fetchall()
+        return iter(rows)
+
+    def vectors(self, since: int, dimension: int, batch_size: int = 65536) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """``(vector_ids, vectors)`` batches of the documents with ``vector_id >= since``."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT vector_id, vector FROM documents WHERE vector_id >= ? ORDER BY vector_id LIMIT ?",
+                    (since, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), dimension)
+            yield ids, vectors
+            since = int(ids[-1]) + 1
+
+    def tombstones(self, after: int) -> List[Tuple[int, int, str]]:
+        """``(seq, vector_id, doc_id)`` of the deletes with ``seq > after``, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, vector_id, doc_id FROM tombstones WHERE seq > ? ORDER BY seq", (after,)
+            ).fetchall()
+
+    # -- maintenance ----------------------------------------------------
+
+    def import_documents(self, documents: Sequence[Tuple[int, str, Document]], dimension: int) -> None:
+        """Fill an empty store from ``(vector_id, doc_id, Document)`` already in a snapshot (no vectors)."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO documents (vector_id, doc_id, text, metadata) VALUES (?, ?, ?, ?)",
+                ((vector_id, doc_id, doc.page_content, pickle.dumps(doc.metadata or {}))
+                 for vector_id, doc_id, doc in documents),
+            )
+            next_id = max((vector_id for vector_id, _, _ in documents), default=-1) + 1
+            self._set("next_id", next_id)
+            self._set("vectors_from", next_id)
+            self._set("dimension", dimension)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, key: str, default):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set(self, key: str, value: int) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
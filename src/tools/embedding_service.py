@@ -0,0 +1,312 @@
+# Shared embedding service for the memory store and the FAISS vector store
+# Batches, deduplicates and caches embedding calls behind the LangChain Embeddings interface
+"""Batched, deduplicated and cached text embeddings.
+
+``EmbeddingService`` wraps any LangChain ``Embeddings`` implementation:
+
+- texts are hashed (xxh3-128) and each distinct text is embedded at most once,
+  within a call and across calls;
+- misses are sent to the provider in batches of ``batch_size`` with up to
+  ``max_concurrency`` batches in flight;
+- vectors are kept in an ``EmbeddingCache`` - an append-only, memory-mapped
+  float16/float32 matrix per model on disk, or a plain dict when no cache
+  directory is configured.
+
+Because it implements ``Embeddings`` itself, the service can be handed to
+``FAISSTool`` (and through it to LangChain's FAISS store) or ``MemoryStore``
+unchanged.  ``shared_embedding_service`` returns one instance per
+``(model, cache_dir, provider override)`` so every component in a process
+shares the cache.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import xxhash
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache directory must not be shared between processes
+    fcntl = None
+
+VECTORS_FILE = "vectors.bin"
+KEYS_FILE = "keys.txt"
+META_FILE = "meta.json"
+LOCK_FILE = "cache.lock"
+
+
+def text_hash(text: str) -> str:
+    return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+
+class EmbeddingCache:
+    """
+    Append-only vector cache keyed by text hash, one directory per model.
+    Vectors live in a flat binary file read through ``np.memmap``; row ``i``
+    belongs to line ``i`` of ``keys.txt``.  Appends write the vectors, then
+    the keys, under an exclusive ``flock`` on ``cache.lock``, so several
+    processes (the server and an ingestion run, say) can share a directory:
+    each picks up the others' keys before appending and places its rows
+    after the last keyed row.  Rows a crash left without a key are cut off
+    on load (and before the next append), a torn last key line is dropped.
+    With ``path=None`` the cache is held in memory only.
+    """
+    def __init__(self, path: Optional[str] = None, dtype: str = "float16"):
+        self.path = Path(path) if path else None
+        self.dtype = np.dtype(dtype)
+        self.dimension = None
+        self._rows: Dict[str, int] = {}
+        self._lines = 0           # rows backed by a complete line of keys.txt
+        self._keys_read = 0       # bytes of keys.txt consumed
+        self._memory: Dict[str, np.ndarray] = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self._lock, self._file_lock():
+                self._repair()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the cache directory across processes (no-op without ``fcntl``)."""
+        with open(self.path / LOCK_FILE, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Read keys appended since the last call (by any process), complete lines only."""
+        if self.dimension is None:
+            meta_path = self.path / META_FILE
+            if not meta_path.exists():
+                return
+            meta = json.loads(meta_path.read_text())
+            self.dimension = meta["dimension"]
+            self.dtype = np.dtype(meta["dtype"])
+        keys_path = self.path / KEYS_FILE
+        if not keys_path.exists():
+            return
+        with open(keys_path, "rb") as f:
+            f.seek(self._keys_read)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        self._keys_read += len(complete)
+        for key in complete.decode("ascii").splitlines():
+            self._rows.setdefault(key, self._lines)
+            self._lines += 1
+
+    def _repair(self):
+        """
+        With the file lock held: drop a torn last key line and vector rows
+        that have no key, so the next row written is row ``_lines``.
+        """
+        self._refresh()
+        if self.dimension is None:
+            return
+        keys_path = self.path / KEYS_FILE
+        if keys_path.exists() and keys_path.stat().st_size > self._keys_read:
+            os.truncate(keys_path, self._keys_read)
+        vectors_path = self.path / VECTORS_FILE
+        row_bytes = self.dimension * self.dtype.itemsize
+        size = vectors_path.stat().st_size if vectors_path.exists() else 0
+        if size > self._lines * row_bytes:
+            os.truncate(vectors_path, self._lines * row_bytes)
+        elif size < self._lines * row_bytes:
+            raise RuntimeError(f"{vectors_path} holds {size // row_bytes} vectors but {keys_path} "
+                               f"{self._lines} keys; delete the cache directory to rebuild it")
+
+    def _matrix(self):
+        """Memory map covering every committed row, remapped after appends."""
+        if self._mmap is None or len(self._mmap) < self._lines:
+            self._mmap = np.memmap(
+                self.path / VECTORS_FILE, dtype=self.dtype, mode="r",
+                shape=(self._lines, self.dimension),
+            )
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors (as float32) for the keys that are present."""
+        with self._lock:
+            if self.path is None:
+                return {k: self._memory[k] for k in keys if k in self._memory}
+            if any(k not in self._rows for k in keys):
+                # Other processes may have embedded them meanwhile.
+                self._refresh()
+            found = [(k, self._rows[k]) for k in keys if k in self._rows]
+            if not found:
+                return {}
+            matrix = self._matrix()
+            return {k: np.asarray(matrix[row], dtype=np.float32) for k, row in found}
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Store new vectors; keys already present are skipped."""
+        with self._lock:
+            if self.path is None:
+                for key, vector in items.items():
+                    self._memory.setdefault(key, np.asarray(vector, dtype=np.float32))
+                return
+            with self._file_lock():
+                self._repair()
+                new = [(k, v) for k, v in items.items() if k not in self._rows]
+                if not new:
+                    return
+                if self.dimension is None:
+                    self.dimension = len(new[0][1])
+                    (self.path / META_FILE).write_text(
+                        json.dumps({"dimension": self.dimension, "dtype": self.dtype.name})
+                    )
+                block = np.asarray([v for _, v in new], dtype=self.dtype)
+                with open(self.path / VECTORS_FILE, "ab") as f:
+                    f.write(block.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                keys = "".join(f"{k}\n" for k, _ in new).encode("ascii")
+                with open(self.path / KEYS_FILE, "ab") as f:
+                    f.write(keys)
+                for offset, (key, _) in enumerate(new):
+                    self._rows[key] = self._lines + offset
+                self._lines += len(new)
+                self._keys_read += len(keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in (self._memory if self.path is None else self._rows)
+
+    def __len__(self) -> int:
+        return len(self._memory if self.path is None else self._rows)
+
+
+class EmbeddingService(Embeddings):
+    """
+    LangChain ``Embeddings`` facade that batches, deduplicates and caches.
+    Usage:
+        service = EmbeddingService(OpenAIEmbeddings(model="text-embedding-3-large"),
+                                   model_name="text-embedding-3-large",
+                                   cache_dir="data/embeddings")
+        vectors = service.embed_documents(texts)
+    """
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        dtype: str = "float16",
+        batch_size: int = 512,
+        max_concurrency: int = 4,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        cache_path = Path(cache_dir) / _slug(self.model_name) if cache_dir else None
+        self.cache = EmbeddingCache(cache_path, dtype=dtype)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._batches = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(t) for t in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # Distinct texts not cached yet, in first-seen order.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors.update(self._embed_missing(missing))
+
+        with self._stats_lock:
+            self._misses += len(missing)
+            self._hits += len(texts) - len(missing)
+        return [vectors[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _embed_missing(self, missing: Dict[str, str]) -> Dict[str, np.ndarray]:
+        keys = list(missing)
+        batches = [keys[i : i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+
+        def run(batch):
+            return batch, self.embeddings.embed_documents([missing[k] for k in batch])
+
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            results = [run(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = list(pool.map(run, batches))
+
+        embedded = {}
+        for batch, batch_vectors in results:
+            # Round through the storage dtype so cache hits and misses agree.
+            matrix = np.asarray(batch_vectors, dtype=self.cache.dtype).astype(np.float32)
+            embedded.update(zip(batch, matrix))
+        self.cache.put_many(embedded)
+        with self._stats_lock:
+            self._batches += len(batches)
+        return embedded
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "provider_batches": self._batches,
+                "cached_vectors": len(self.cache),
+            }
+
+
+_services: Dict[tuple, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def shared_embedding_service(model_name: str, cache_cfg: Optional[dict] = None, embeddings=None) -> EmbeddingService:
+    """
+    Return the process-wide service for ``model_name`` configured by the
+    ``embedding_cache`` section of config.yaml, creating it on first use.
+    ``embeddings`` overrides the default ``OpenAIEmbeddings`` provider; each
+    override object gets its own service.
+    """
+    cache_cfg = cache_cfg or {}
+    # An injected provider gets its own service (sharing the model's cache
+    # directory) instead of silently reusing, or being reused as, the default one.
+    key = (model_name, cache_cfg.get("dir"), None if embeddings is None else id(embeddings))
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            if embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                embeddings = OpenAIEmbeddings(model=model_name)
+            service = EmbeddingService(
+                embeddings,
+                model_name=model_name,
+                cache_dir=cache_cfg.get("dir"),
+                dtype=cache_cfg.get("dtype", "float16"),
+                batch_size=cache_cfg.get("batch_size", 512),
+                max_concurrency=cache_cfg.get("max_concurrency", 4),
+            )
+            _services[key] = service
+        return service
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
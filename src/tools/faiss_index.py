@@ -0,0 +1,341 @@
+# FAISS index construction, training, tuning and benchmarking for FAISSTool
+# Uses faiss.index_factory so every supported type shares one code path
+"""Approximate-nearest-neighbour index selection for the FAISS vector store.
+
+Supported ``type`` values for ``IndexSpec``:
+
+- ``flat``     exact brute-force search (optionally scalar-quantized)
+- ``ivf_flat`` inverted file over coarse centroids, full vectors per list
+- ``ivf_pq``   inverted file with product-quantized codes (optional OPQ rotation)
+- ``hnsw``     graph-based search (optionally scalar-quantized storage)
+
+Everything except an unquantized ``flat``/``hnsw`` needs training; FAISSTool
+therefore starts such stores as a flat index and migrates to the configured
+type once ``migrate_threshold`` vectors are present, using a sample of the
+stored vectors for training.
+
+``recall_latency_report`` measures recall@k against exact search together with
+query latency so settings can be chosen from data::
+
+    python -m src.tools.faiss_index --n 50000 --dim 256 --k 10
+"""
+import argparse
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+@dataclass
+class IndexSpec:
+    type: str = "flat"
+    nlist: int = 1024                 # IVF coarse centroids
+    pq_m: int = 64                    # PQ sub-quantizers (must divide the dimension)
+    pq_nbits: int = 8                 # bits per PQ code
+    opq: bool = False                 # learn an OPQ rotation before PQ
+    scalar_quantizer: Optional[str] = None  # e.g. "SQ8", "SQfp16"
+    hnsw_m: int = 32                  # HNSW graph degree
+    nprobe: int = 16                  # IVF lists visited per query
+    ef_search: int = 64               # HNSW candidate list size per query
+    migrate_threshold: int = 50000    # switch from flat once this many vectors exist
+    train_sample_size: int = 100000   # vectors sampled for training
+    search_params: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, cfg: Optional[dict]) -> "IndexSpec":
+        """Build a spec from the ``vector_index`` section of config.yaml."""
+        cfg = dict(cfg or {})
+        unknown = set(cfg) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown vector_index options: {sorted(unknown)}")
+        spec = cls(**cfg)
+        if spec.type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {spec.type}. Supported types are {INDEX_TYPES}.")
+        return spec
+
+    def factory_string(self, dimension: int) -> str:
+        """Translate the spec into a ``faiss.index_factory`` description."""
+        storage = self.scalar_quantizer or "Flat"
+        if self.type == "flat":
+            return storage
+        if self.type == "ivf_flat":
+            return f"IVF{self.nlist},{storage}"
+        if self.type == "ivf_pq":
+            if dimension % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} must divide the dimension {dimension}")
+            prefix = f"OPQ{self.pq_m}," if self.opq else ""
+            return f"{prefix}IVF{self.nlist},PQ{self.pq_m}x{self.pq_nbits}"
+        if self.type == "hnsw":
+            suffix = f"_{self.scalar_quantizer}" if self.scalar_quantizer else ""
+            return f"HNSW{self.hnsw_m}{suffix}"
+        raise ValueError(f"Unsupported index type: {self.type}")
+
+    def query_params(self) -> Dict[str, int]:
+        """Query-time knobs applicable to this index type."""
+        params = {}
+        if self.type in ("ivf_flat", "ivf_pq"):
+            params["nprobe"] = self.nprobe
+        elif self.type == "hnsw":
+            params["efSearch"] = self.ef_search
+        params.update(self.search_params)
+        return params
+
+
+def build_index(spec: IndexSpec, dimension: int):
+    """Create an (untrained) index for ``spec``."""
+    return faiss.index_factory(dimension, spec.factory_string(dimension), faiss.METRIC_L2)
+
+
+def sample_vectors(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    """Uniform random sample of rows used for training."""
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size=size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def train_index(index, vectors: np.ndarray, sample_size: int = 100000) -> None:
+    """Train ``index`` on a sample of ``vectors`` if it requires training."""
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(sample_vectors(vectors, sample_size), dtype=np.float32))
+
+
+def set_search_params(index, **params) -> None:
+    """
+    Apply query-time parameters such as ``nprobe`` or ``efSearch``.
+    Works through wrappers like OPQ pre-transforms.
+    """
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+
+def search_parameters(index, selector):
+    """
+    ``SearchParameters`` restricting ``index.search`` to the ids accepted by
+    ``selector``, carrying the index's current ``nprobe`` / ``efSearch``
+    (parameters passed to a search replace the index-level settings).
+    """
+    index = unwrap_ids(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.SearchParametersPreTransform(index_params=search_parameters(index.index, selector))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def unwrap_ids(index):
+    """The index inside an ``IndexIDMap`` / ``IndexIDMap2`` wrapper (downcast), or ``index`` itself."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def is_flat(index) -> bool:
+    return isinstance(unwrap_ids(index), faiss.IndexFlat)
+
+
+def is_hnsw(index) -> bool:
+    return isinstance(unwrap_ids(index), faiss.IndexHNSW)
+
+
+def has_own_ids(index) -> bool:
+    """True if ``index`` stores caller-given ids (``add_with_ids`` / ``remove_ids`` by id)."""
+    index = faiss.downcast_index(index)
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or faiss.try_extract_index_ivf(index) is not None
+
+
+def with_ids(index):
+    """
+    ``index`` able to hold arbitrary int64 ids.  IVF indexes store ids
+    natively; anything else is wrapped in an ``IndexIDMap2`` whose ids start
+    as the current positions (0 .. ntotal - 1).
+    """
+    if has_own_ids(index):
+        return index
+    ntotal = index.ntotal
+    # The wrapper only accepts an empty index; hide the vectors while constructing it.
+    index.ntotal = 0
+    try:
+        wrapped = faiss.IndexIDMap2(index)
+    finally:
+        index.ntotal = ntotal
+    if ntotal:
+        faiss.copy_array_to_vector(np.arange(ntotal, dtype=np.int64), wrapped.id_map)
+        wrapped.ntotal = ntotal
+        wrapped.construct_rev_map()
+    return wrapped
+
+
+def build_id_index(spec: "IndexSpec", dimension: int):
+    """An (untrained) index for ``spec`` that stores caller-given ids."""
+    return with_ids(build_index(spec, dimension))
+
+
+def open_index(path: str, mmap: bool = True):
+    """
+    Read an index file, memory-mapped by default: flat codes (also those of
+    HNSW storage) via ``IO_FLAG_MMAP_IFC``, inverted lists of IVF indexes via
+    ``IO_FLAG_MMAP``.  A mapped index is read-only; adding to it (or to a
+    ``clone_index`` of it) aborts, so copy it with ``open_index(path, mmap=False)``.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC)
+    except RuntimeError:
+        # IVF inverted lists only support the older IO_FLAG_MMAP.
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+
+
+def reconstruct_all(index) -> np.ndarray:
+    """Return every stored vector of a flat index in insertion order."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return unwrap_ids(index).reconstruct_n(0, index.ntotal)
+
+
+def stored_ids(index) -> np.ndarray:
+    """Ids of the vectors of a flat index, in storage order."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def build_trained_index(spec: IndexSpec, vectors: np.ndarray, ids: np.ndarray, chunk_size: int = 65536):
+    """
+    A ``spec`` index trained on a sample of ``vectors`` and holding all of
+    them under ``ids`` (added in chunks to bound the temporary copies).
+    """
+    new_index = build_id_index(spec, vectors.shape[1])
+    train_index(new_index, vectors, spec.train_sample_size)
+    for start in range(0, len(vectors), chunk_size):
+        new_index.add_with_ids(vectors[start:start + chunk_size], ids[start:start + chunk_size])
+    set_search_params(new_index, **spec.query_params())
+    return new_index
+
+
+# ----------------------------------------------------------------------
+# Recall / latency report
+# ----------------------------------------------------------------------
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Fraction of the true top-k neighbours present in the returned top-k."""
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    specs: List[IndexSpec],
+    k: int = 10,
+    sweeps: Optional[Dict[str, List[Dict[str, int]]]] = None,
+) -> List[dict]:
+    """
+    Build each spec over ``vectors`` and measure recall@k and per-query latency
+    for ``queries`` against exact search.
+    ``sweeps`` maps an index type to a list of query-parameter settings to try
+    (defaults to the spec's own ``query_params()``).
+    Returns one row per (spec, parameter setting).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for spec in specs:
+        index = build_index(spec, vectors.shape[1])
+        start = time.perf_counter()
+        train_index(index, vectors, spec.train_sample_size)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        for params in (sweeps or {}).get(spec.type) or [spec.query_params()]:
+            set_search_params(index, **params)
+            latencies = []
+            found = np.empty((len(queries), k), dtype=np.int64)
+            for i, q in enumerate(queries):
+                t0 = time.perf_counter()
+                _, found[i : i + 1] = index.search(q[None, :], k)
+                latencies.append(time.perf_counter() - t0)
+            latencies_ms = np.array(latencies) * 1000
+            rows.append({
+                "index": spec.factory_string(vectors.shape[1]),
+                "params": dict(params),
+                f"recall@{k}": round(recall_at_k(found, truth, k), 4),
+                "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+                "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+                "build_s": round(build_seconds, 3),
+                "bytes_per_vector": round(_serialized_size(index) / max(index.ntotal, 1), 1),
+            })
+    return rows
+
+
+def format_report(rows: List[dict]) -> str:
+    """Render report rows as an aligned text table."""
+    if not rows:
+        return ""
+    columns = list(rows[0])
+    cells = [[str(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)) for r in cells]
+    return "\n".join(lines)
+
+
+def _serialized_size(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _default_specs(dimension: int, nlist: int) -> List[IndexSpec]:
+    pq_m = next(m for m in (64, 32, 16, 8, 4, 2, 1) if dimension % m == 0)
+    return [
+        IndexSpec(type="flat"),
+        IndexSpec(type="flat", scalar_quantizer="SQ8"),
+        IndexSpec(type="ivf_flat", nlist=nlist),
+        IndexSpec(type="ivf_pq", nlist=nlist, pq_m=pq_m),
+        IndexSpec(type="ivf_pq", nlist=nlist, pq_m=pq_m, opq=True),
+        IndexSpec(type="hnsw"),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall@k vs latency report for FAISS index types.")
+    parser.add_argument("--index-path", help="Sample vectors from a saved flat index instead of random data.")
+    parser.add_argument("--n", type=int, default=50000, help="Number of random base vectors.")
+    parser.add_argument("--dim", type=int, default=256, help="Dimension of random vectors.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    if args.index_path:
+        vectors = reconstruct_all(open_index(args.index_path))
+    else:
+        vectors = rng.standard_normal((args.n, args.dim), dtype=np.float32)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + rng.normal(scale=0.01, size=queries.shape).astype(np.float32)
+
+    sweeps = {
+        "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "hnsw": [{"efSearch": e} for e in (16, 64, 256)],
+    }
+    rows = recall_latency_report(vectors, queries, _default_specs(vectors.shape[1], args.nlist), args.k, sweeps)
+    print(format_report(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,70 @@
-
 # FAISS vector store integration for LangGraph agents
 # Uses langchain_community FAISS and InMemoryDocstore
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
 import faiss
+import numpy as np
+from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.in_memory import InMemoryDocstore
 
+from src.tools.bm25_index import BM25Index
+from src.tools.document_store import SQLiteDocstore
+from src.tools.faiss_index import (
+    IndexSpec,
+    build_id_index,
+    build_trained_index,
+    is_flat,
+    is_hnsw,
+    open_index,
+    reconstruct_all,
+    search_parameters,
+    set_search_params,
+    stored_ids,
+    with_ids,
+)
+from src.tools.metadata_index import MetadataIndex, filter_fields
+
+logger = logging.getLogger(__name__)
+
+# Layout of a persistent vector store directory:
+#   <persist_path>/documents.sqlite     documents and the write log (``src.tools.document_store``)
+#   <persist_path>/CURRENT              name of the live snapshot (swapped atomically)
+#   <persist_path>/snapshots/<name>/    index.faiss, meta.json, bm25.pkl
+# Stores written before the SQLite docstore keep their documents in the
+# snapshot's index.pkl; they are imported into documents.sqlite on open.
+CURRENT_FILE = "CURRENT"
+DOCUMENTS_FILE = "documents.sqlite"
+SNAPSHOT_DIR = "snapshots"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+META_FILE = "meta.json"
+KEYWORD_FILE = "bm25.pkl"
+SNAPSHOTS_TO_KEEP = 2
+COMPACT_FRACTION = 0.1   # also wait for changes worth this share of the snapshot before compacting
+
+
+def distance_to_relevance(distance):
+    """Cosine similarity clamped to [0, 1] from a squared L2 distance between unit vectors."""
+    return min(1.0, max(0.0, 1.0 - float(distance) / 2))
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class FAISSTool:
     """
     Wrapper for FAISS vector store using LangChain community toolkit.
@@ -13,51 +73,425 @@ class FAISSTool:
         faiss_tool = FAISSTool(embeddings)
         faiss_tool.add_documents([Document(page_content="foo", metadata={"baz": "bar"})])
         results = faiss_tool.similarity_search("foo")
+
+    Persistent mode:
+        faiss_tool = FAISSTool(embeddings, persist_path="data/vector", dimension=3072)
+    Documents live in SQLite (``src.tools.document_store``) and are read on
+    demand; every add and delete is committed there before it returns, which
+    makes that table the store's write log.  The FAISS index is opened
+    memory-mapped from the latest snapshot, so startup cost does not grow with
+    the corpus and needs no embedding call; writes since the snapshot are
+    replayed from the log into a small in-memory delta index (deletes of
+    snapshotted vectors become tombstones excluded from searches).  Once
+    ``snapshot_every`` changes (and at least ``COMPACT_FRACTION`` of the
+    snapshot) have accumulated, a background thread compacts snapshot and
+    delta into a new snapshot without holding the lock; ``snapshot()`` and
+    ``close()`` compact synchronously.
+
+    Approximate search:
+        faiss_tool = FAISSTool(embeddings, index_spec={"type": "ivf_pq", "nlist": 4096, "pq_m": 64})
+    Index types that need training start out flat and are migrated (trained on
+    a sample of the stored vectors) once ``migrate_threshold`` vectors exist.
+    The migration is a compaction that trains the new index: it runs in the
+    background on the frozen flat index while writes go to the delta, which
+    is folded in when the new index is swapped in (``wait_for_migration()``
+    blocks until then).
+    ``tune(nprobe=..., efSearch=...)`` adjusts query-time parameters.
+
+    Keyword index:
+        faiss_tool.keyword_index.search("BigBird TriviaQA", k=10)
+    A BM25 index over the same documents (``src.tools.bm25_index``) is kept
+    in step with adds and deletes and saved in each snapshot; it is loaded
+    (or, for stores written without one, rebuilt from the docstore) on first
+    use.  ``src.tools.hybrid_search`` fuses it with the dense results.
+
+    Metadata filters:
+        faiss_tool.similarity_search("rag", k=10, filter={"year": {"$gte": 2023}})
+    Dict filters are evaluated on a ``MetadataIndex`` (``src.tools.metadata_index``)
+    and passed to FAISS as an ``IDSelector``, so the search returns ``k``
+    matching documents instead of post-filtering ``fetch_k`` neighbours.
+
+    Vector ids:
+    Every vector gets the next integer id when it is added and keeps it until
+    it is deleted (ids are never renumbered or reused), so deletes work the
+    same for flat and IVF indexes.  Flat and HNSW indexes are wrapped in an
+    ``IndexIDMap2`` for that; HNSW cannot remove vectors, so ``delete`` is
+    rejected for HNSW stores.
     """
-    def __init__(self, embeddings):
+    def __init__(self, embeddings, persist_path=None, dimension=None, snapshot_every=1000, mmap=True,
+                 index_spec=None):
         self.embeddings = embeddings
-        self.index = faiss.IndexFlatL2(len(self.embeddings.embed_query("hello world")))
-        self.docstore = InMemoryDocstore({})
-        self.index_to_docstore_id = {}
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.snapshot_every = snapshot_every
+        self.mmap = mmap
+        if not isinstance(index_spec, IndexSpec):
+            index_spec = IndexSpec.from_config(index_spec)
+        self.index_spec = index_spec
+        self._lock = threading.RLock()
+        self._documents = None          # SQLiteDocstore of a persistent store
+        self._snapshot_path = None
+        self._snapshot_meta = {}
+        self._pending_changes = 0
+        self._keyword_index = None
+        self._metadata_index = None
+        # Index layout: the base index (``vector_store.index``) plus, while the
+        # base cannot take writes (memory-mapped, or frozen by a compaction),
+        # a delta index for ids >= _delta_start and tombstones for deleted base ids.
+        self._base_mapped = False
+        self._delta = None
+        self._delta_start = 0
+        self._frozen = None             # delta being compacted into the next base
+        self._tombstones = set()
+        self._tombstone_selector = None
+        self._compacting = False
+        self._compaction_done = threading.Condition(self._lock)
+        self._compaction = None         # background compaction thread
+        self._migration_failed = False
+
+        if self.persist_path is not None:
+            self.persist_path.mkdir(parents=True, exist_ok=True)
+            snapshot = self._current_snapshot()
+            import_legacy = snapshot is not None and not (self.persist_path / DOCUMENTS_FILE).exists()
+            self._documents = SQLiteDocstore(str(self.persist_path / DOCUMENTS_FILE))
+            if import_legacy:
+                self._import_legacy_snapshot(snapshot)
+            if snapshot is not None or self._documents.dimension is not None:
+                self._open(snapshot)
+                return
+
+        if dimension is None:
+            dimension = len(self.embeddings.embed_query("hello world"))
+        self.dimension = dimension
+        if self._documents is not None:
+            self._documents.set_dimension(dimension)
+        self._keyword_index = BM25Index()
+        self._attach(self._empty_index(), self._documents if self._documents is not None else InMemoryDocstore({}), {})
+
+    def _empty_index(self):
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        if self.index_spec.type != "flat" or self.index_spec.scalar_quantizer:
+            candidate = build_id_index(self.index_spec, self.dimension)
+            # Types that need no training (plain HNSW) can be used from the start.
+            if candidate.is_trained:
+                index = candidate
+                set_search_params(index, **self.index_spec.query_params())
+        return index
+
+    def _attach(self, index, docstore, index_to_docstore_id):
+        """Use ``index`` (which must store vector ids, see ``with_ids``) as the base index."""
         self.vector_store = FAISS(
             embedding_function=self.embeddings,
-            index=self.index,
-            docstore=self.docstore,
-            index_to_docstore_id=self.index_to_docstore_id
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
         )
+        self.index = index
+        self.docstore = docstore
+        self.index_to_docstore_id = index_to_docstore_id
+        self._vector_ids = {doc_id: vector_id for vector_id, doc_id in index_to_docstore_id.items()}
+        self._next_id = max(index_to_docstore_id, default=-1) + 1
 
     def add_documents(self, documents, ids=None):
         """
         Add a list of LangChain Document objects to the vector store.
         Optionally provide a list of string IDs.
         """
-        return self.vector_store.add_documents(documents=documents, ids=ids)
+        documents = list(documents)
+        if ids is None:
+            ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        texts = [doc.page_content for doc in documents]
+        return self.add_embeddings(texts, self.embeddings.embed_documents(texts) if texts else [],
+                                   metadatas=[doc.metadata for doc in documents], ids=ids)
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """
+        Add texts with precomputed vectors (bulk loads embed outside the lock,
+        see ``src.tools.ingestion``).
+        """
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        if not texts:
+            return []
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids found in the ids list.")
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {vectors.shape[1]}")
+        with self._lock:
+            existing = {doc_id for doc_id in ids if doc_id in self._vector_ids}
+            if existing:
+                raise ValueError(f"Tried to add ids that already exist: {existing}")
+            first = self._next_id
+            vector_ids = np.arange(first, first + len(ids), dtype=np.int64)
+            if self._documents is not None:
+                self._documents.append(zip(vector_ids.tolist(), ids, texts, metadatas, vectors),
+                                       next_id=first + len(ids))
+            else:
+                self.vector_store.docstore.add({
+                    doc_id: Document(id=doc_id, page_content=text, metadata=metadata)
+                    for doc_id, text, metadata in zip(ids, texts, metadatas)
+                })
+            self._writable_index().add_with_ids(vectors, vector_ids)
+            for vector_id, doc_id in zip(vector_ids.tolist(), ids):
+                self.vector_store.index_to_docstore_id[vector_id] = doc_id
+                self._vector_ids[doc_id] = vector_id
+            self._next_id += len(ids)
+            self._index_keywords(ids, texts)
+            self._index_metadata(first, metadatas)
+            self._maybe_migrate()
+            self._record_changes(len(texts))
+        return ids
+
+    def contains(self, doc_id):
+        """
+        True if a document with this ID is stored.
+        """
+        return isinstance(self.vector_store.docstore.search(doc_id), Document)
+
+    def contains_many(self, doc_ids):
+        """The subset of ``doc_ids`` that is stored, as a set."""
+        with self._lock:
+            return {doc_id for doc_id in doc_ids if doc_id in self._vector_ids}
+
+    @property
+    def keyword_index(self):
+        """The BM25 index over the stored documents."""
+        if self._keyword_index is None:
+            with self._lock:
+                if self._keyword_index is None:
+                    self._keyword_index = self._load_keyword_index()
+        return self._keyword_index
+
+    def get_documents(self, doc_ids):
+        """``{doc_id: Document}`` for the given IDs that are stored."""
+        docs = {}
+        for doc_id in doc_ids:
+            doc = self.vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                docs[doc_id] = doc
+        return docs
+
+    def filter_ids(self, filter):
+        """
+        The set of stored document IDs matching a dict ``filter``, or None for
+        filters the metadata index cannot evaluate (callables).
+        """
+        selection = self._selection(filter)
+        if selection is None:
+            return None
+        with self._lock:
+            index_to_id = self.vector_store.index_to_docstore_id
+            return {index_to_id[int(position)] for position in selection.ids if int(position) in index_to_id}
 
     def similarity_search(self, query, k=5, filter=None):
         """
         Perform a similarity search for the query string.
-        Optionally filter by metadata.
+        Optionally filter by metadata (see ``src.tools.metadata_index``).
         Returns a list of Document objects.
         """
-        return self.vector_store.similarity_search(query=query, k=k, filter=filter)
+        if filter is None and self._single_index():
+            return self.vector_store.similarity_search(query=query, k=k)
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
 
     def similarity_search_with_score(self, query, k=5, filter=None):
         """
         Perform a similarity search and return (Document, score) tuples.
+        Dict filters are applied inside the FAISS search (``k`` results
+        whenever ``k`` documents match); callable filters after it.
         """
-        return self.vector_store.similarity_search_with_score(query=query, k=k, filter=filter)
+        selection = self._selection(filter) if filter is not None else None
+        if selection is None and self._single_index():
+            return self.vector_store.similarity_search_with_score(query=query, k=k, filter=filter)
+        vector = self.embeddings.embed_query(query)
+        return [(doc, distance) for _, doc, distance in self._filtered_search([vector], k, filter, selection)[0]]
+
+    def similarity_search_with_relevance_scores(self, query, k=5, filter=None):
+        """
+        Perform a similarity search and return (Document, relevance) tuples.
+        Relevance is the cosine similarity clamped to [0, 1], derived from the
+        squared L2 distance (1 - d / 2), which assumes unit-length embeddings.
+        """
+        return [
+            (doc, distance_to_relevance(distance))
+            for doc, distance in self.similarity_search_with_score(query, k=k, filter=filter)
+        ]
+
+    def similarity_search_by_vectors(self, vectors, k=5, filter=None, fetch_k=None):
+        """
+        Search for several query vectors with one FAISS call. Returns, per
+        vector, up to ``k`` ``(doc_id, Document, relevance)`` triples, best
+        first (relevance as in ``similarity_search_with_relevance_scores``).
+        Dict filters select inside the search; with a callable filter,
+        ``fetch_k`` (default ``max(4 * k, 20)``) neighbours are fetched and
+        filtered afterwards.
+        """
+        return [
+            [(doc_id, doc, distance_to_relevance(distance)) for doc_id, doc, distance in hits]
+            for hits in self.similarity_search_by_vectors_with_score(vectors, k=k, filter=filter, fetch_k=fetch_k)
+        ]
+
+    def similarity_search_by_vectors_with_score(self, vectors, k=5, filter=None, fetch_k=None):
+        """``similarity_search_by_vectors`` with the raw L2 distances (lower is better)."""
+        selection = self._selection(filter) if filter is not None else None
+        return self._filtered_search(vectors, k, filter, selection, fetch_k)
+
+    def keyword_search(self, query, k=10, filter=None):
+        """
+        The ``k`` best BM25 ``(doc_id, score)`` pairs for ``query`` from
+        ``keyword_index``, restricted to documents matching ``filter``.
+        """
+        accept = None
+        if filter is not None:
+            allowed = self.filter_ids(filter)
+            if allowed is not None:
+                accept = allowed.__contains__
+            else:
+                matches = FAISS._create_filter_func(filter)
+
+                def accept(doc_id):
+                    doc = self.get_documents([doc_id]).get(doc_id)
+                    return doc is not None and matches(doc.metadata)
+        return self.keyword_index.search(query, k=k, accept=accept)
+
+    def _filtered_search(self, vectors, k, filter, selection, fetch_k=None):
+        accept = FAISS._create_filter_func(filter) if filter is not None and selection is None else None
+        fetch = k if accept is None else (fetch_k or max(4 * k, 20))
+        results = self._search(vectors, fetch, selection)
+        if accept is not None:
+            results = [[hit for hit in hits if accept(hit[1].metadata)][:k] for hits in results]
+        return results
+
+    def _search(self, vectors, k, selection=None):
+        """Per query vector, up to ``k`` ``(doc_id, Document, distance)`` triples, best first."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        with self._lock:
+            index_to_id = self.vector_store.index_to_docstore_id
+            k = min(k, len(index_to_id) if selection is None else selection.count)
+            parts = [
+                (index, exclude_deleted)
+                for index, exclude_deleted in ((self.vector_store.index, True), (self._frozen, True), (self._delta, False))
+                if index is not None and index.ntotal
+            ]
+            if k <= 0 or not parts:
+                return [[] for _ in matrix]
+            found = []
+            for index, exclude_deleted in parts:
+                selector = self._selector(selection, exclude_deleted)
+                if selector is None:
+                    found.append(index.search(matrix, min(k, index.ntotal)))
+                else:
+                    found.append(index.search(matrix, min(k, index.ntotal),
+                                              params=search_parameters(index, selector)))
+            distances = np.hstack([d for d, _ in found])
+            positions = np.hstack([p for _, p in found])
+            if len(found) > 1:
+                order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+                distances = np.take_along_axis(distances, order, axis=1)
+                positions = np.take_along_axis(positions, order, axis=1)
+            results = []
+            for row_distances, row_positions in zip(distances, positions):
+                hits = []
+                for distance, position in zip(row_distances, row_positions):
+                    if position < 0:
+                        continue
+                    doc_id = index_to_id.get(int(position))
+                    doc = self.vector_store.docstore.search(doc_id) if doc_id is not None else None
+                    if isinstance(doc, Document):
+                        hits.append((doc_id, doc, float(distance)))
+                results.append(hits)
+        return results
+
+    def _selector(self, selection, exclude_deleted):
+        """The ``IDSelector`` for one part of the index: the filter, minus tombstoned ids."""
+        selector = selection.selector if selection is not None else None
+        if not exclude_deleted or not self._tombstones:
+            return selector
+        if self._tombstone_selector is None:
+            deleted = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+            self._tombstone_selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(deleted))
+        if selector is None:
+            return self._tombstone_selector
+        return faiss.IDSelectorAnd(selector, self._tombstone_selector)
+
+    def _single_index(self):
+        """True when the LangChain container sees everything: no delta, frozen part or tombstones."""
+        return (self._delta is None or self._delta.ntotal == 0) and self._frozen is None and not self._tombstones
+
+    def _selection(self, filter):
+        """
+        The positions matching a dict ``filter`` (``metadata_index.Selection``),
+        or None for filters that cannot be indexed. Fields are indexed the
+        first time a filter names them.
+        """
+        fields = filter_fields(filter)
+        if fields is None:
+            return None
+        with self._lock:
+            index = self._metadata_index
+            if index is None or index.size != self._next_id:
+                # First filter (or the store was replaced): build for the fields seen so far.
+                index = self._metadata_index = MetadataIndex(index.fields if index else (), self._metadatas())
+            missing = fields - index.fields
+            if missing:
+                index.index_fields(missing, self._metadatas())
+            return index.select(filter)
+
+    def _metadatas(self):
+        """Metadata by vector id, None for the ids of deleted vectors."""
+        metadatas = [None] * self._next_id
+        if self._documents is not None:
+            for vector_id, metadata in self._documents.metadatas():
+                metadatas[vector_id] = metadata
+            return metadatas
+        store = self.vector_store
+        for vector_id, doc_id in store.index_to_docstore_id.items():
+            doc = store.docstore.search(doc_id)
+            metadatas[vector_id] = doc.metadata if isinstance(doc, Document) else {}
+        return metadatas
 
     def delete(self, ids):
         """
-        Delete documents by their IDs.
+        Delete documents by their IDs. Raises ValueError if any ID is not
+        stored (nothing is deleted then) and NotImplementedError for HNSW
+        stores, whose graph cannot drop vectors.
         """
-        return self.vector_store.delete(ids=ids)
+        ids = list(ids)
+        if self.index_spec.type == "hnsw":
+            raise NotImplementedError(
+                "HNSW indexes cannot remove vectors; use a flat or IVF vector_index type for a corpus with deletes"
+            )
+        with self._lock:
+            missing = {doc_id for doc_id in ids if doc_id not in self._vector_ids}
+            if missing:
+                raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing}")
+            vector_ids = [self._vector_ids.pop(doc_id) for doc_id in ids]
+            self.vector_store.docstore.delete(ids)
+            self._remove_vectors(np.array(vector_ids, dtype=np.int64))
+            for vector_id in vector_ids:
+                del self.vector_store.index_to_docstore_id[vector_id]
+            self.keyword_index.remove(ids)
+            if self._metadata_index is not None:
+                self._metadata_index.remove(vector_ids)
+            self._record_changes(len(ids))
+        return True
 
     def save_local(self, folder_path):
         """
         Save the FAISS index and docstore to disk.
         """
-        return self.vector_store.save_local(folder_path)
+        with self._lock:
+            index = self._merged_index(self._freeze(), train=False)
+            docs = self.get_documents(self.vector_store.index_to_docstore_id.values())
+            index_to_docstore_id = dict(self.vector_store.index_to_docstore_id)
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(docs),
+            index_to_docstore_id=index_to_docstore_id,
+        ).save_local(folder_path)
 
     @classmethod
     def load_local(cls, folder_path, embeddings):
@@ -65,6 +499,381 @@ class FAISSTool:
         Load a FAISS vector store from disk.
         """
         vector_store = FAISS.load_local(folder_path, embeddings, allow_dangerous_deserialization=True)
-        tool = cls(embeddings)
-        tool.vector_store = vector_store
-        return tool
\ No newline at end of file
+        tool = cls(embeddings, dimension=vector_store.index.d)
+        # with_ids: stores saved before vector ids
+        tool._attach(with_ids(vector_store.index), vector_store.docstore, vector_store.index_to_docstore_id)
+        tool._keyword_index = None   # rebuilt from the loaded docstore on first use
+        return tool
+
+    def tune(self, **params):
+        """
+        Set query-time search parameters, e.g. ``tune(nprobe=32)`` for IVF
+        indexes or ``tune(efSearch=128)`` for HNSW.
+        """
+        with self._lock:
+            self.index_spec.search_params.update(params)
+            set_search_params(self.vector_store.index, **self._query_params())
+
+    # ------------------------------------------------------------------
+    # Index layout: base, delta and tombstones
+    # ------------------------------------------------------------------
+
+    def _writable_index(self):
+        """Where added vectors go: the delta if there is one, else the base index."""
+        if self._delta is None and (self._base_mapped or self._compacting):
+            self._delta = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+            self._delta_start = self._next_id
+        return self._delta if self._delta is not None else self.vector_store.index
+
+    def _remove_vectors(self, vector_ids):
+        in_delta = vector_ids >= self._delta_start if self._delta is not None else np.zeros(len(vector_ids), bool)
+        if in_delta.any():
+            self._delta.remove_ids(vector_ids[in_delta])
+        rest = vector_ids[~in_delta]
+        if not len(rest):
+            return
+        if self._base_mapped or self._compacting:
+            self._tombstones.update(rest.tolist())
+            self._tombstone_selector = None
+        else:
+            self.vector_store.index.remove_ids(rest)
+
+    def _settle(self):
+        """Fold delta and tombstones into the base index when it can take writes again."""
+        if self._base_mapped or self._compacting:
+            return
+        base = self.vector_store.index
+        if self._delta is not None:
+            if self._delta.ntotal:
+                base.add_with_ids(reconstruct_all(self._delta), stored_ids(self._delta))
+            self._delta = None
+        if self._tombstones:
+            base.remove_ids(np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones)))
+            self._tombstones.clear()
+            self._tombstone_selector = None
+
+    def _freeze(self):
+        """
+        Everything a compaction reads, fixed at this point: later writes go
+        to a fresh delta, later deletes of these vectors become tombstones.
+        """
+        job = {
+            "base": self.vector_store.index,
+            "source": self._snapshot_path / INDEX_FILE if self._base_mapped else None,
+            "extra": [part for part in (self._frozen, self._delta) if part is not None and part.ntotal],
+            "tombstones": frozenset(self._tombstones),
+            "next_id": self._next_id,
+            "tombstone_seq": self._documents.tombstone_seq if self._documents is not None else 0,
+        }
+        return job
+
+    def _merged_index(self, job, train):
+        """
+        A new in-memory index holding the frozen base and delta minus the
+        tombstones; trained for ``index_spec`` when ``train`` is set. Called
+        without the lock: the frozen parts are never written again.
+        """
+        deleted = np.fromiter(job["tombstones"], dtype=np.int64, count=len(job["tombstones"]))
+        if train:
+            parts = [job["base"], *job["extra"]]
+            vectors = np.vstack([reconstruct_all(part) for part in parts])
+            ids = np.concatenate([stored_ids(part) for part in parts])
+            keep = ~np.isin(ids, deleted)
+            return build_trained_index(self.index_spec, vectors[keep], ids[keep])
+        if job["source"] is not None:
+            index = with_ids(open_index(str(job["source"]), mmap=False))
+        else:
+            index = faiss.clone_index(job["base"])
+        for part in job["extra"]:
+            index.add_with_ids(reconstruct_all(part), stored_ids(part))
+        if len(deleted):
+            index.remove_ids(deleted)
+        return index
+
+    # ------------------------------------------------------------------
+    # Index type management
+    # ------------------------------------------------------------------
+
+    def _query_params(self):
+        index = self.vector_store.index
+        if is_flat(index):
+            return {}
+        params = self.index_spec.query_params()
+        if faiss.try_extract_index_ivf(index) is None:
+            params.pop("nprobe", None)
+        if not is_hnsw(index):
+            params.pop("efSearch", None)
+        return params
+
+    def wait_for_migration(self, timeout=None):
+        """
+        Block until a running background migration (or compaction) has been
+        swapped in. Returns False if it is still running after ``timeout`` seconds.
+        """
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join(timeout)
+            return not compaction.is_alive()
+        return True
+
+    def _maybe_migrate(self):
+        """
+        Start replacing the flat index with the configured ANN type once it
+        holds ``migrate_threshold`` vectors: a background compaction that trains.
+        """
+        spec = self.index_spec
+        if spec.type == "flat" and not spec.scalar_quantizer:
+            return
+        if self._compacting or self._migration_failed or not is_flat(self.vector_store.index):
+            return
+        if len(self.vector_store.index_to_docstore_id) >= spec.migrate_threshold:
+            self._start_compaction(train=True)
+
+    def _index_keywords(self, ids, texts):
+        keyword_index = self.keyword_index
+        for doc_id, text in zip(ids, texts):
+            keyword_index.add(doc_id, text)
+
+    def _index_metadata(self, first, metadatas):
+        # Added with ids first, first + 1, ...; anything else is caught by the size check in _selection.
+        if self._metadata_index is not None and self._metadata_index.size == first:
+            self._metadata_index.add(metadatas)
+
+    def _load_keyword_index(self):
+        keywords = self._snapshot_meta.get("keywords")
+        if self._snapshot_path is not None and keywords is not None:
+            with open(self._snapshot_path / KEYWORD_FILE, "rb") as f:
+                index = pickle.load(f)
+            # Replay the log since the keyword snapshot (adds replace, removes ignore missing ids).
+            index.remove(doc_id for _, _, doc_id in self._documents.tombstones(keywords["tombstone_seq"]))
+            for doc_id, text in self._documents.texts(since=keywords["next_id"]):
+                index.add(doc_id, text)
+            return index
+        # Stores saved before the keyword index existed, or by ``save_local``.
+        if self._documents is not None:
+            return BM25Index.from_documents(self._documents.texts())
+        store = self.vector_store
+        pairs = ((doc_id, store.docstore.search(doc_id)) for doc_id in store.index_to_docstore_id.values())
+        return BM25Index.from_documents(
+            (doc_id, doc.page_content) for doc_id, doc in pairs if isinstance(doc, Document)
+        )
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        """
+        Compact the index into a new snapshot directory now and atomically
+        point ``CURRENT`` at it. Returns the snapshot path, or None when the
+        tool has no ``persist_path``.
+        """
+        if self.persist_path is None:
+            return None
+        with self._lock:
+            while self._compacting:
+                self._compaction_done.wait()
+            job = self._begin_compaction()
+        self._compact(job, train=False)
+        return self._snapshot_path
+
+    def close(self):
+        """
+        Finish a running compaction, snapshot unsnapshotted changes and close
+        the document store.
+        """
+        self.wait_for_migration()
+        if self._pending_changes:
+            self.snapshot()
+        if self._documents is not None:
+            self._documents.close()
+
+    def _record_changes(self, count):
+        self._pending_changes += count
+        if self.persist_path is None or self._compacting:
+            return
+        threshold = max(self.snapshot_every, COMPACT_FRACTION * self.vector_store.index.ntotal)
+        if self._pending_changes >= threshold:
+            self._start_compaction(train=False)
+
+    def _start_compaction(self, train):
+        job = self._begin_compaction()
+        self._compaction = threading.Thread(
+            target=self._compact_in_background, args=(job, train), name="faiss-compaction", daemon=True,
+        )
+        self._compaction.start()
+
+    def _begin_compaction(self):
+        """Freeze the current index parts (under the lock) for ``_compact``."""
+        job = self._freeze()
+        job["changes"] = self._pending_changes
+        self._frozen = self._delta if self._delta is not None and self._delta.ntotal else None
+        self._delta = None
+        self._compacting = True
+        self._pending_changes = 0
+        return job
+
+    def _compact_in_background(self, job, train):
+        try:
+            self._compact(job, train)
+        except Exception:
+            if train:
+                # Not retried: a failing spec would fail again on every add.
+                self._migration_failed = True
+            logger.exception("Compacting the vector index%s failed",
+                             f" into {self.index_spec.type}" if train else "")
+
+    def _compact(self, job, train):
+        """
+        Build the merged (or trained) index and its snapshot outside the
+        lock, then swap it in as the new base.
+        """
+        try:
+            index = self._merged_index(job, train)
+            snapshot = None
+            if self.persist_path is not None:
+                snapshot = self._write_snapshot(index, job)
+                if self.mmap:
+                    index = with_ids(open_index(str(snapshot / INDEX_FILE)))
+        except BaseException:
+            with self._lock:
+                # Move the frozen part back into the delta; the next compaction retries.
+                if self._frozen is not None:
+                    ids = stored_ids(self._frozen)
+                    keep = ~np.isin(ids, np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones)))
+                    self._writable_index().add_with_ids(reconstruct_all(self._frozen)[keep], ids[keep])
+                    self._delta_start = min(self._delta_start, int(ids.min()))
+                    self._tombstones.difference_update(ids.tolist())
+                    self._tombstone_selector = None
+                    self._frozen = None
+                self._pending_changes += job["changes"]
+                self._compacting = False
+                self._compaction_done.notify_all()
+                self._settle()
+            raise
+        with self._lock:
+            self.index = self.vector_store.index = index
+            self._base_mapped = snapshot is not None and self.mmap
+            self._frozen = None
+            self._tombstones -= job["tombstones"]
+            self._tombstone_selector = None
+            self._compacting = False
+            self._compaction_done.notify_all()
+            if snapshot is not None:
+                self._snapshot_path = snapshot
+                self._snapshot_meta = json.loads((snapshot / META_FILE).read_text())
+            self._settle()
+            set_search_params(index, **self._query_params())
+        if snapshot is not None:
+            keywords = self._snapshot_meta.get("keywords") or {"tombstone_seq": 0}
+            self._documents.compacted(job["next_id"], min(job["tombstone_seq"], keywords["tombstone_seq"]))
+            self._prune_snapshots(keep=snapshot.name)
+
+    def _write_snapshot(self, index, job):
+        """Write ``index`` (and the keyword index) as a new snapshot and make it current, durably."""
+        snapshots = self.persist_path / SNAPSHOT_DIR
+        snapshots.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns():020d}"
+        staging = snapshots / f".{name}.tmp"
+        staging.mkdir()
+        faiss.write_index(index, str(staging / INDEX_FILE))
+        keyword_index = self._keyword_index
+        keywords = None
+        if keyword_index is not None:
+            # Changes made since the freeze may be included; replaying them from the log again is harmless.
+            (staging / KEYWORD_FILE).write_bytes(keyword_index.dumps())
+            keywords = {"next_id": job["next_id"], "tombstone_seq": job["tombstone_seq"]}
+        elif self._snapshot_meta.get("keywords") is not None:
+            # Never loaded, so unchanged since the snapshot it came from (and replayed from there).
+            shutil.copyfile(self._snapshot_path / KEYWORD_FILE, staging / KEYWORD_FILE)
+            keywords = self._snapshot_meta["keywords"]
+        meta = {
+            "dimension": self.dimension,
+            "next_id": job["next_id"],
+            "tombstone_seq": job["tombstone_seq"],
+            "keywords": keywords,
+            "ntotal": int(index.ntotal),
+            "index_type": type(faiss.downcast_index(index)).__name__,
+            "created": time.time(),
+        }
+        (staging / META_FILE).write_text(json.dumps(meta))
+        for path in staging.iterdir():
+            _fsync(path)
+        _fsync(staging)
+        os.replace(staging, snapshots / name)
+        _fsync(snapshots)
+
+        pointer = self.persist_path / f"{CURRENT_FILE}.tmp"
+        pointer.write_text(name)
+        _fsync(pointer)
+        os.replace(pointer, self.persist_path / CURRENT_FILE)
+        _fsync(self.persist_path)
+        return snapshots / name
+
+    def _current_snapshot(self):
+        if self.persist_path is None:
+            return None
+        pointer = self.persist_path / CURRENT_FILE
+        if not pointer.exists():
+            return None
+        snapshot = self.persist_path / SNAPSHOT_DIR / pointer.read_text().strip()
+        return snapshot if snapshot.is_dir() else None
+
+    def _open(self, snapshot):
+        """Open the snapshot (if any) and replay the log written since."""
+        self.dimension = self._documents.dimension
+        if snapshot is not None:
+            self._snapshot_path = snapshot
+            self._snapshot_meta = json.loads((snapshot / META_FILE).read_text())
+            index = with_ids(open_index(str(snapshot / INDEX_FILE), mmap=self.mmap))
+            self._base_mapped = self.mmap
+        else:
+            index = self._empty_index()
+        next_id = self._snapshot_meta.get("next_id", 0)
+        tombstone_seq = self._snapshot_meta.get("tombstone_seq", 0)
+        self._attach(index, self._documents, self._documents.ids())
+        self._next_id = self._documents.next_id
+        set_search_params(index, **self._query_params())
+
+        for vector_ids, vectors in self._documents.vectors(since=next_id, dimension=self.dimension):
+            self._writable_index().add_with_ids(vectors, vector_ids)
+            self._delta_start = next_id
+            self._pending_changes += len(vector_ids)
+        deleted = [vector_id for _, vector_id, _ in self._documents.tombstones(tombstone_seq) if vector_id < next_id]
+        if deleted:
+            self._remove_vectors(np.array(deleted, dtype=np.int64))
+            self._pending_changes += len(deleted)
+
+    def _import_legacy_snapshot(self, snapshot):
+        """Move the documents of a snapshot written before the SQLite docstore into it."""
+        with open(snapshot / DOCSTORE_FILE, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        meta = json.loads((snapshot / META_FILE).read_text())
+        documents = [
+            (vector_id, doc_id, docstore.search(doc_id))
+            for vector_id, doc_id in index_to_docstore_id.items()
+        ]
+        self._documents.import_documents(
+            [(vector_id, doc_id, doc) for vector_id, doc_id, doc in documents if isinstance(doc, Document)],
+            dimension=meta["dimension"],
+        )
+        # The snapshot covers everything imported; record that as its log position.
+        next_id = self._documents.next_id
+        meta["next_id"] = next_id
+        meta["tombstone_seq"] = 0
+        meta["keywords"] = {"next_id": next_id, "tombstone_seq": 0} if (snapshot / KEYWORD_FILE).exists() else None
+        staging = snapshot / f"{META_FILE}.tmp"
+        staging.write_text(json.dumps(meta))
+        _fsync(staging)
+        os.replace(staging, snapshot / META_FILE)
+
+    def _prune_snapshots(self, keep):
+        snapshots = sorted(
+            p for p in (self.persist_path / SNAPSHOT_DIR).iterdir()
+            if p.is_dir() and not p.name.startswith(".")
+        )
+        # Keep a fallback snapshot; the one currently mmapped stays readable
+        # after unlinking because its pages remain mapped.
+        for old in snapshots[:-SNAPSHOTS_TO_KEEP]:
+            if old.name != keep:
+                shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,126 @@
+"""Hybrid dense + BM25 retrieval over a ``FAISSTool``, with optional reranking.
+
+For each query the dense side (FAISS, relevance in [0, 1]) and the keyword
+side (``FAISSTool.keyword_search``, BM25 over the same docstore) each return
+``candidates`` documents, and their scores are fused::
+
+    score = alpha * dense + (1 - alpha) * bm25 / best_bm25
+
+A document found by only one side gets 0 from the other.  With a reranker,
+the best ``rerank_top`` fused candidates are scored again by a local
+cross-encoder on ``(query, text)`` pairs and returned in that order.
+
+``search_batch`` embeds all its queries in one ``embed_documents`` call,
+searches FAISS once for the whole batch and reranks every pair in one
+``predict`` call.
+
+Cross-encoders come from the optional ``sentence-transformers`` package
+(e.g. ``rerank_model: "cross-encoder/ms-marco-MiniLM-L-6-v2"``); anything
+with a ``predict(pairs) -> scores`` method works as ``reranker``.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+
+@lru_cache(maxsize=2)
+def load_cross_encoder(model_name: str):
+    """A ``sentence_transformers.CrossEncoder``, loaded once per process."""
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError as e:
+        raise ImportError("Reranking needs the 'sentence-transformers' package") from e
+    return CrossEncoder(model_name)
+
+
+class HybridRetriever:
+    """
+    Fused dense + BM25 search over a ``FAISSTool``.
+    Usage:
+        retriever = HybridRetriever(faiss_tool, alpha=0.5)
+        docs = retriever.search("BigBird on TriviaQA", k=5)
+        batches = retriever.search_batch(["LoRA rank", "QLoRA 4-bit"], k=5)
+    ``alpha=1`` is dense-only and ``alpha=0`` keyword-only ranking.
+    """
+    def __init__(self, faiss_tool, alpha: float = 0.5, candidates: int = 50, reranker=None,
+                 rerank_model: Optional[str] = None, rerank_top: int = 20):
+        if not 0.0 <= alpha <= 1.0:
+            raise ValueError(f"alpha must be between 0 and 1, got {alpha}")
+        self.faiss_tool = faiss_tool
+        self.alpha = alpha
+        self.candidates = candidates
+        self.rerank_model = rerank_model
+        self.rerank_top = rerank_top
+        self._reranker = reranker
+
+    @classmethod
+    def from_config(cls, faiss_tool, section: Optional[dict] = None) -> "HybridRetriever":
+        """Build from the ``retrieval`` section of config.yaml."""
+        settings = {k: v for k, v in (section or {}).items()
+                    if k in ("alpha", "candidates", "rerank_model", "rerank_top")}
+        return cls(faiss_tool, **settings)
+
+    @property
+    def reranker(self):
+        if self._reranker is None and self.rerank_model:
+            self._reranker = load_cross_encoder(self.rerank_model)
+        return self._reranker
+
+    def search(self, query: str, k: int = 5, filter=None) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k=k, filter=filter)]
+
+    def search_with_scores(self, query: str, k: int = 5, filter=None) -> List[Tuple[Document, float]]:
+        """``(Document, score)`` pairs, best first (fused score, or the reranker's)."""
+        return self.search_batch_with_scores([query], k=k, filter=filter)[0]
+
+    def search_batch(self, queries: Sequence[str], k: int = 5, filter=None) -> List[List[Document]]:
+        return [[doc for doc, _ in hits] for hits in self.search_batch_with_scores(queries, k=k, filter=filter)]
+
+    def search_batch_with_scores(self, queries: Sequence[str], k: int = 5,
+                                 filter=None) -> List[List[Tuple[Document, float]]]:
+        queries = list(queries)
+        if not queries:
+            return []
+        tool = self.faiss_tool
+        pool = max(k, self.candidates)
+        if len(queries) == 1:
+            vectors = [tool.embeddings.embed_query(queries[0])]
+        else:
+            vectors = tool.embeddings.embed_documents(queries)
+        dense = tool.similarity_search_by_vectors(vectors, k=pool, filter=filter)
+
+        fused = [self._fuse(hits, tool.keyword_search(query, k=pool, filter=filter))
+                 for query, hits in zip(queries, dense)]
+        if self.reranker is None:
+            return [ranked[:k] for ranked in fused]
+        return self._rerank(queries, fused, k)
+
+    def _fuse(self, dense: List[Tuple[str, Document, float]],
+              keyword: List[Tuple[str, float]]) -> List[Tuple[Document, float]]:
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for doc_id, doc, relevance in dense:
+            docs[doc_id] = doc
+            scores[doc_id] = self.alpha * relevance
+        best = keyword[0][1] if keyword else 0.0
+        docs.update(self.faiss_tool.get_documents([doc_id for doc_id, _ in keyword if doc_id not in docs]))
+        for doc_id, score in keyword:
+            if doc_id in docs and best > 0:
+                scores[doc_id] = scores.get(doc_id, 0.0) + (1.0 - self.alpha) * score / best
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return [(docs[doc_id], scores[doc_id]) for doc_id in ranked]
+
+    def _rerank(self, queries: List[str], fused: List[List[Tuple[Document, float]]],
+                k: int) -> List[List[Tuple[Document, float]]]:
+        heads = [ranked[:max(k, self.rerank_top)] for ranked in fused]
+        pairs = [(query, doc.page_content) for query, head in zip(queries, heads) for doc, _ in head]
+        scores = iter([float(s) for s in self.reranker.predict(pairs)]) if pairs else iter(())
+        results = []
+        for head in heads:
+            rescored = [(doc, next(scores)) for doc, _ in head]
+            rescored.sort(key=lambda item: item[1], reverse=True)
+            results.append(rescored[:k])
+        return results
@@ -0,0 +1,346 @@
+"""Streaming ingestion of documents into the FAISS corpus.
+
+Usage::
+
+    python -m src.tools.ingestion data/papers --pattern "*.pdf" --workers 4
+
+Documents flow through four stages, each consuming the previous one lazily
+so memory stays bounded by the queue sizes rather than the corpus:
+
+1. loaders yield documents one at a time: files under a directory
+   (``.txt`` / ``.md`` read whole, ``.pdf`` per page through the optional
+   ``pypdf`` package), LiteratureSearch ``SearchRecord`` s or LangChain
+   ``Document`` s;
+2. a ``RecursiveCharacterTextSplitter`` cuts them into chunks; for files,
+   reading and splitting runs in a process pool with at most
+   ``2 * workers`` files in flight;
+3. chunks are keyed by the xxh3-128 hash of their text; chunks already in the
+   store (one ``contains_many`` lookup per batch) or still queued from
+   earlier in the run are skipped, the rest are grouped into batches of
+   ``batch_size`` and embedded by ``embed_concurrency`` threads;
+4. a single writer thread bulk-adds each embedded batch to ``FAISSTool``
+   (``add_embeddings``), which logs them durably and compacts its index
+   snapshot in the background every ``snapshot_every`` vectors.
+
+Stages are connected by queues of ``queue_size`` batches, so a slow
+embedding provider throttles parsing instead of letting chunks pile up.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.tools.embedding_service import text_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ("*.txt", "*.md", "*.pdf")
+RECORD_FIELDS = ("title", "authors", "published", "url", "doi", "arxiv_id", "source")
+_DONE = object()
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: Dict[str, Any]
+
+
+@dataclass
+class IngestReport:
+    documents: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    indexed: int = 0
+    failed: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# ----------------------------------------------------------------------
+# Loaders and splitting
+# ----------------------------------------------------------------------
+
+def iter_files(paths: Iterable[str], patterns: Iterable[str] = DEFAULT_PATTERNS) -> Iterator[Path]:
+    """Files named in ``paths``, and files matching ``patterns`` under directories in ``paths``."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            matches = set()
+            for pattern in patterns:
+                matches.update(p for p in path.rglob(pattern) if p.is_file())
+            yield from sorted(matches)
+        elif path.is_file():
+            yield path
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+
+
+def read_file(path: Path) -> Iterator[Tuple[str, dict]]:
+    """``(text, metadata)`` for a text file, or for each page of a PDF."""
+    metadata = {"title": path.stem, "source": str(path)}
+    if path.suffix.lower() != ".pdf":
+        yield path.read_text(encoding="utf-8", errors="replace"), metadata
+        return
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("PDF ingestion needs the 'pypdf' package") from e
+    for number, page in enumerate(PdfReader(str(path)).pages, start=1):
+        yield page.extract_text() or "", {**metadata, "page": number}
+
+
+@lru_cache(maxsize=8)
+def make_splitter(chunk_size: int, chunk_overlap: int):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def split_text(text: str, metadata: dict, chunk_size: int, chunk_overlap: int) -> List[Chunk]:
+    pieces = make_splitter(chunk_size, chunk_overlap).split_text(text)
+    return [Chunk(text_hash(piece), piece, {**metadata, "chunk": i}) for i, piece in enumerate(pieces)]
+
+
+def chunk_file(path: Path, chunk_size: int, chunk_overlap: int) -> List[Chunk]:
+    """Read and split one file (runs in the worker processes)."""
+    chunks = []
+    for text, metadata in read_file(path):
+        chunks.extend(split_text(text, metadata, chunk_size, chunk_overlap))
+    return chunks
+
+
+def record_document(record: dict) -> Tuple[str, dict]:
+    """``(text, metadata)`` for a LiteratureSearch ``SearchRecord``."""
+    text = "\n\n".join(p for p in (record.get("title"), record.get("abstract")) if p)
+    return text, {k: record[k] for k in RECORD_FIELDS if record.get(k)}
+
+
+# ----------------------------------------------------------------------
+# Pipeline
+# ----------------------------------------------------------------------
+
+class IngestionPipeline:
+    """
+    Chunk, embed and bulk-index documents into a ``FAISSTool``.
+    Usage:
+        pipeline = IngestionPipeline(faiss_tool, workers=4)
+        report = pipeline.ingest_paths(["data/papers"])
+        pipeline.ingest_records(state["artifacts"]["literature_results"])
+    ``workers=0`` reads and splits files in the calling process.
+    """
+    def __init__(self, faiss_tool, embeddings=None, chunk_size: int = 1500, chunk_overlap: int = 200,
+                 batch_size: int = 256, workers: int = 0, queue_size: int = 4, embed_concurrency: int = 2):
+        self.faiss_tool = faiss_tool
+        self.embeddings = embeddings or faiss_tool.embeddings
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue_size = queue_size
+        self.embed_concurrency = max(1, embed_concurrency)
+
+    @classmethod
+    def from_config(cls, faiss_tool, section: Optional[dict] = None, **overrides) -> "IngestionPipeline":
+        """Build from the ``ingestion`` section of config.yaml."""
+        settings = {k: v for k, v in (section or {}).items()
+                    if k in ("chunk_size", "chunk_overlap", "batch_size", "workers", "queue_size",
+                             "embed_concurrency")}
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(faiss_tool, **settings)
+
+    def ingest_paths(self, paths: Iterable[str], patterns: Iterable[str] = DEFAULT_PATTERNS) -> IngestReport:
+        report = IngestReport()
+        return self._run(self._file_chunks(iter_files(paths, patterns), report), report)
+
+    def ingest_records(self, records: Iterable[dict]) -> IngestReport:
+        report = IngestReport()
+        return self._run(self._text_chunks((record_document(r) for r in records), report), report)
+
+    def ingest_documents(self, documents: Iterable[Any]) -> IngestReport:
+        """Ingest LangChain ``Document`` s (``page_content`` plus ``metadata``)."""
+        report = IngestReport()
+        pairs = ((doc.page_content, dict(doc.metadata or {})) for doc in documents)
+        return self._run(self._text_chunks(pairs, report), report)
+
+    # -- stage 1-2: documents -> chunks --------------------------------
+
+    def _text_chunks(self, pairs: Iterable[Tuple[str, dict]], report: IngestReport) -> Iterator[Chunk]:
+        for text, metadata in pairs:
+            report.documents += 1
+            yield from split_text(text, metadata, self.chunk_size, self.chunk_overlap)
+
+    def _file_chunks(self, files: Iterator[Path], report: IngestReport) -> Iterator[Chunk]:
+        if self.workers <= 0:
+            for path in files:
+                report.documents += 1
+                try:
+                    chunks = chunk_file(path, self.chunk_size, self.chunk_overlap)
+                except Exception as e:
+                    self._failed(report, path, e)
+                    continue
+                yield from chunks
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = deque()
+            for path in files:
+                in_flight.append((path, pool.submit(chunk_file, path, self.chunk_size, self.chunk_overlap)))
+                if len(in_flight) >= 2 * self.workers:
+                    yield from self._collect(in_flight.popleft(), report)
+            while in_flight:
+                yield from self._collect(in_flight.popleft(), report)
+
+    def _collect(self, item, report: IngestReport) -> List[Chunk]:
+        path, future = item
+        report.documents += 1
+        try:
+            return future.result()
+        except Exception as e:
+            self._failed(report, path, e)
+            return []
+
+    @staticmethod
+    def _failed(report: IngestReport, path: Path, error: Exception) -> None:
+        logger.warning("Skipping %s: %s", path, error)
+        report.failed.append(str(path))
+
+    # -- stages 3-4: dedup, embed, index --------------------------------
+
+    def _run(self, chunks: Iterator[Chunk], report: IngestReport) -> IngestReport:
+        start = time.perf_counter()
+        to_embed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        to_index: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+        # IDs queued for embedding/indexing; once a batch is added the store answers for them,
+        # so this stays bounded by the queues rather than growing with the corpus.
+        queued: set = set()
+        queued_lock = threading.Lock()
+
+        def embed_worker():
+            # Consumers keep draining after an error so producers never block on a full queue.
+            while (batch := to_embed.get()) is not _DONE:
+                if errors:
+                    continue
+                try:
+                    vectors = self.embeddings.embed_documents([c.text for c in batch])
+                    to_index.put((batch, vectors))
+                except BaseException as e:
+                    errors.append(e)
+
+        def index_worker():
+            while (item := to_index.get()) is not _DONE:
+                if errors:
+                    continue
+                batch, vectors = item
+                try:
+                    self.faiss_tool.add_embeddings(
+                        [c.text for c in batch], vectors,
+                        metadatas=[c.metadata for c in batch], ids=[c.id for c in batch],
+                    )
+                    report.indexed += len(batch)
+                except BaseException as e:
+                    errors.append(e)
+                finally:
+                    with queued_lock:
+                        queued.difference_update(c.id for c in batch)
+
+        embedders = [threading.Thread(target=embed_worker, name=f"ingest-embed-{i}", daemon=True)
+                     for i in range(self.embed_concurrency)]
+        indexer = threading.Thread(target=index_worker, name="ingest-index", daemon=True)
+        for thread in embedders + [indexer]:
+            thread.start()
+
+        try:
+            batch: List[Chunk] = []
+            for candidates in _batched(chunks, self.batch_size):
+                if errors:
+                    break
+                report.chunks += len(candidates)
+                # Queued IDs are read before the store: the indexer adds a batch before
+                # releasing its IDs, so a chunk is always found in one or the other.
+                with queued_lock:
+                    pending = {c.id for c in candidates if c.id in queued}
+                # One lookup per batch: a sharded store answers it with one request per shard.
+                stored = self.faiss_tool.contains_many([c.id for c in candidates if c.id not in pending])
+                for chunk in candidates:
+                    if chunk.id in pending or chunk.id in stored:
+                        report.skipped += 1
+                        continue
+                    pending.add(chunk.id)
+                    with queued_lock:
+                        queued.add(chunk.id)
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size:
+                        to_embed.put(batch)
+                        batch = []
+            if batch and not errors:
+                to_embed.put(batch)
+        finally:
+            for _ in embedders:
+                to_embed.put(_DONE)
+            for thread in embedders:
+                thread.join()
+            to_index.put(_DONE)
+            indexer.join()
+        report.seconds = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return report
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load documents into the FAISS corpus.")
+    parser.add_argument("paths", nargs="+", help="Files or directories to ingest.")
+    parser.add_argument("--pattern", action="append", help=f"Glob for directories (default: {DEFAULT_PATTERNS}).")
+    parser.add_argument("--workers", type=int, help="Parsing processes (overrides ingestion.workers).")
+    parser.add_argument("--batch-size", type=int, help="Chunks per embedding batch.")
+    parser.add_argument("--config", help="Config file (default: config/config.yaml).")
+    args = parser.parse_args(argv)
+
+    from src.orchestration.config import load_config
+    from src.orchestration.vector_index import vector_index_node
+
+    cfg = load_config(args.config)
+    node = vector_index_node(
+        embeddings_model=cfg.get("embedding_model", "text-embedding-3-large"),
+        persist_path=cfg.get("vector_store_path"),
+        dimension=cfg.get("embedding_dimension"),
+        snapshot_every=cfg.get("vector_snapshot_every", 1000),
+        index_spec=cfg.get("vector_index"),
+        embedding_cache=cfg.get("embedding_cache"),
+        sharding=cfg.get("vector_shards"),
+    )
+    pipeline = IngestionPipeline.from_config(
+        node.faiss_tool, cfg.get("ingestion"), workers=args.workers, batch_size=args.batch_size,
+    )
+    try:
+        report = pipeline.ingest_paths(args.paths, patterns=args.pattern or DEFAULT_PATTERNS)
+    finally:
+        node.close()
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Metadata index that turns ``filter`` dicts into FAISS ``IDSelector`` s.
+
+LangChain's FAISS store filters after the vector search: it fetches
+``fetch_k`` neighbours, drops those whose metadata does not match and keeps
+what is left, which is slow for broad filters and returns fewer than ``k``
+documents for selective ones.  ``MetadataIndex`` evaluates the filter on the
+metadata first and hands FAISS the matching vector positions, so the search
+itself only visits (and returns) matching vectors.
+
+Filters use LangChain's syntax and semantics::
+
+    {"category": "cs.CL"}                          # equality
+    {"category": ["cs.CL", "cs.IR"]}               # membership (also "$in" / "$nin")
+    {"year": {"$gte": 2023, "$lt": 2025}}          # ranges ("$gt", "$gte", "$lt", "$lte")
+    {"$or": [{...}, {...}]}, {"$not": {...}}       # plus "$and", "$eq", "$neq"
+
+Per indexed field the index keeps the value of every position, a posting
+list per value (equality and membership) and, built on the first range query
+after a change, position arrays sorted by value for the numeric and the
+string values (ranges are a binary search).  A document whose value is
+missing or of another type never matches a range.  Fields are indexed the
+first time a filter names them; callable filters are not indexable.
+
+Positions are FAISS vector ids (the keys of ``index_to_docstore_id``).
+Ids are never reused, so a deleted id is only marked dead: its entries
+stay in the postings and the mask of live ids hides it.
+"""
+from __future__ import annotations
+
+from numbers import Number
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+
+_LOGICAL = ("$and", "$or", "$not")
+_RANGE = {"$gt": ("right", True), "$gte": ("left", True), "$lt": ("left", False), "$lte": ("right", False)}
+_OPERATORS = frozenset(("$eq", "$neq", "$in", "$nin") + tuple(_RANGE))
+
+
+def filter_fields(filter) -> Optional[Set[str]]:
+    """Metadata fields a filter reads, or None if it cannot be indexed (a callable)."""
+    if callable(filter) or not isinstance(filter, dict):
+        return None
+    for op in _LOGICAL:
+        if op in filter:
+            subs = [filter[op]] if op == "$not" else filter[op]
+            fields: Set[str] = set()
+            for sub in subs:
+                sub_fields = filter_fields(sub)
+                if sub_fields is None:
+                    return None
+                fields |= sub_fields
+            return fields
+    fields = set()
+    for field, condition in filter.items():
+        if field.startswith("$"):
+            raise ValueError(f"filter contains unsupported operator: {field}")
+        if isinstance(condition, dict):
+            unknown = set(condition) - _OPERATORS
+            if unknown:
+                raise ValueError(f"filter contains unsupported operator: {sorted(unknown)[0]}")
+        fields.add(field)
+    return fields
+
+
+class _Field:
+    __slots__ = ("postings", "values", "_sorted")
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self.postings: Dict[Any, List[int]] = {}
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def append(self, value: Any) -> None:
+        position = len(self.values)
+        self.values.append(value)
+        try:
+            self.postings.setdefault(value, []).append(position)
+        except TypeError:
+            pass  # unhashable (e.g. a list): never equal to a filter value
+        self._sorted.clear()
+
+    def equal(self, value: Any, mask: np.ndarray) -> np.ndarray:
+        try:
+            positions = self.postings.get(value)
+        except TypeError:
+            positions = None
+        if positions:
+            mask[positions] = True
+        return mask
+
+    def range(self, op: str, value: Any, mask: np.ndarray) -> np.ndarray:
+        kind = _kind(value)
+        if kind is None:
+            raise TypeError(f"Cannot compare metadata with {value!r}")
+        values, positions = self._sorted_by(kind)
+        side, above = _RANGE[op]
+        cut = np.searchsorted(values, value, side=side)
+        mask[positions[cut:] if above else positions[:cut]] = True
+        return mask
+
+    def _sorted_by(self, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        if kind not in self._sorted:
+            entries = [(v, i) for i, v in enumerate(self.values) if _kind(v) == kind]
+            values = np.array([v for v, _ in entries], dtype=np.float64 if kind == "number" else str)
+            positions = np.array([i for _, i in entries], dtype=np.int64)
+            order = np.argsort(values, kind="stable")
+            self._sorted[kind] = (values[order], positions[order])
+        return self._sorted[kind]
+
+
+def _kind(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, Number) and not isinstance(value, complex):
+        return "number"
+    return None
+
+
+class MetadataIndex:
+    """
+    Filter evaluation over document metadata, by vector position.
+    Usage:
+        index = MetadataIndex(["year"], metadatas)     # metadatas[i] belongs to vector i (None: no vector)
+        index.add(new_metadatas)                       # vectors added with the next ids
+        index.remove([3, 7])                           # deleted vectors
+        selection = index.select({"year": {"$gte": 2023}})
+    """
+    def __init__(self, fields: Iterable[str] = (), metadatas: Sequence[Optional[dict]] = ()):
+        self.size = 0
+        self._fields: Dict[str, _Field] = {name: _Field() for name in fields}
+        self._live = np.zeros(0, dtype=bool)
+        self.add(metadatas)
+
+    @property
+    def fields(self) -> Set[str]:
+        return set(self._fields)
+
+    def add(self, metadatas: Iterable[Optional[dict]]) -> None:
+        """Index the metadata of vectors added with ids ``size``, ``size + 1``, ...; None marks a gap."""
+        live = []
+        for metadata in metadatas:
+            live.append(metadata is not None)
+            metadata = metadata or {}
+            for name, field in self._fields.items():
+                field.append(metadata.get(name))
+            self.size += 1
+        self._live = np.concatenate([self._live, np.array(live, dtype=bool)])
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Mark deleted vectors; they never match again."""
+        ids = np.fromiter(ids, dtype=np.int64)
+        self._live[ids[ids < self.size]] = False
+
+    def index_fields(self, names: Iterable[str], metadatas: Sequence[Optional[dict]]) -> None:
+        """Start indexing ``names``; ``metadatas`` covers every current id (None for deleted ones)."""
+        if len(metadatas) != self.size:
+            raise ValueError(f"Expected metadata for {self.size} positions, got {len(metadatas)}")
+        for name in names:
+            if name in self._fields:
+                continue
+            field = _Field()
+            for metadata in metadatas:
+                field.append((metadata or {}).get(name))
+            self._fields[name] = field
+
+    def mask(self, filter: dict) -> np.ndarray:
+        """Boolean array over ids: True where a live vector's metadata matches ``filter``."""
+        return self._match(filter) & self._live
+
+    def _match(self, filter: dict) -> np.ndarray:
+        if "$and" in filter:
+            return _all((self._match(sub) for sub in filter["$and"]), self.size)
+        if "$or" in filter:
+            result = np.zeros(self.size, dtype=bool)
+            for sub in filter["$or"]:
+                result |= self._match(sub)
+            return result
+        if "$not" in filter:
+            return ~self._match(filter["$not"])
+        return _all((self._condition(name, condition) for name, condition in filter.items()), self.size)
+
+    def select(self, filter: dict) -> "Selection":
+        return Selection(self.mask(filter))
+
+    def _condition(self, name: str, condition: Any) -> np.ndarray:
+        field = self._fields[name]
+        if isinstance(condition, dict):
+            return _all((self._operator(field, op, value) for op, value in condition.items()), self.size)
+        if isinstance(condition, list):
+            return self._operator(field, "$in", condition)
+        return field.equal(condition, np.zeros(self.size, dtype=bool))
+
+    def _operator(self, field: _Field, op: str, value: Any) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        if op in ("$eq", "$neq"):
+            field.equal(value, mask)
+        elif op in ("$in", "$nin"):
+            for item in value:
+                field.equal(item, mask)
+        else:
+            return field.range(op, value, mask)
+        return ~mask if op in ("$neq", "$nin") else mask
+
+
+def _all(masks: Iterable[np.ndarray], size: int) -> np.ndarray:
+    result = np.ones(size, dtype=bool)
+    for mask in masks:
+        result &= mask
+    return result
+
+
+class Selection:
+    """
+    The positions matching a filter, as a FAISS ``IDSelector``: a hash set of
+    ids for small selections, a bitmap over all positions otherwise.  Keep the
+    ``Selection`` alive while the selector is in use (it owns the buffers).
+    """
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.ids = np.flatnonzero(mask).astype(np.int64)
+        self.count = len(self.ids)
+        self._buffer = None
+        self._selector = None
+
+    @property
+    def selector(self):
+        if self._selector is None:
+            # A batch costs ~16 bytes per id, a bitmap one bit per position.
+            if self.count * 128 < len(self.mask):
+                self._buffer = self.ids
+                self._selector = faiss.IDSelectorBatch(self.count, faiss.swig_ptr(self._buffer))
+            else:
+                self._buffer = np.packbits(self.mask, bitorder="little")
+                self._selector = faiss.IDSelectorBitmap(len(self.mask), faiss.swig_ptr(self._buffer))
+        return self._selector
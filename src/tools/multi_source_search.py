@@ -0,0 +1,372 @@
+# Concurrent literature search across arXiv, Tavily and the local FAISS corpus
+# Results are deduplicated by DOI / arXiv id / title fingerprint and ranked by reciprocal rank fusion
+"""Multi-source literature search with deadline-bounded fan-out.
+
+``MultiSourceSearch.search`` sends every query variant to every source in
+parallel.  Every source has its own bounded worker pool, so a slow backend
+cannot queue the others out, and each call's timeout counts from the moment
+it starts running.  The whole search has a deadline; whatever has arrived
+by then is merged and returned, slower calls are abandoned.  Merging
+clusters records that share a DOI, an arXiv id or a normalised title, and
+ranks clusters with reciprocal rank fusion (RRF) over all (source, variant)
+result lists.
+
+Sources are small adapters exposing ``name``, ``timeout`` and
+``search(query, k) -> list[SearchRecord]``, so offline tests can plug in
+local stand-ins.
+"""
+from __future__ import annotations
+
+import contextvars
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from typing_extensions import TypedDict
+
+from src.orchestration.instrumentation import tool_span
+from src.orchestration.single_flight import SingleFlight, normalize_text
+
+RRF_K = 60
+
+_ARXIV_ID = re.compile(r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?", re.IGNORECASE)
+_DOI = re.compile(r"10\.\d{4,9}/\S+", re.IGNORECASE)
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "in", "is", "it", "latest", "of", "on", "or", "recent", "the", "to", "what", "which", "who",
+    "why", "with",
+}
+
+
+class SearchRecord(TypedDict, total=False):
+    title: str
+    abstract: str
+    authors: str
+    published: str
+    url: str
+    doi: str
+    arxiv_id: str
+    source: str            # source that produced the record
+    sources: List[str]     # all sources that returned it (after merging)
+    score: float           # fused RRF score (after merging)
+
+
+# ----------------------------------------------------------------------
+# Normalisation and deduplication
+# ----------------------------------------------------------------------
+
+def normalize_doi(value: Optional[str]) -> Optional[str]:
+    match = _DOI.search(value or "")
+    return match.group(0).rstrip(".").lower() if match else None
+
+
+def normalize_arxiv_id(value: Optional[str]) -> Optional[str]:
+    """Extract a version-less arXiv id from an id or abs/pdf URL."""
+    if not value or ("arxiv" not in value.lower() and not _ARXIV_ID.fullmatch(value.strip())):
+        return None
+    match = _ARXIV_ID.search(value)
+    return match.group(1).lower() if match else None
+
+
+def title_fingerprint(title: Optional[str]) -> Optional[str]:
+    words = re.findall(r"[a-z0-9]+", (title or "").lower())
+    return " ".join(words) if words else None
+
+
+def record_keys(record: SearchRecord) -> List[str]:
+    """Identity keys of a record; two records sharing any key are the same work."""
+    keys = []
+    doi = normalize_doi(record.get("doi")) or normalize_doi(record.get("url"))
+    if doi:
+        keys.append(f"doi:{doi}")
+    arxiv_id = normalize_arxiv_id(record.get("arxiv_id")) or normalize_arxiv_id(record.get("url"))
+    if arxiv_id:
+        keys.append(f"arxiv:{arxiv_id}")
+    fingerprint = title_fingerprint(record.get("title"))
+    if fingerprint:
+        keys.append(f"title:{fingerprint}")
+    return keys
+
+
+def fuse_results(ranked_lists: List[List[SearchRecord]], k: int = RRF_K) -> List[SearchRecord]:
+    """
+    Merge ranked result lists: cluster duplicates, fill missing fields from
+    any member, and order clusters by summed ``1 / (k + rank)``.
+    """
+    clusters: List[dict] = []
+    key_to_cluster: Dict[str, int] = {}
+    for results in ranked_lists:
+        for rank, record in enumerate(results, start=1):
+            keys = record_keys(record)
+            if not keys:
+                continue
+            hits = sorted({key_to_cluster[key] for key in keys if key in key_to_cluster})
+            if hits:
+                target = hits[0]
+                # The record bridges several clusters (e.g. DOI in one, arXiv id in another).
+                for other in hits[1:]:
+                    _absorb(clusters[target], clusters[other])
+                    for key, idx in list(key_to_cluster.items()):
+                        if idx == other:
+                            key_to_cluster[key] = target
+                    clusters[other] = None
+            else:
+                target = len(clusters)
+                clusters.append({"record": {}, "score": 0.0, "sources": []})
+            cluster = clusters[target]
+            for field_name, value in record.items():
+                if value and not cluster["record"].get(field_name):
+                    cluster["record"][field_name] = value
+            cluster["score"] += 1.0 / (k + rank)
+            source = record.get("source")
+            if source and source not in cluster["sources"]:
+                cluster["sources"].append(source)
+            for key in keys:
+                key_to_cluster[key] = target
+
+    merged = []
+    for cluster in clusters:
+        if cluster is None:
+            continue
+        record = dict(cluster["record"])
+        record["sources"] = cluster["sources"]
+        record["score"] = cluster["score"]
+        merged.append(record)
+    merged.sort(key=lambda r: r["score"], reverse=True)
+    return merged
+
+
+def _absorb(target: dict, other: dict) -> None:
+    for field_name, value in other["record"].items():
+        if value and not target["record"].get(field_name):
+            target["record"][field_name] = value
+    target["score"] += other["score"]
+    for source in other["sources"]:
+        if source not in target["sources"]:
+            target["sources"].append(source)
+
+
+def query_variants(question: str, topic: str = "", max_variants: int = 3) -> List[str]:
+    """The question itself, the topic, and a keyword-only form of the question."""
+    keywords = " ".join(w for w in re.findall(r"[\w\-]+", question) if w.lower() not in _STOPWORDS)
+    variants = []
+    for candidate in (question, topic, keywords, f"{topic} {keywords}".strip()):
+        candidate = " ".join(candidate.split())
+        if candidate and candidate.lower() not in (v.lower() for v in variants):
+            variants.append(candidate)
+    return variants[:max_variants]
+
+
+# ----------------------------------------------------------------------
+# Source adapters
+# ----------------------------------------------------------------------
+
+class ArxivSource:
+    """Adapter over ``ArxivTool``."""
+    name = "arxiv"
+
+    def __init__(self, arxiv_tool, timeout: float = 10.0):
+        self.arxiv_tool = arxiv_tool
+        self.timeout = timeout
+        self._flights = SingleFlight("arxiv")
+
+    def search(self, query: str, k: int) -> List[SearchRecord]:
+        # Concurrent runs asking arXiv the same thing share one request; fusion
+        # mutates records, so every caller gets its own copies.
+        records, _ = self._flights.do((normalize_text(query), k), lambda: [
+            SearchRecord(**paper.to_record(), source=self.name)
+            for paper in self.arxiv_tool.search(query, max_results=k)
+        ])
+        return [SearchRecord(**record) for record in records]
+
+
+class TavilySource:
+    """Adapter over ``TavilyTool`` (web search)."""
+    name = "tavily"
+
+    def __init__(self, tavily_tool, timeout: float = 10.0):
+        self.tavily_tool = tavily_tool
+        self.timeout = timeout
+
+    def search(self, query: str, k: int) -> List[SearchRecord]:
+        return [
+            SearchRecord(
+                title=r.get("title", ""),
+                abstract=r.get("content", ""),
+                url=r.get("url") or r.get("link", ""),
+                source=self.name,
+            )
+            for r in self.tavily_tool.search_records(query, max_results=k)
+        ]
+
+
+class FAISSSource:
+    """Adapter over the local ``FAISSTool`` corpus."""
+    name = "faiss"
+
+    def __init__(self, faiss_tool, timeout: float = 5.0):
+        self.faiss_tool = faiss_tool
+        self.timeout = timeout
+
+    def search(self, query: str, k: int) -> List[SearchRecord]:
+        return [document_record(doc, self.name) for doc in self.faiss_tool.similarity_search(query, k=k)]
+
+
+def document_record(doc, source: str = "faiss") -> SearchRecord:
+    """A corpus ``Document`` as a ``SearchRecord`` (bibliographic fields from its metadata)."""
+    meta = doc.metadata or {}
+    return SearchRecord(
+        title=meta.get("title") or doc.page_content.split("\n", 1)[0][:200],
+        abstract=doc.page_content,
+        authors=meta.get("authors", ""),
+        published=str(meta.get("published", "")),
+        url=meta.get("url", ""),
+        doi=meta.get("doi", ""),
+        arxiv_id=meta.get("arxiv_id", ""),
+        source=source,
+    )
+
+
+# ----------------------------------------------------------------------
+# Fan-out
+# ----------------------------------------------------------------------
+
+class MultiSourceSearch:
+    """
+    Query every source with every variant concurrently and fuse the results.
+    Usage:
+        searcher = MultiSourceSearch([ArxivSource(ArxivTool()), FAISSSource(faiss_tool)])
+        report = searcher.search("retrieval augmented generation for code")
+        report["results"]   # fused, deduplicated SearchRecords
+    """
+    def __init__(self, sources, per_source_k: int = 10, top_k: int = 10, deadline: float = 15.0,
+                 max_variants: int = 3, workers_per_source: int = 8):
+        self.sources = list(sources)
+        self.per_source_k = per_source_k
+        self.top_k = top_k
+        self.deadline = deadline
+        self.max_variants = max_variants
+        # Long-lived pools, one per source: calls that overrun their timeout
+        # are abandoned, not joined, and only ever hold their own source's workers.
+        self._executors = [
+            ThreadPoolExecutor(max_workers=workers_per_source, thread_name_prefix=f"lit-search-{source.name}")
+            for source in self.sources
+        ]
+
+    def search(self, question: str, topic: str = "") -> dict:
+        """
+        Returns ``{"results", "queries", "completed", "timed_out", "failed"}``;
+        the last three list ``"<source>:<query>"`` labels.
+        """
+        queries = query_variants(question, topic, self.max_variants)
+        deadline = time.monotonic() + self.deadline
+        pending = {}
+        for source, executor in zip(self.sources, self._executors):
+            for query in queries:
+                call = _Call(source.name, query, getattr(source, "timeout", self.deadline))
+                # Each call runs in a copy of this context so its tool span reaches the node's trace.
+                future = executor.submit(
+                    contextvars.copy_context().run, _timed_search, source, query, self.per_source_k, call
+                )
+                pending[future] = call
+
+        ranked_lists, completed, timed_out, failed = [], [], [], []
+        while pending:
+            now = time.monotonic()
+            for future in [f for f, call in pending.items() if not f.done() and call.expires(deadline) <= now]:
+                # Queued calls are dropped; running ones are abandoned to finish in the background.
+                future.cancel()
+                timed_out.append(pending.pop(future).label)
+            if not pending:
+                break
+            # A queued call that starts later expires no earlier than its timeout from now.
+            next_expiry = min(
+                call.expires(deadline) if call.started is not None else min(now + call.timeout, deadline)
+                for call in pending.values()
+            )
+            done, _ = wait(list(pending), timeout=max(next_expiry - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                label = pending.pop(future).label
+                try:
+                    ranked_lists.append(future.result())
+                    completed.append(label)
+                except Exception:
+                    failed.append(label)
+
+        return {
+            "results": fuse_results(ranked_lists)[: self.top_k],
+            "queries": queries,
+            "completed": completed,
+            "timed_out": timed_out,
+            "failed": failed,
+        }
+
+
+class _Call:
+    """One (source, query) call of a search; ``started`` is set when a worker picks it up."""
+    __slots__ = ("label", "timeout", "started")
+
+    def __init__(self, name: str, query: str, timeout: float):
+        self.label = f"{name}:{query}"
+        self.timeout = timeout
+        self.started: Optional[float] = None
+
+    def expires(self, deadline: float) -> float:
+        if self.started is None:
+            return deadline
+        return min(self.started + self.timeout, deadline)
+
+
+def _timed_search(source, query: str, k: int, call: _Call) -> List[SearchRecord]:
+    call.started = time.monotonic()
+    with tool_span(f"search.{source.name}") as span:
+        records = source.search(query, k)
+        span["results"] = len(records)
+    return records
+
+
+def format_search_results(records: List[SearchRecord], abstract_chars: int = 1200) -> str:
+    """Render fused records as a numbered list for prompts."""
+    lines = []
+    for i, record in enumerate(records, start=1):
+        meta = ", ".join(p for p in (record.get("authors"), record.get("published")) if p)
+        header = f"[{i}] {record.get('title', '(untitled)')}"
+        if meta:
+            header += f" ({meta})"
+        if record.get("url"):
+            header += f" <{record['url']}>"
+        lines.append(header)
+        abstract = (record.get("abstract") or "").strip()
+        if abstract:
+            lines.append(abstract[:abstract_chars])
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def compact_records(records: List[SearchRecord], abstract_chars: int = 1200) -> List[SearchRecord]:
+    """Copies of ``records`` with abstracts cut to ``abstract_chars``, for state and checkpoints."""
+    return [
+        {**record, "abstract": record["abstract"][:abstract_chars]} if record.get("abstract") else dict(record)
+        for record in records
+    ]
+
+
+def sources_from_config(search_cfg: Optional[dict], arxiv_tool=None, tavily_tool=None, faiss_tool=None):
+    """
+    Build source adapters for the names listed in the ``literature_search``
+    section of config.yaml; sources whose tool is not available are skipped.
+    """
+    search_cfg = search_cfg or {}
+    timeouts = search_cfg.get("timeouts", {})
+    available = {
+        "arxiv": (ArxivSource, arxiv_tool),
+        "tavily": (TavilySource, tavily_tool),
+        "faiss": (FAISSSource, faiss_tool),
+    }
+    sources = []
+    for name in search_cfg.get("sources", ["arxiv"]):
+        adapter, tool = available[name]
+        if tool is not None:
+            sources.append(adapter(tool, timeout=timeouts.get(name, search_cfg.get("deadline", 15.0))))
+    return sources
@@ -0,0 +1,435 @@
+"""FAISS corpus partitioned across worker processes.
+
+One ``FAISSTool`` keeps the whole corpus in the server's memory and answers
+each query on one thread of one process.  ``ShardedFAISSTool`` places every
+document on one of ``shards`` worker processes, chosen by the xxh3 hash of its
+ID, and each worker holds a complete ``FAISSTool`` (index, docstore, BM25 and
+metadata indexes) for its part of the corpus::
+
+    coordinator (embeds texts, routes, merges)
+        |-- shard 0: FAISSTool  <persist_path>/shard-000/
+        |-- shard 1: FAISSTool  <persist_path>/shard-001/
+        ...
+
+Adds and deletes go to the owning shard only.  Queries are embedded once in
+the coordinator, sent to every shard at once and each shard's top ``k`` are
+merged by distance (BM25 scores for ``keyword_search``; every shard computes
+IDF over its own part, which hash placement keeps representative).  Shards
+search concurrently, so per-query latency falls with the shard size, and the
+corpus only has to fit in the memory of all the workers together.
+
+Workers are started with ``spawn`` and talk to the coordinator over a
+``multiprocessing.Pipe`` (a socket pair on Unix).  Any number of threads can
+use the tool at once: requests to a shard are queued on its pipe and matched
+to their replies by a receiver thread.  Filters must be dicts (see
+``src.tools.metadata_index``); callables cannot be sent to a worker.
+
+The shard count of a persistent store is recorded in ``shards.json`` and
+cannot change, since it decides where each document lives.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import xxhash
+from langchain_core.embeddings import Embeddings
+
+from src.tools.faiss_tool import CURRENT_FILE, DOCUMENTS_FILE, distance_to_relevance
+
+SHARDS_FILE = "shards.json"
+SHUTDOWN_TIMEOUT = 60   # seconds a worker gets to flush its snapshot on close
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """The shard that owns ``doc_id`` (stable across processes and restarts)."""
+    return xxhash.xxh3_64_intdigest(doc_id.encode("utf-8")) % shards
+
+
+class _VectorsOnly(Embeddings):
+    """Embeddings of a shard worker: the coordinator embeds, workers only receive vectors."""
+
+    def embed_documents(self, texts):
+        raise RuntimeError("Shard workers receive vectors; embed texts in the coordinator")
+
+    def embed_query(self, text):
+        raise RuntimeError("Shard workers receive vectors; embed texts in the coordinator")
+
+
+def _serve(conn, options: dict) -> None:
+    """Worker process: answer ``(request_id, method, args, kwargs)`` requests with a ``FAISSTool``."""
+    import faiss
+    from src.tools.faiss_tool import FAISSTool
+
+    threads = options.pop("threads")
+    if threads:
+        faiss.omp_set_num_threads(threads)
+    try:
+        tool = FAISSTool(_VectorsOnly(), **options)
+    except BaseException as e:
+        conn.send((None, False, e))
+        return
+    conn.send((None, True, None))
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            request_id, method, args, kwargs = message
+            try:
+                reply = (request_id, True, getattr(tool, method)(*args, **kwargs))
+            except BaseException as e:
+                reply = (request_id, False, e)
+            try:
+                conn.send(reply)
+            except Exception as e:
+                conn.send((request_id, False, RuntimeError(f"Shard reply for {method} failed: {e}")))
+    finally:
+        tool.close()
+        conn.close()
+
+
+class _Shard:
+    """Coordinator-side handle of one worker process."""
+
+    def __init__(self, index: int, context, options: dict):
+        self.index = index
+        self.started: Future = Future()
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, options),
+                                       name=f"faiss-shard-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        self._receiver = threading.Thread(target=self._receive, name=f"faiss-shard-{index}-recv", daemon=True)
+        self._receiver.start()
+
+    def call(self, method: str, *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._pending_lock:
+            if self._closed:
+                raise RuntimeError(f"Shard {self.index} is not running")
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+        # Separate locks: the receiver must keep draining replies while a large request is written.
+        with self._send_lock:
+            self._conn.send((request_id, method, args, kwargs))
+        return future
+
+    def stop(self) -> None:
+        with self._send_lock:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass   # already gone
+        self.process.join(SHUTDOWN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._receiver.join()
+        self._conn.close()
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                request_id, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            if request_id is None:
+                if ok:
+                    self.started.set_result(True)
+                else:
+                    self.started.set_exception(result)
+                continue
+            with self._pending_lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+        with self._pending_lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        error = RuntimeError(f"Shard {self.index} process exited")
+        for future in pending:
+            future.set_exception(error)
+        if not self.started.done():
+            self.started.set_exception(error)
+
+
+class ShardedFAISSTool:
+    """
+    ``FAISSTool`` interface over a corpus split across worker processes.
+    Usage:
+        tool = ShardedFAISSTool(embeddings, shards=8, persist_path="data/vector", dimension=3072)
+        tool.add_documents(documents)
+        docs = tool.similarity_search("sparse attention", k=10, filter={"year": {"$gte": 2023}})
+        tool.close()
+    ``threads_per_shard`` caps FAISS's OpenMP threads in each worker
+    (default: the CPUs divided evenly between the shards).
+    """
+    def __init__(self, embeddings, shards=4, persist_path=None, dimension=None, snapshot_every=1000, mmap=True,
+                 index_spec=None, threads_per_shard=None, start_method="spawn"):
+        if shards < 1:
+            raise ValueError(f"shards must be at least 1, got {shards}")
+        self.embeddings = embeddings
+        self.shards = shards
+        self.persist_path = Path(persist_path) if persist_path is not None else None
+        self.dimension = self._layout(dimension)
+        threads = threads_per_shard or max(1, (os.cpu_count() or 1) // shards)
+        context = multiprocessing.get_context(start_method)
+        self._shards = [
+            _Shard(i, context, {
+                "persist_path": str(self.persist_path / f"shard-{i:03d}") if self.persist_path else None,
+                "dimension": self.dimension, "snapshot_every": snapshot_every, "mmap": mmap,
+                "index_spec": index_spec, "threads": threads,
+            })
+            for i in range(shards)
+        ]
+        self._closed = False
+        try:
+            for shard in self._shards:
+                shard.started.result()
+        except BaseException:
+            self.close()
+            raise
+
+    @classmethod
+    def from_config(cls, embeddings, section: Optional[dict] = None, **options) -> "ShardedFAISSTool":
+        """Build from the ``vector_shards`` section of config.yaml; ``options`` are the store settings."""
+        section = section or {}
+        return cls(embeddings, shards=section.get("shards", 4),
+                   threads_per_shard=section.get("threads_per_shard"),
+                   start_method=section.get("start_method", "spawn"), **options)
+
+    def _layout(self, dimension):
+        """Check (or record) the shard count of a persistent store; returns the vector dimension."""
+        if self.persist_path is None:
+            return dimension if dimension is not None else len(self.embeddings.embed_query("hello world"))
+        layout = self.persist_path / SHARDS_FILE
+        if layout.exists():
+            recorded = json.loads(layout.read_text())
+            if recorded["shards"] != self.shards:
+                raise ValueError(
+                    f"{self.persist_path} holds {recorded['shards']} shards, not {self.shards}; "
+                    "documents are placed by ID hash, so a store's shard count cannot change"
+                )
+            return recorded["dimension"]
+        if (self.persist_path / CURRENT_FILE).exists() or (self.persist_path / DOCUMENTS_FILE).exists():
+            raise ValueError(f"{self.persist_path} holds an unsharded FAISS store")
+        if dimension is None:
+            dimension = len(self.embeddings.embed_query("hello world"))
+        self.persist_path.mkdir(parents=True, exist_ok=True)
+        layout.write_text(json.dumps({"shards": self.shards, "dimension": dimension}))
+        return dimension
+
+    # ------------------------------------------------------------------
+    # Writes (routed to the owning shard)
+    # ------------------------------------------------------------------
+
+    def add_documents(self, documents, ids=None):
+        """
+        Embed ``documents`` and add each to its shard. Returns the IDs.
+        """
+        documents = list(documents)
+        if ids is None:
+            ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        texts = [doc.page_content for doc in documents]
+        return self.add_embeddings(texts, self.embeddings.embed_documents(texts),
+                                   metadatas=[doc.metadata for doc in documents], ids=ids)
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """
+        Add pre-computed embeddings, each to the shard owning its ID. Returns the IDs.
+        """
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        if not len(texts) == len(ids) == len(metadatas) == len(embeddings):
+            raise ValueError("texts, embeddings, metadatas and ids must have the same length")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        futures = []
+        for shard, positions in self._route(ids).items():
+            futures.append(shard.call(
+                "add_embeddings", [texts[p] for p in positions], vectors[positions],
+                metadatas=[metadatas[p] for p in positions], ids=[ids[p] for p in positions],
+            ))
+        _gather(futures)
+        return ids
+
+    def delete(self, ids):
+        """
+        Delete documents by their IDs. As with ``FAISSTool.delete``, raises
+        ValueError if any ID is not stored, and nothing is deleted then: every
+        owning shard is checked before any of them deletes.
+        """
+        ids = list(ids)
+        routes = self._route(ids)
+        stored = self._stored(routes, ids)
+        missing = {doc_id for doc_id in ids if doc_id not in stored}
+        if missing:
+            raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing}")
+        futures = [shard.call("delete", [ids[p] for p in positions]) for shard, positions in routes.items()]
+        return all(_gather(futures))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def contains(self, doc_id):
+        """
+        True if a document with this ID is stored.
+        """
+        return self._shards[shard_of(doc_id, self.shards)].call("contains", doc_id).result()
+
+    def contains_many(self, doc_ids):
+        """The subset of ``doc_ids`` that is stored, as a set (one request per owning shard)."""
+        doc_ids = list(doc_ids)
+        return self._stored(self._route(doc_ids), doc_ids)
+
+    def get_documents(self, doc_ids):
+        """``{doc_id: Document}`` for the given IDs that are stored."""
+        doc_ids = list(doc_ids)
+        docs = {}
+        futures = [shard.call("get_documents", [doc_ids[p] for p in positions])
+                   for shard, positions in self._route(doc_ids).items()]
+        for found in _gather(futures):
+            docs.update(found)
+        return docs
+
+    def filter_ids(self, filter):
+        """The set of stored document IDs matching a dict ``filter``."""
+        _check_filter(filter)
+        return set().union(*self._scatter("filter_ids", filter))
+
+    # ------------------------------------------------------------------
+    # Searches (scattered to every shard, merged here)
+    # ------------------------------------------------------------------
+
+    def similarity_search(self, query, k=5, filter=None):
+        """
+        Perform a similarity search for the query string.
+        Returns a list of Document objects.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query, k=5, filter=None):
+        """
+        Perform a similarity search and return (Document, distance) tuples.
+        """
+        hits = self.similarity_search_by_vectors_with_score([self.embeddings.embed_query(query)], k=k, filter=filter)
+        return [(doc, distance) for _, doc, distance in hits[0]]
+
+    def similarity_search_with_relevance_scores(self, query, k=5, filter=None):
+        """
+        Perform a similarity search and return (Document, relevance) tuples
+        (relevance as in ``FAISSTool.similarity_search_with_relevance_scores``).
+        """
+        return [(doc, distance_to_relevance(distance))
+                for doc, distance in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vectors(self, vectors, k=5, filter=None, fetch_k=None):
+        """
+        Per query vector, up to ``k`` ``(doc_id, Document, relevance)`` triples
+        over all shards, best first.
+        """
+        return [
+            [(doc_id, doc, distance_to_relevance(distance)) for doc_id, doc, distance in hits]
+            for hits in self.similarity_search_by_vectors_with_score(vectors, k=k, filter=filter, fetch_k=fetch_k)
+        ]
+
+    def similarity_search_by_vectors_with_score(self, vectors, k=5, filter=None, fetch_k=None):
+        """``similarity_search_by_vectors`` with the raw L2 distances (lower is better)."""
+        _check_filter(filter)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        per_shard = self._scatter("similarity_search_by_vectors_with_score", matrix, k=k, filter=filter,
+                                  fetch_k=fetch_k)
+        return [heapq.nsmallest(k, itertools.chain.from_iterable(hits), key=lambda hit: hit[2])
+                for hits in zip(*per_shard)]
+
+    def keyword_search(self, query, k=10, filter=None):
+        """
+        The ``k`` best BM25 ``(doc_id, score)`` pairs for ``query`` over all
+        shards, restricted to documents matching ``filter``.
+        """
+        _check_filter(filter)
+        per_shard = self._scatter("keyword_search", query, k=k, filter=filter)
+        return heapq.nlargest(k, itertools.chain.from_iterable(per_shard), key=lambda hit: hit[1])
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def tune(self, **params):
+        """
+        Set query-time search parameters on every shard (see ``FAISSTool.tune``).
+        """
+        self._scatter("tune", **params)
+
+    def snapshot(self):
+        """
+        Snapshot every shard. Returns the snapshot paths, one per shard.
+        """
+        return self._scatter("snapshot")
+
+    def close(self):
+        """
+        Flush unsnapshotted changes and stop the worker processes.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for shard in self._shards:
+            shard.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _route(self, ids: List[str]) -> Dict[_Shard, List[int]]:
+        """Positions in ``ids`` grouped by owning shard."""
+        groups: Dict[_Shard, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            groups.setdefault(self._shards[shard_of(doc_id, self.shards)], []).append(position)
+        return groups
+
+    def _stored(self, routes: Dict[_Shard, List[int]], ids: List[str]) -> set:
+        """IDs of ``ids`` stored in their shards, one ``contains_many`` request per shard in ``routes``."""
+        futures = [shard.call("contains_many", [ids[p] for p in positions]) for shard, positions in routes.items()]
+        return set().union(*_gather(futures))
+
+    def _scatter(self, method: str, *args, **kwargs) -> list:
+        """Send one request to every shard at once and wait for all the replies."""
+        return _gather([shard.call(method, *args, **kwargs) for shard in self._shards])
+
+
+def _gather(futures: List[Future]) -> list:
+    return [future.result() for future in futures]
+
+
+def _check_filter(filter) -> None:
+    if callable(filter):
+        raise ValueError("ShardedFAISSTool takes dict filters only; a callable cannot be sent to the shards")
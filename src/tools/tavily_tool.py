@@ -26,6 +26,16 @@ class TavilyTool:
         results = self.search_client.search(query, num_results=num_results)
         return results
 
+    def search_records(self, query: str, max_results: int = 10):
+        """
+        Run a Tavily search through the LangChain tool interface and return
+        the list of result dicts (title, url, content, score).
+        """
+        response = self.search_client.invoke({"query": query})
+        if isinstance(response, dict):
+            response = response.get("results", [])
+        return list(response or [])[:max_results]
+
     def get_result_details(self, result_id: str):
         details = self.search_client.get_details(result_id)
         return details
@@ -0,0 +1,71 @@
+import json
+import unittest
+
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, LocalArxiv
+from benchmarks.run_benchmarks import (
+    BASELINE_PATH, PROFILES, bench_faiss, bench_graph, bench_shards, compare, profile_metrics, unbaselined,
+)
+
+
+class TestFakes(unittest.TestCase):
+
+    def test_chat_model_is_deterministic_and_reports_usage(self):
+        llm = FakeChatModel(latency=0, tokens_per_second=1e6, response_tokens=8)
+        first, second = llm.invoke("same prompt"), llm.invoke("same prompt")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(len(first.content.split()), 8)
+        self.assertEqual(first.usage_metadata["output_tokens"], 8)
+
+    def test_stream_matches_invoke(self):
+        llm = FakeChatModel(latency=0, tokens_per_second=1e6, response_tokens=8)
+        chunks = list(llm.stream("prompt"))
+        self.assertEqual("".join(c.content for c in chunks).strip(), llm.invoke("prompt").content)
+        self.assertIsNotNone(chunks[-1].usage_metadata)
+
+    def test_embeddings_are_unit_and_stable(self):
+        vector = FakeEmbeddings(16).embed_query("text")
+        self.assertAlmostEqual(sum(v * v for v in vector), 1.0, places=5)
+        self.assertEqual(vector, FakeEmbeddings(16).embed_documents(["text"])[0])
+
+    def test_local_arxiv_ranks_by_overlap(self):
+        arxiv = LocalArxiv(size=20)
+        query = "sparse attention latency"
+        results = list(arxiv.search(query, max_results=5))
+        self.assertEqual(len(results), 5)
+        overlap = [len(set(query.split()) & set((p.title + " " + p.abstract).lower().split())) for p in results]
+        self.assertEqual(overlap, sorted(overlap, reverse=True))
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_compare_flags_only_regressions_beyond_tolerance(self):
+        baseline = {"graph.throughput_runs_per_s": 10.0, "graph.latency_p50_ms": 500.0,
+                    "faiss.query_p50_ms@1000": 0.1}
+        current = {"graph.throughput_runs_per_s": 7.0, "graph.latency_p50_ms": 400.0,
+                   "faiss.query_p50_ms@1000": 0.2}
+        regressions = compare(current, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("graph.throughput_runs_per_s"))
+        self.assertEqual(unbaselined({**current, "faiss.filtered_query_p50_ms@1000": 0.3}, baseline),
+                         ["faiss.filtered_query_p50_ms@1000"])
+
+    def test_baselines_cover_every_profile_metric(self):
+        baselines = json.loads(BASELINE_PATH.read_text())
+        for profile in PROFILES:
+            with self.subTest(profile=profile):
+                self.assertEqual(unbaselined(dict.fromkeys(profile_metrics(profile)), baselines[profile]["metrics"]), [])
+
+    def test_smoke_run(self):
+        graph = bench_graph(runs=2, concurrency=2, memory_runs=1, llm_latency=0, tokens_per_second=1e6)
+        self.assertGreater(graph["graph.throughput_runs_per_s"], 0)
+        self.assertGreater(graph["graph.memory_peak_kib_per_run"], 0)
+        faiss = bench_faiss([100], queries=3)
+        self.assertEqual(set(faiss), {"faiss.add_docs_per_s@100", "faiss.query_p50_ms@100",
+                                      "faiss.filtered_query_p50_ms@100"})
+        shards = bench_shards([2], corpus_size=200, queries=4, clients=2)
+        self.assertEqual(set(shards), {"shards.add_vectors_per_s@2", "shards.query_p50_ms@2",
+                                       "shards.queries_per_s@2"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import unittest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, END
+from src.deployment.streaming import StreamBusy, StreamRegistry, format_sse, stream_run
+from src.deployment.worker_pool import GraphWorkerPool, PoolSaturated
+from src.orchestration.state import AppState
+
+class TestGraphWorkerPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_limits_concurrency(self):
+        pool = GraphWorkerPool(max_concurrency=2, max_queue=10)
+        active = 0
+        peak = 0
+
+        async def work(i):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return i
+
+        results = await asyncio.gather(*(pool.run(work, i) for i in range(6)))
+        self.assertEqual(results, list(range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(pool.stats()["completed"], 6)
+
+    async def test_rejects_when_saturated(self):
+        pool = GraphWorkerPool(max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+
+        running = asyncio.ensure_future(pool.run(work))
+        queued = asyncio.ensure_future(pool.run(work))
+        await asyncio.sleep(0)
+        self.assertEqual(pool.queue_depth, 1)
+        with self.assertRaises(PoolSaturated):
+            await pool.run(work)
+        release.set()
+        await asyncio.gather(running, queued)
+        stats = pool.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["queued"], 0)
+
+    async def test_failure_releases_slot(self):
+        pool = GraphWorkerPool(max_concurrency=1, max_queue=0)
+
+        async def boom():
+            raise RuntimeError("fail")
+
+        with self.assertRaises(RuntimeError):
+            await pool.run(boom)
+        self.assertEqual(await pool.run(asyncio.sleep, 0, result="ok"), "ok")
+        self.assertEqual(pool.stats()["failed"], 1)
+
+    async def test_submit_admits_synchronously(self):
+        pool = GraphWorkerPool(max_concurrency=1, max_queue=0)
+        release = asyncio.Event()
+        task = pool.submit(release.wait)
+        with self.assertRaises(PoolSaturated):
+            pool.submit(release.wait)
+        release.set()
+        await task
+        self.assertEqual(pool.stats()["completed"], 1)
+
+def _writer_graph():
+    llm = FakeListChatModel(responses=["draft text"])
+
+    async def write(state):
+        reply = await llm.ainvoke("write")
+        return {"artifacts": {"synthesis": reply.content}, "progress_log": ["written"]}
+
+    builder = StateGraph(AppState)
+    builder.add_node("SynthesizerWriter", RunnableLambda(write))
+    builder.add_edge(START, "SynthesizerWriter")
+    builder.add_edge("SynthesizerWriter", END)
+    return builder.compile(checkpointer=MemorySaver())
+
+class TestStreaming(unittest.IsolatedAsyncioTestCase):
+
+    async def test_streams_tokens_and_node_updates(self):
+        registry = StreamRegistry()
+        log = registry.start("t1")
+        await stream_run(_writer_graph(), {"topic": "x"}, {"configurable": {"thread_id": "t1"}}, log)
+        events = [e async for e in log.follow()]
+        names = [name for _, name, _ in events]
+        self.assertEqual(names[0], "start")
+        self.assertEqual(names[-1], "end")
+        tokens = "".join(data["content"] for _, name, data in events if name == "token")
+        self.assertEqual(tokens, "draft text")
+        self.assertLess(names.index("token"), names.index("node"))
+        node = next(data for _, name, data in events if name == "node")
+        self.assertEqual(node["update"]["artifacts"]["synthesis"], "draft text")
+        self.assertEqual([e[0] for e in events], list(range(1, len(events) + 1)))
+
+    async def test_resume_after_disconnect(self):
+        registry = StreamRegistry()
+        log = registry.start("t1")
+        with self.assertRaises(StreamBusy):
+            registry.start("t1")
+        for i in range(5):
+            log.publish("token", {"content": str(i)})
+
+        async def finish():
+            await asyncio.sleep(0.01)
+            log.publish("end", {})
+            log.close()
+
+        asyncio.ensure_future(finish())
+        resumed = [e async for e in registry.get("t1").follow(last_event_id=3)]
+        self.assertEqual([e[0] for e in resumed], [4, 5, 6])
+        self.assertEqual(resumed[-1][1], "end")
+        self.assertIs(registry.start("t1"), log)   # next run continues the id sequence
+        self.assertEqual(log.publish("start", {}), 7)
+
+    async def test_reports_evicted_events_and_keepalive(self):
+        log = StreamRegistry(max_events=2).start("t1")
+        for i in range(4):
+            log.publish("token", {"content": str(i)})
+        follower = log.follow(last_event_id=0, keepalive=0.01)
+        self.assertEqual((await follower.__anext__())[1], "gap")
+        self.assertEqual([(await follower.__anext__())[0] for _ in range(2)], [3, 4])
+        self.assertIsNone(await follower.__anext__())
+        await follower.aclose()
+
+    def test_format_sse(self):
+        frame = format_sse((3, "token", {"content": "hi"}))
+        self.assertEqual(frame, 'id: 3\nevent: token\ndata: {"content": "hi"}\n\n')
+        self.assertEqual(json.loads(frame.split("data: ")[1]), {"content": "hi"})
+        self.assertEqual(format_sse(None), ": keepalive\n\n")
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def test_metrics_are_prometheus_text(self):
+        from fastapi.testclient import TestClient
+        from src.deployment.server import app
+        response = TestClient(app).get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn("# TYPE polyscholar_node_duration_seconds histogram", response.text)
+        self.assertIn("polyscholar_pool_queued 0", response.text)
+        self.assertIn("polyscholar_streams_running 0", response.text)
+
+class TestInvokeCoalescing(unittest.IsolatedAsyncioTestCase):
+
+    async def test_identical_requests_share_one_run(self):
+        import httpx
+        from types import SimpleNamespace
+        from unittest.mock import patch
+        from src.deployment import server
+        runs = []
+
+        async def ainvoke(user_input, config):
+            thread = config["configurable"]["thread_id"]
+            runs.append(thread)
+            await asyncio.sleep(0.05)
+            return {"research_question": user_input["research_question"], "thread": thread}
+
+        fake = SimpleNamespace(graph=SimpleNamespace(ainvoke=ainvoke), resolve=lambda state: state)
+        transport = httpx.ASGITransport(app=server.app)
+        with patch.object(server, "default_graph", return_value=fake):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(
+                    client.post("/invoke", json={"research_question": "Sparse attention?"}),
+                    client.post("/invoke", json={"research_question": "  sparse   ATTENTION"}),
+                    client.post("/invoke", json={"research_question": "Sparse attention?", "thread_id": "mine"}),
+                )
+        self.assertEqual(len(runs), 2)
+        bodies = [r.json() for r in responses]
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertEqual(bodies[2]["thread"], "mine")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import time
+import unittest
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.memory.memory_store import MemoryStore
+from src.memory.recall_index import RecallIndex
+
+VOCABULARY = ["graph", "vector", "arxiv", "prompt", "cache", "token"]
+
+class KeywordEmbeddings(Embeddings):
+    """One dimension per vocabulary word: similar texts share words."""
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        return [float(words.count(w)) for w in VOCABULARY]
+
+class TestRecallIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_top_k_matches_brute_force(self):
+        vectors = self.rng.normal(size=(3000, 16)).astype(np.float32)
+        index = RecallIndex(background_compaction=False)
+        index.add([f"k{i}" for i in range(3000)], vectors)   # grows past the initial capacity
+        query = self.rng.normal(size=16)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:10]
+        hits = index.search(query, k=10)
+        self.assertEqual([key for key, _ in hits], [f"k{i}" for i in expected])
+        self.assertEqual(len(index.search(query, k=5000)), 3000)
+
+    def test_overwrite_delete_and_compaction(self):
+        index = RecallIndex(compact_ratio=0.5, background_compaction=False)
+        index.add(["a", "b", "c", "d"], np.eye(4))
+        index.add(["a"], [[0, 1, 1, 0]])              # overwrite: old row tombstoned
+        self.assertEqual([k for k, _ in index.search([0, 1, 0, 0], k=2)], ["b", "a"])
+        self.assertTrue(index.remove("b"))
+        self.assertFalse(index.remove("b"))
+        self.assertEqual(index.search([0, 1, 0, 0], k=1)[0][0], "a")
+        self.assertEqual(index.stats()["tombstones"], 2)
+        index.remove("c")                             # 3 of 5 rows dead -> compacted
+        self.assertEqual(index.stats()["tombstones"], 0)
+        self.assertEqual(sorted(index.keys()), ["a", "d"])
+        self.assertEqual([k for k, _ in index.search([0, 0, 0, 1], k=5)], ["d", "a"])
+
+    def test_background_compaction(self):
+        index = RecallIndex(compact_ratio=0.1)
+        index.add([str(i) for i in range(100)], self.rng.normal(size=(100, 8)))
+        for i in range(20):
+            index.remove(str(i))
+        deadline = time.monotonic() + 5
+        while index.stats()["tombstones"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(index.stats()["tombstones"], 0)
+        self.assertEqual(len(index), 80)
+
+class TestMemoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = MemoryStore(embeddings=KeywordEmbeddings())
+        self.memory.save_many("agent", {
+            "m1": "graph graph vector",
+            "m2": "arxiv prompt",
+            "m3": "token cache cache",
+        })
+
+    def test_get_update_delete_list(self):
+        self.assertEqual(self.memory.get("agent", "m2"), {"text": "arxiv prompt"})
+        self.memory.update("agent", "m2", "token token")
+        self.assertEqual(self.memory.get("agent", "m2")["text"], "token token")
+        self.memory.delete("agent", "m1")
+        self.assertIsNone(self.memory.get("agent", "m1"))
+        self.assertEqual(sorted(self.memory.list_keys("agent")), ["m2", "m3"])
+        self.assertEqual(self.memory.list_keys("other"), [])
+
+    def test_search(self):
+        hits = self.memory.search("agent", "vector graph", k=2)
+        self.assertEqual(hits[0]["key"], "m1")
+        self.assertEqual(hits[0]["text"], "graph graph vector")
+        self.assertAlmostEqual(hits[0]["score"], 3 / np.sqrt(10))
+        self.assertEqual(self.memory.search("agent", "cache", k=1)[0]["key"], "m3")
+        self.assertEqual(self.memory.search("empty", "cache"), [])
+
+if __name__ == '__main__':
+    unittest.main()
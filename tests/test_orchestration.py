@@ -0,0 +1,815 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.orchestration.llm_cache import (
+    LLMResponseCache,
+    MemoryLRUTier,
+    SQLiteTier,
+    llm_identity,
+    make_cache_key,
+)
+from src.agents.agent_nodes import _invoke_and_route, literature_search_node, supervisor_node
+from src.agents.map_reduce import MapReduceSummarizer
+from src.prompts.prompt_manager import PromptManager
+from src.prompts.token_budget import TokenBudget, count_tokens
+from src.tools.multi_source_search import MultiSourceSearch
+from src.orchestration.dependency_graph import (
+    NodeSpec,
+    build_dependency_graph,
+    critical_path_report,
+    resolve_dependencies,
+)
+from src.orchestration.state import AppState, format_dynamic_block, ring_buffer
+from src.orchestration.artifact_store import ArtifactStore, ArtifactView, is_ref
+from src.orchestration.checkpointer import SQLiteCheckpointer
+from src.orchestration.batch_runner import BatchRunner, load_jobs
+from src.orchestration.llm_model import ModelRegistry, initialize_llm
+from src.orchestration.vector_index import vector_index_node
+from src.orchestration.instrumentation import METRICS, configure_pricing, trace_summary
+from src.orchestration.rate_limit import RATE_LIMIT_CONFIG_KEY, RateLimits, TokenBucket, provider_of
+from src.orchestration.routing import RoutingPolicy, SupervisorPlan, parse_plan
+from src.orchestration.single_flight import SingleFlight, normalize_request, normalize_text
+from src.agents.agent_nodes import _ainvoke_and_route
+from langchain_core.documents import Document
+from langgraph.graph import END
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_all_parameters(self):
+        base = make_cache_key("gpt-4o-mini", 0.0, 4096, "prompt")
+        self.assertEqual(base, make_cache_key("gpt-4o-mini", 0.0, 4096, "prompt"))
+        self.assertNotEqual(base, make_cache_key("gpt-4o", 0.0, 4096, "prompt"))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", 0.5, 4096, "prompt"))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", 0.0, 1024, "prompt"))
+        self.assertNotEqual(base, make_cache_key("gpt-4o-mini", 0.0, 4096, "prompt!"))
+
+    def test_memory_tier_lru_and_ttl(self):
+        tier = MemoryLRUTier(max_entries=2)
+        tier.set("a", "1")
+        tier.set("b", "2")
+        tier.get("a")
+        tier.set("c", "3")
+        self.assertIsNone(tier.get("b"))
+        self.assertEqual(tier.get("a"), "1")
+
+        expiring = MemoryLRUTier(ttl_seconds=0.01)
+        expiring.set("a", "1")
+        time.sleep(0.02)
+        self.assertIsNone(expiring.get("a"))
+
+    def test_sqlite_tier_persists_and_evicts(self):
+        first, second = os.urandom(200).hex(), os.urandom(200).hex()
+        tier = SQLiteTier(self.db_path)
+        tier.set("a", first)
+        tier.close()
+        reopened = SQLiteTier(self.db_path, max_bytes=300)
+        self.assertEqual(reopened.get("a"), first)
+        reopened.set("b", second)
+        self.assertEqual(len(reopened), 1)
+        self.assertIsNone(reopened.get("a"))
+        reopened.close()
+
+    def test_promotion_and_stats(self):
+        disk = SQLiteTier(self.db_path)
+        disk.set("k", "value")
+        memory = MemoryLRUTier()
+        cache = LLMResponseCache([memory, disk])
+        self.assertEqual(cache.get("k"), "value")
+        self.assertEqual(memory.get("k"), "value")
+        self.assertIsNone(cache.get("missing"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits_by_tier"], {"memory": 0, "sqlite": 1})
+        disk.close()
+
+    def test_invoke_and_route_uses_cache_unless_bypassed(self):
+        llm = FakeListChatModel(responses=["first", "second", "third"])
+        cache = LLMResponseCache([MemoryLRUTier()])
+        out1 = _invoke_and_route("summarizer", llm, "same prompt", cache=cache)
+        out2 = _invoke_and_route("summarizer", llm, "same prompt", cache=cache)
+        self.assertEqual(out1, out2)
+        self.assertEqual(out1["update"]["artifacts"]["summary"], "first")
+        bypass = {"configurable": {"bypass_llm_cache": True}}
+        out3 = _invoke_and_route("summarizer", llm, "same prompt", cache=cache, config=bypass)
+        self.assertEqual(out3["update"]["artifacts"]["summary"], "second")
+
+def _sleeper(key, seconds):
+    async def node(state):
+        await asyncio.sleep(seconds)
+        return {"update": {"artifacts": {key: key.upper()}, "progress_log": [key]}}
+    return node
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def _specs(self):
+        return [
+            NodeSpec("Supervisor", _sleeper("plan", 0.01), writes=("supervisor_directives",)),
+            NodeSpec("Search", _sleeper("results", 0.2),
+                     reads=("supervisor_directives",), writes=("artifacts.results",)),
+            NodeSpec("Gaps", _sleeper("gaps", 0.2),
+                     reads=("supervisor_directives",), writes=("artifacts.gaps",)),
+            NodeSpec("Writer", _sleeper("synthesis", 0.01),
+                     reads=("artifacts.results", "artifacts.gaps", "supervisor_directives"),
+                     writes=("artifacts.synthesis",)),
+        ]
+
+    def test_resolve_dependencies_reduces_transitive_edges(self):
+        deps = resolve_dependencies(self._specs())
+        self.assertEqual(deps["Supervisor"], set())
+        self.assertEqual(deps["Search"], {"Supervisor"})
+        self.assertEqual(deps["Writer"], {"Search", "Gaps"})
+
+    def test_rejects_cycles_and_duplicate_writers(self):
+        with self.assertRaises(ValueError):
+            resolve_dependencies([
+                NodeSpec("A", None, reads=("b",), writes=("a",)),
+                NodeSpec("B", None, reads=("a",), writes=("b",)),
+            ])
+        with self.assertRaises(ValueError):
+            resolve_dependencies([NodeSpec("A", None, writes=("x",)), NodeSpec("B", None, writes=("x",))])
+
+    def test_independent_nodes_run_in_parallel(self):
+        specs = self._specs()
+        graph = build_dependency_graph(AppState, specs).compile(checkpointer=MemorySaver())
+        start = time.perf_counter()
+        state = asyncio.run(graph.ainvoke({}, {"configurable": {"thread_id": "t"}}))
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.38)
+        self.assertEqual(state["artifacts"],
+                         {"plan": "PLAN", "results": "RESULTS", "gaps": "GAPS", "synthesis": "SYNTHESIS"})
+        self.assertEqual(state["progress_log"][0], "plan")
+        self.assertEqual(state["progress_log"][-1], "synthesis")
+
+        report = critical_path_report(state["node_timings"], specs)
+        self.assertEqual(report["critical_path"][0], "Supervisor")
+        self.assertEqual(report["critical_path"][-1], "Writer")
+        self.assertEqual(len(report["critical_path"]), 3)
+        self.assertGreater(report["parallelism"], 1.2)
+
+def _logging_graph(checkpointer):
+    specs = [NodeSpec("Step", lambda state: {"progress_log": ["step"], "artifacts": {"n": len(state.get("progress_log", []))}})]
+    return build_dependency_graph(AppState, specs).compile(checkpointer=checkpointer)
+
+class TestSQLiteCheckpointer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "checkpoints.sqlite")
+        self.config = {"configurable": {"thread_id": "t1"}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_survives_restart(self):
+        saver = SQLiteCheckpointer(self.path)
+        _logging_graph(saver).invoke({"research_question": "q"}, self.config)
+        _logging_graph(saver).invoke({"research_question": "q"}, self.config)
+        saver.close()
+        reopened = SQLiteCheckpointer(self.path)
+        state = _logging_graph(reopened).get_state(self.config).values
+        self.assertEqual(state["progress_log"], ["step", "step"])
+        self.assertEqual(state["research_question"], "q")
+        history = list(_logging_graph(reopened).get_state_history(self.config))
+        self.assertEqual(history[0].parent_config["configurable"]["checkpoint_id"],
+                         history[1].config["configurable"]["checkpoint_id"])
+        reopened.close()
+
+    def test_keeps_last_n_checkpoints(self):
+        saver = SQLiteCheckpointer(self.path, keep_last=3)
+        graph = _logging_graph(saver)
+        for _ in range(5):
+            graph.invoke({}, self.config)
+        stats = saver.stats()
+        self.assertEqual(stats["checkpoints"], 3)
+        self.assertEqual(len(graph.get_state(self.config).values["progress_log"]), 5)
+        saver.delete_thread("t1")
+        self.assertEqual(saver.stats(), {"threads": 0, "checkpoints": 0, "blobs": 0, "writes": 0})
+        saver.close()
+
+    def test_log_window_truncates_with_marker(self):
+        saver = SQLiteCheckpointer(self.path, log_window=3)
+        graph = _logging_graph(saver)
+        for _ in range(6):
+            graph.invoke({}, self.config)
+        log = graph.get_state(self.config).values["progress_log"]
+        self.assertEqual(log, ["[4 earlier entries truncated]", "step", "step"])
+        saver.close()
+
+@patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"})
+class TestModelRegistry(unittest.TestCase):
+
+    def test_memoizes_clients_and_shares_http_pool(self):
+        models = ModelRegistry(
+            models_cfg={"roles": {"synthesizer_writer": {"max_tokens": 8192}}},
+            http_cfg={"max_keepalive_connections": 5},
+        )
+        supervisor = models.for_role("supervisor")
+        self.assertIs(models.for_role("gap_finder"), supervisor)
+        writer = models.for_role("synthesizer_writer")
+        self.assertIsNot(writer, supervisor)
+        self.assertEqual(writer.max_tokens, 8192)
+        self.assertIs(writer.http_client, supervisor.http_client)
+        self.assertIs(writer.http_async_client, supervisor.http_async_client)
+        self.assertEqual(models.stats()["clients"], 2)
+        models.close()
+
+    def test_gemini_clients_are_memoized_but_not_pooled(self):
+        genai = MagicMock()
+        genai.ChatGoogleGenerativeAI.side_effect = lambda **kwargs: MagicMock(**kwargs)
+        models = ModelRegistry(default_model="gemini-2.5-flash")
+        with patch.dict(sys.modules, {"langchain_google_genai": genai}):
+            supervisor = models.for_role("supervisor")
+            self.assertIs(models.for_role("summarizer"), supervisor)
+        self.assertEqual(genai.ChatGoogleGenerativeAI.call_count, 1)
+        self.assertNotIn("http_client", genai.ChatGoogleGenerativeAI.call_args.kwargs)
+        self.assertIsNone(models._http_client)
+
+    def test_http_pools_created_once_and_closed(self):
+        from concurrent.futures import ThreadPoolExecutor
+        models = ModelRegistry()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            pairs = list(pool.map(lambda _: models.http_clients(), range(32)))
+        self.assertTrue(all(pair[0] is pairs[0][0] and pair[1] is pairs[0][1] for pair in pairs))
+        sync_client, async_client = pairs[0]
+        asyncio.run(models.aclose())
+        models.close()
+        self.assertTrue(async_client.is_closed)
+        self.assertTrue(sync_client.is_closed)
+        writer = models.for_role("synthesizer_writer")
+        self.assertIsNot(writer.http_client, sync_client)
+        self.assertFalse(writer.http_client.is_closed)
+        self.assertFalse(writer.http_async_client.is_closed)
+        models.close()
+
+    def test_default_model_and_initialize_llm(self):
+        models = ModelRegistry(default_model="gpt-4.1-mini")
+        self.assertEqual(models.for_role("summarizer").model_name, "gpt-4.1-mini")
+        llm = initialize_llm()
+        self.assertIsNotNone(llm)
+        self.assertIs(initialize_llm(), llm)
+        with self.assertRaises(ValueError):
+            models.get("unknown-model")
+
+    def test_lazy_client_created_on_first_call(self):
+        models = ModelRegistry(default_model="gpt-4.1-mini")
+        llm = models.for_role("supervisor", lazy=True)
+        self.assertEqual(llm_identity(llm), ("gpt-4.1-mini", 0.0, 4096))
+        self.assertEqual(models.stats()["clients"], 0)
+        self.assertIs(llm.resolve(), models.for_role("supervisor"))
+        self.assertEqual(llm.model_name, llm.resolve().model_name)
+        self.assertEqual(models.stats()["clients"], 1)
+
+class TestRateLimits(unittest.TestCase):
+
+    def test_token_bucket_spaces_out_requests(self):
+        bucket = TokenBucket(per_minute=600, capacity=2)   # 10 per second
+        waits = [bucket.acquire() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, delta=0.02)
+        self.assertAlmostEqual(waits[3], 0.1, delta=0.02)
+
+    def test_invoke_and_route_acquires_provider_budget(self):
+        limits = RateLimits({"openai": {"rpm": 60, "tpm": 100000}})
+        llm = FakeListChatModel(responses=["ok"])
+        with patch("src.agents.agent_nodes.limiter_for", return_value=limits.limiters["openai"]):
+            _invoke_and_route("summarizer", llm, "prompt", config={"configurable": {}})
+        self.assertLess(limits.limiters["openai"].requests.level, 60)
+        self.assertLess(limits.limiters["openai"].tokens.level, 100000 - 1000)
+        self.assertEqual(provider_of("gpt-4o-mini"), "openai")
+        self.assertEqual(provider_of("gemini-2.5-flash"), "google")
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.jobs_path = os.path.join(self.tmp.name, "jobs.jsonl")
+        self.out_path = os.path.join(self.tmp.name, "out", "results.jsonl")
+        with open(self.jobs_path, "w") as f:
+            f.write('{"id": "a", "topic": "t", "research_question": "qa", "criteria": {"inclusion": ["x"]}}\n')
+            f.write('\n{"research_question": "qb"}\n')
+            f.write('{"id": "c", "research_question": "qc"}\n')
+        self.failures = {"qc": 1}
+        self.seen_configs = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _graph(self):
+        def first(state, config):
+            self.seen_configs.append(config["configurable"])
+            return {"progress_log": ["first"]}
+
+        def second(state):
+            question = state["research_question"]
+            if self.failures.get(question):
+                self.failures[question] -= 1
+                raise RuntimeError("provider hiccup")
+            return {"artifacts": {"answer": question.upper()}}
+
+        specs = [
+            NodeSpec("First", first, writes=("progress_log",)),
+            NodeSpec("Second", second, reads=("research_question",), after=("First",)),
+        ]
+        return build_dependency_graph(AppState, specs).compile(checkpointer=MemorySaver())
+
+    def test_runs_retries_and_resumes(self):
+        jobs = load_jobs(self.jobs_path)
+        self.assertEqual(jobs[0]["inclusion_criteria"], ["x"])
+        graph = self._graph()
+        runner = BatchRunner(graph, rate_limits=RateLimits({}), max_concurrency=2,
+                             backoff_base_seconds=0.01)
+        summary = asyncio.run(runner.run(jobs, self.out_path))
+        self.assertEqual((summary["ok"], summary["error"], summary["skipped"]), (3, 0, 0))
+        with open(self.out_path) as f:
+            records = {r["id"]: r for r in map(json.loads, f)}
+        self.assertEqual(records["c"]["attempts"], 2)
+        self.assertEqual(records["c"]["result"]["artifacts"]["answer"], "QC")
+        # The retry resumed from the checkpoint: First ran once for job c.
+        self.assertEqual(sum(1 for c in self.seen_configs if c["thread_id"] == "batch-c"), 1)
+        self.assertIn(RATE_LIMIT_CONFIG_KEY, self.seen_configs[0])
+
+        again = asyncio.run(runner.run(jobs, self.out_path))
+        self.assertEqual((again["ok"], again["skipped"]), (0, 3))
+
+    def test_records_errors_after_max_attempts(self):
+        self.failures = {"qa": 5}
+        runner = BatchRunner(self._graph(), max_attempts=2, backoff_base_seconds=0.01)
+        summary = asyncio.run(runner.run(load_jobs(self.jobs_path)[:1], self.out_path))
+        self.assertEqual(summary["error"], 1)
+        with open(self.out_path) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["status"], "error")
+        self.assertIn("provider hiccup", record["error"])
+
+def _planner(skip=(), done=False):
+    def node(state):
+        return {"plan": {"skip": list(skip), "done": done, "reasons": {}},
+                "iteration_count": state.get("iteration_count", 0) + 1, "progress_log": ["plan"]}
+    return node
+
+class StubCorpus:
+    def __init__(self, relevance):
+        self.relevance = relevance
+
+    def similarity_search_with_relevance_scores(self, query, k=5, filter=None):
+        return [(Document(page_content="Known answer", metadata={"title": "Corpus Paper"}), self.relevance)]
+
+class TestRouting(unittest.TestCase):
+
+    def _specs(self, skip=(), done=False, route=None):
+        return [
+            NodeSpec("Supervisor", _planner(skip, done), writes=("plan", "iteration_count")),
+            NodeSpec("Search", _sleeper("results", 0), reads=("plan",), writes=("artifacts.results",),
+                     skippable=True),
+            NodeSpec("Gaps", _sleeper("gaps", 0), reads=("plan",), writes=("artifacts.gaps",), skippable=True),
+            NodeSpec("Writer", _sleeper("synthesis", 0), reads=("artifacts.results", "artifacts.gaps"),
+                     writes=("artifacts.synthesis",), skippable=True, route=route),
+        ]
+
+    def _run(self, specs):
+        graph = build_dependency_graph(AppState, specs).compile(checkpointer=MemorySaver())
+        return asyncio.run(graph.ainvoke({}, {"configurable": {"thread_id": "t"}}))
+
+    def test_parse_plan(self):
+        plan = parse_plan('Plan:\n{"directive": "focus on 2023", "skip": ["GapFinder", "Bogus"], "done": false}')
+        self.assertEqual(plan.directive, "focus on 2023")
+        self.assertEqual(plan.skip, ("GapFinder",))
+        self.assertFalse(plan.done)
+        fallback = parse_plan("Search broadly.")
+        self.assertEqual((fallback.directive, fallback.skip, fallback.done), ("Search broadly.", (), False))
+
+    def test_policy_rules(self):
+        policy = RoutingPolicy(corpus_threshold=0.8)
+        plan = policy.plan({"artifacts": {}}, SupervisorPlan("go", done=True), [("doc", 0.9)])
+        self.assertFalse(plan.done)   # nothing synthesized yet
+        self.assertEqual(plan.skip, ("LiteratureSearch", "GapFinder"))
+        plan = policy.plan({"artifacts": {"to_analyze": "x"}}, SupervisorPlan("go"), [("doc", 0.5)])
+        self.assertEqual(plan.skip, ())
+        done = policy.plan({"artifacts": {"synthesis": "s"}}, SupervisorPlan("stop", done=True))
+        self.assertEqual(done.skip, ("LiteratureSearch", "Summarizer", "GapFinder", "SynthesizerWriter"))
+
+    def test_skipped_node_does_not_block_join(self):
+        state = self._run(self._specs(skip=["Gaps"]))
+        self.assertEqual(state["artifacts"], {"results": "RESULTS", "synthesis": "SYNTHESIS"})
+        self.assertIn("Gaps skipped: not needed.", state["progress_log"])
+        skipped = [t["node"] for t in state["node_timings"] if t.get("skipped")]
+        self.assertEqual(skipped, ["Gaps"])
+
+    def test_loop_is_bounded(self):
+        policy = RoutingPolicy(max_iterations=3)
+        state = self._run(self._specs(route=policy.next_after))
+        self.assertEqual(state["iteration_count"], 3)
+        self.assertEqual(state["progress_log"].count("synthesis"), 3)
+        self.assertEqual(policy.next_after({"iteration_count": 1, "plan": {"done": True}}), END)
+
+    def test_route_only_on_sinks(self):
+        specs = self._specs()
+        specs[1].route = lambda state: END
+        with self.assertRaises(ValueError):
+            build_dependency_graph(AppState, specs)
+
+    def test_supervisor_skips_search_when_corpus_answers(self):
+        pm = PromptManager("src/prompts/templates")
+        llm = FakeListChatModel(responses=['{"directive": "use the corpus", "skip": [], "done": false}'])
+        policy = RoutingPolicy(corpus_threshold=0.8)
+        with patch("src.agents.agent_nodes.initialize_llm", return_value=llm):
+            node = supervisor_node(pm, policy=policy, corpus=StubCorpus(0.93))
+        update = node.invoke({"research_question": "q", "artifacts": {"to_analyze": "x"}})["update"]
+        self.assertEqual(update["supervisor_directives"], ["use the corpus"])
+        self.assertEqual(update["plan"]["skip"], ["LiteratureSearch"])
+        self.assertEqual(update["iteration_count"], 1)
+        self.assertEqual(update["artifacts"]["corpus_hits"][0]["title"], "Corpus Paper")
+
+        with patch("src.agents.agent_nodes.initialize_llm", return_value=llm):
+            node = supervisor_node(pm, policy=policy, corpus=StubCorpus(0.4))
+        update = node.invoke({"research_question": "q", "artifacts": {"to_analyze": "x"}})["update"]
+        self.assertEqual(update["plan"]["skip"], [])
+        self.assertNotIn("artifacts", update)
+
+class SlowChatModel(FakeListChatModel):
+    """Counts calls and takes ``delay`` seconds to answer."""
+    delay: float = 0.05
+    calls: int = 0
+
+    async def ainvoke(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return await super().ainvoke(*args, **kwargs)
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def test_normalization(self):
+        self.assertEqual(normalize_text("  Sparse   Attention? "), "sparse attention")
+        self.assertEqual(normalize_request({"q": "A  b.", "k": [1, "X"]}), normalize_request({"k": [1, "x"], "q": "a b"}))
+
+    def test_threads_share_one_call(self):
+        from concurrent.futures import ThreadPoolExecutor
+        flights, calls = SingleFlight("test"), []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda _: flights.do("k", work), range(4)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r for r, _ in results], ["result"] * 4)
+        self.assertEqual(sum(leader for _, leader in results), 1)
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    async def test_followers_share_leader_failure(self):
+        flights = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("provider down")
+
+        results = await asyncio.gather(*(flights.ado("k", fail) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(flights.stats(), {"leaders": 1, "followers": 2, "in_flight": 0})
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flights, calls = SingleFlight("test"), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flights.ado("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.ado("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        self.assertEqual(await follower, ("result", False))
+        self.assertEqual(len(calls), 1)
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+    async def test_work_cancelled_when_every_caller_leaves(self):
+        flights, finished = SingleFlight("test"), []
+
+        async def work():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+
+        callers = [asyncio.create_task(flights.ado("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.sleep(0.08)
+        self.assertEqual(finished, [])
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+    async def test_identical_llm_calls_are_coalesced(self):
+        llm = SlowChatModel(responses=["shared answer"] * 3)
+        results = await asyncio.gather(*(_ainvoke_and_route("summarizer", llm, "same prompt") for _ in range(3)))
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual({r["update"]["artifacts"]["summary"] for r in results}, {"shared answer"})
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "artifacts.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_small_values_stay_inline_and_large_ones_are_stored_once(self):
+        store = ArtifactStore(inline_limit=256)
+        self.assertEqual(store.put("short"), "short")
+        self.assertEqual(store.put(5), 5)
+        text = "sparse attention " * 100
+        ref = store.put(text)
+        self.assertTrue(is_ref(ref))
+        self.assertEqual(store.put(text), ref)
+        self.assertEqual(store.put(ref), ref)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(ref), text)
+        self.assertEqual(store.stats()["deduplicated"], 1)
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        store = ArtifactStore(inline_limit=256, compress=False, cache_entries=0, max_memory_bytes=2500)
+        a, b, c = (store.put(f"{word} " * 200) for word in ("alpha", "beta", "gamma"))
+        with self.assertRaises(KeyError):
+            store.get(a)
+        store.get(b)
+        store.put("delta " * 200)
+        self.assertEqual(store.get(b), "beta " * 200)
+        with self.assertRaises(KeyError):
+            store.get(c)
+        self.assertEqual(store.stats()["evicted"], 2)
+        self.assertLessEqual(store.stats()["bytes_in_memory"], 2500)
+
+    def test_memory_backend_applies_ttl(self):
+        store = ArtifactStore(inline_limit=256, cache_entries=0, ttl_seconds=0.05)
+        old = store.put("old " * 200)
+        time.sleep(0.1)
+        new = store.put("new " * 200)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(new), "new " * 200)
+        with self.assertRaises(KeyError):
+            store.get(old)
+
+    def test_sqlite_backend_persists_compressed_blobs(self):
+        records = [{"title": f"Paper {i}", "abstract": "dense retrieval " * 50} for i in range(20)]
+        store = ArtifactStore(self.db_path, inline_limit=256)
+        ref = store.put(records)
+        store.close()
+        self.assertLess(store.stats()["bytes_stored"], ref["size"] / 5)
+
+        reopened = ArtifactStore(self.db_path, inline_limit=256)
+        self.assertEqual(reopened.get(ref), records)
+        with self.assertRaises(KeyError):
+            reopened.get("0" * 32)
+        reopened.close()
+
+    def test_view_and_resolve(self):
+        store = ArtifactStore(inline_limit=64)
+        docs = [Document(page_content="x" * 200, metadata={"title": "A"})]
+        update = store.offload_update({"artifacts": {"documents": docs, "k": 5}, "progress_log": ["done"]})
+        self.assertTrue(is_ref(update["artifacts"]["documents"]))
+        self.assertEqual(update["progress_log"], ["done"])
+
+        state = store.view({"topic": "t", "artifacts": update["artifacts"]})
+        self.assertIsInstance(state["artifacts"], ArtifactView)
+        self.assertEqual(state["artifacts"].get("documents"), docs)
+        self.assertIsNone(state["artifacts"].get("missing"))
+        self.assertEqual(store.resolve(state)["artifacts"], {"documents": docs, "k": 5})
+
+    def test_graph_state_holds_references(self):
+        store = ArtifactStore(inline_limit=256)
+        seen = {}
+
+        def writer(state):
+            seen["input"] = state["artifacts"]["to_summarize"]
+            return {"artifacts": {"synthesis": "finding " * 200}}
+
+        graph = build_dependency_graph(
+            AppState, [NodeSpec("Writer", writer, reads=("artifacts.to_summarize",), writes=("artifacts.synthesis",))],
+            artifact_store=store,
+        ).compile(checkpointer=MemorySaver())
+        big_input = "input text " * 100
+        state = graph.invoke({"artifacts": {"to_summarize": big_input, "k": 3}}, {"configurable": {"thread_id": "a"}})
+        self.assertEqual(seen["input"], big_input)
+        self.assertTrue(is_ref(state["artifacts"]["to_summarize"]))
+        self.assertTrue(is_ref(state["artifacts"]["synthesis"]))
+        self.assertEqual(state["artifacts"]["k"], 3)
+        resolved = store.resolve(state)["artifacts"]
+        self.assertEqual(resolved["synthesis"], "finding " * 200)
+        self.assertEqual(resolved["to_summarize"], big_input)
+
+
+class TestCompactState(unittest.TestCase):
+
+    def test_ring_buffer_keeps_newest_entries(self):
+        reduce = ring_buffer(3)
+        self.assertEqual(reduce(["a", "b"], ["c", "d"]), ["b", "c", "d"])
+        self.assertEqual(reduce(None, ["a"]), ["a"])
+
+    def test_logs_are_bounded_in_the_graph(self):
+        from src.orchestration.state import LOG_LIMITS
+        graph = _logging_graph(MemorySaver())
+        config = {"configurable": {"thread_id": "ring"}}
+        for _ in range(LOG_LIMITS["progress_log"] + 5):
+            state = graph.invoke({}, config)
+        self.assertEqual(len(state["progress_log"]), LOG_LIMITS["progress_log"])
+        self.assertEqual(state["progress_log"][-1], "step")
+
+    def test_dynamic_block_renders_latest_state(self):
+        state = {"research_question": "Q?", "inclusion_criteria": ["peer reviewed"],
+                 "progress_log": ["one", "two", "three", "four"], "iteration_count": 2}
+        block = format_dynamic_block(state)
+        self.assertEqual(block, "Research question: Q?\nInclusion: peer reviewed\n"
+                                "Last 3 progress lines:\ntwo\nthree\nfour\n"
+                                "Supervisor directives:\n\nIteration #2")
+        state["progress_log"].append("five")
+        self.assertIn("three\nfour\nfive", format_dynamic_block(state))
+        self.assertEqual(format_dynamic_block({}).splitlines()[0], "Research question: —")
+
+
+class StubSource:
+    name = "stub"
+    timeout = 1.0
+
+    def search(self, query, k):
+        return [{"title": "Stub Paper", "abstract": "About " + query, "source": self.name}]
+
+class TestLiteratureSearchNode(unittest.TestCase):
+
+    def test_node_uses_multi_source_results(self):
+        pm = MagicMock()
+        pm.build.return_value = "prompt"
+        llm = FakeListChatModel(responses=["summary"])
+        with patch("src.agents.agent_nodes.initialize_llm", return_value=llm):
+            node = literature_search_node(pm, searcher=MultiSourceSearch([StubSource()], max_variants=1))
+        update = node.invoke({"research_question": "sparse attention"})["update"]
+        self.assertEqual(update["artifacts"]["literature_summary"], "summary")
+        self.assertEqual(update["artifacts"]["literature_results"][0]["title"], "Stub Paper")
+        self.assertEqual(update["artifacts"]["literature_search_report"]["completed"], ["stub:sparse attention"])
+        self.assertIn("Stub Paper", pm.build.call_args.kwargs["content"])
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.pricing = dict(METRICS.pricing)
+        configure_pricing({"FakeList": {"input": 1.0, "output": 2.0}})
+
+    def tearDown(self):
+        configure_pricing(self.pricing)
+
+    def _graph(self):
+        pm = MagicMock()
+        pm.build.return_value = "what is new in sparse attention"
+        llm = FakeListChatModel(responses=["a short summary"])
+        cache = LLMResponseCache([MemoryLRUTier()])
+        with patch("src.agents.agent_nodes.initialize_llm", return_value=llm):
+            node = literature_search_node(
+                pm, cache=cache, searcher=MultiSourceSearch([StubSource()], max_variants=1),
+            )
+        specs = [NodeSpec("LiteratureSearch", node, writes=("artifacts.literature_summary",))]
+        return build_dependency_graph(AppState, specs).compile(checkpointer=MemorySaver())
+
+    def test_trace_records_llm_and_tool_spans(self):
+        graph = self._graph()
+        config = {"configurable": {"thread_id": "t"}}
+        # Streaming messages makes the chat model stream, so time to first token is known.
+        list(graph.stream({"research_question": "sparse attention"}, config, stream_mode="messages"))
+        graph.invoke({"research_question": "sparse attention"}, config)   # answered by the cache
+        trace = graph.get_state(config).values["trace"]
+
+        llm_spans = [span for span in trace if span["kind"] == "llm"]
+        self.assertEqual([span["cached"] for span in llm_spans], [False, True])
+        first = llm_spans[0]
+        self.assertEqual(first["node"], "LiteratureSearch")
+        self.assertEqual(first["completion_tokens"], count_tokens("a short summary"))
+        self.assertIsNotNone(first["first_token_seconds"])
+        self.assertAlmostEqual(first["cost_usd"], (first["prompt_tokens"] + 2 * first["completion_tokens"]) / 1e6)
+        tools = [span for span in trace if span["kind"] == "tool"]
+        self.assertEqual([(t["tool"], t["status"], t["results"]) for t in tools], [("search.stub", "ok", 1)] * 2)
+
+        summary = trace_summary(graph.get_state(config).values)["nodes"]["LiteratureSearch"]
+        self.assertEqual((summary["llm_calls"], summary["cache_hits"], summary["tool_calls"]), (2, 1, 2))
+        self.assertGreater(summary["seconds"], 0)
+
+    def test_prometheus_rendering(self):
+        self.test_trace_records_llm_and_tool_spans()
+        text = METRICS.render(gauges={"pool_running": 2}, counters={"pool_rejected_total": 1})
+        self.assertIn('polyscholar_llm_cache_requests_total{node="LiteratureSearch",result="hit"}', text)
+        self.assertIn('polyscholar_node_duration_seconds_count{node="LiteratureSearch",status="ok"}', text)
+        self.assertIn('polyscholar_tool_duration_seconds_bucket{tool="search.stub",status="ok",le="+Inf"}', text)
+        self.assertIn("# TYPE polyscholar_llm_time_to_first_token_seconds histogram", text)
+        self.assertIn("polyscholar_pool_running 2", text)
+        self.assertIn("# TYPE polyscholar_pool_rejected_total counter", text)
+
+class RecordingChatModel(FakeListChatModel):
+    prompts: list = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+class TestMapReduceSummarizer(unittest.TestCase):
+
+    def setUp(self):
+        self.pm = PromptManager(os.path.join(os.path.dirname(__file__), "../src/prompts/templates"))
+        self.budget = TokenBudget(max_input_tokens=600, chunk_tokens=400, max_concurrency=4)
+        self.text = "\n\n".join(f"Paper {i}: " + "finding " * 120 for i in range(10))
+
+    def test_small_content_is_untouched(self):
+        llm = RecordingChatModel(responses=["s"], prompts=[])
+        reducer = MapReduceSummarizer(llm, self.pm, self.budget)
+        self.assertEqual(reducer.reduce_to("short text", 100), "short text")
+        self.assertEqual(llm.prompts, [])
+
+    def test_chunks_are_summarized_within_budget(self):
+        llm = RecordingChatModel(responses=["chunk summary"], prompts=[])
+        reducer = MapReduceSummarizer(llm, self.pm, self.budget)
+        out = reducer.reduce_to(self.text, 200)
+        self.assertLessEqual(count_tokens(out), 200)
+        self.assertEqual(len(llm.prompts), 10)
+        self.assertTrue(all(count_tokens(p) <= self.budget.max_input_tokens for p in llm.prompts))
+        self.assertIn("Paper 3", llm.prompts[3])
+
+    def test_hierarchical_reduce_and_cache(self):
+        llm = RecordingChatModel(responses=["summary " * 60], prompts=[])
+        cache = LLMResponseCache([MemoryLRUTier()])
+        reducer = MapReduceSummarizer(llm, self.pm, self.budget, cache=cache)
+        out = asyncio.run(reducer.areduce_to(self.text, 100))
+        self.assertLessEqual(count_tokens(out), 100)
+        first_run = len(llm.prompts)
+        self.assertGreater(first_run, 10)   # a second level was needed
+        asyncio.run(reducer.areduce_to(self.text, 100))
+        self.assertEqual(len(llm.prompts), first_run)
+
+# Modules the default graph must not import until a node actually needs them.
+DEFERRED_MODULES = ("langchain_openai", "langchain_google_genai", "langchain_community", "faiss", "arxiv", "numpy")
+IMPORT_BUDGET_SECONDS = 1.5
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _python(code, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, timeout=120,
+    )
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_time_budget(self):
+        proc = _python("import src.orchestration.graph_builder", "-X", "importtime")
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        cumulative = {}
+        for line in proc.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+                _, total, name = line.split("|")
+                cumulative[name.strip()] = int(total)
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, cumulative)
+        self.assertLess(cumulative["src.orchestration.graph_builder"] / 1e6, IMPORT_BUDGET_SECONDS)
+
+    def test_build_graph_creates_no_clients(self):
+        proc = _python(
+            "import sys\n"
+            "from src.orchestration.config import load_config\n"
+            "from src.orchestration.graph_builder import build_graph\n"
+            "cfg = load_config()\n"
+            # In-memory backends only, so the run leaves nothing under data/.
+            "cfg.update(model_name='gpt-4o-mini', checkpointer={'backend': 'memory'},\n"
+            "           llm_cache={'enabled': False}, artifact_store={'backend': 'memory'})\n"
+            "research = build_graph(cfg)\n"
+            "assert research.models.stats()['clients'] == 0\n"
+            f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])\n"
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip(), "[]")
+
+    def test_vector_index_opens_store_on_first_use(self):
+        node = vector_index_node(dimension=8)
+        node.close()   # nothing opened, nothing to flush
+        self.assertIsNone(node._faiss_tool)
+        with patch("src.tools.embedding_service.shared_embedding_service"), \
+                patch("src.tools.faiss_tool.FAISSTool") as tool_cls:
+            tool_cls.return_value.similarity_search.return_value = ["doc"]
+            result = node({"artifacts": {"query_text": "q"}})
+        self.assertEqual(result["update"]["artifacts"]["vector_index_result"], ["doc"])
+        self.assertEqual(tool_cls.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
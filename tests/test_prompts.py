@@ -1,6 +1,10 @@
 import unittest
-from src.prompts.prompt_manager import PromptManager
+from src.prompts.prompt_manager import PromptManager, PromptTemplateError
+from src.prompts.token_budget import PromptBudgetExceeded, count_tokens, split_into_chunks
 import os
+import shutil
+import tempfile
+import time
 
 class TestPromptManager(unittest.TestCase):
     def setUp(self):
@@ -31,5 +35,66 @@ class TestPromptManager(unittest.TestCase):
         self.assertIn('description', gap['template'])
         self.assertIn('fields', gap['template'])
 
+    def test_build_truncates_content_to_budget(self):
+        content = "word " * 2000
+        prompt = self.manager.build('summary_prompt', content=content, token_budget=300)
+        self.assertLessEqual(count_tokens(prompt), 300)
+        self.assertIn('Provide a concise summary', prompt)
+        self.assertEqual(self.manager.build('summary_prompt', content="short", token_budget=300),
+                         self.manager.build('summary_prompt', content="short"))
+
+    def test_build_rejects_budget_below_fixed_text(self):
+        with self.assertRaises(PromptBudgetExceeded):
+            self.manager.build('summary_prompt', content="text", token_budget=5)
+
+    def test_available_tokens(self):
+        room = self.manager.available_tokens('summary_prompt', token_budget=300)
+        fixed = count_tokens(self.manager.build('summary_prompt', content=""))
+        self.assertEqual(room, 300 - fixed)
+
+    def test_split_into_chunks(self):
+        text = "\n\n".join("paragraph %d " % i + "x" * 300 for i in range(20))
+        chunks = split_into_chunks(text, 200)
+        self.assertTrue(all(count_tokens(c) <= 200 for c in chunks))
+        self.assertEqual("".join(chunks).count("paragraph"), 20)
+        long_line = split_into_chunks("y" * 5000, 100)
+        self.assertEqual("".join(long_line), "y" * 5000)
+
+    def test_role_prompts_share_static_prefix(self):
+        first = self.manager.build(role='synthesizer_writer', dynamic_state="state A", content="one")
+        second = self.manager.build(role='synthesizer_writer', dynamic_state="state B", content="two",
+                                    gaps="none found")
+        prefix = self.manager.static_prefix(role='synthesizer_writer')
+        self.assertTrue(first.startswith(prefix) and second.startswith(prefix))
+        self.assertIn('PolyScholar Mission', prefix)
+        self.assertIn('Role: Synthesizer/Writer', prefix)
+        self.assertIn('none found', second)
+
+    def test_validation(self):
+        with self.assertRaises(PromptTemplateError):
+            self.manager.build(role='expert_supervisor')
+        with self.assertRaises(PromptTemplateError):
+            self.manager.build('gap_prompt', research_topic="q")
+        with self.assertRaises(PromptTemplateError):
+            self.manager.build(role='no_such_role', dynamic_state="")
+        self.manager.validate(role='search_specialist', fields=("dynamic_state", "content"))
+        with self.assertRaises(PromptTemplateError):
+            self.manager.validate(role='search_specialist', fields=("dynamic_state", "contnet"))
+
+    def test_hot_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copytree(self.template_dir, tmp, dirs_exist_ok=True)
+            manager = PromptManager(tmp, reload_interval=0)
+            path = os.path.join(tmp, 'summary_prompt.json')
+            with open(path, 'w') as f:
+                f.write('{"template": "Briefly: {content}"}')
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            self.assertEqual(manager.build('summary_prompt', content="x"), "Briefly: x")
+            # An invalid edit is rejected and the last good version stays live.
+            with open(path, 'w') as f:
+                f.write('{"template": "Broken {content!r}"}')
+            os.utime(path, ns=(time.time_ns(), time.time_ns() + 2 * 10**9))
+            self.assertEqual(manager.build('summary_prompt', content="x"), "Briefly: x")
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,61 @@
+import os
+import tempfile
+import threading
+import zlib
 import unittest
 from unittest.mock import patch, MagicMock
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from src.tools.tavily_tool import TavilyTool
-from src.tools.arxiv_tool import ArxivTool
+from src.tools.arxiv_tool import ArxivPaper, ArxivTool
 from src.tools.faiss_tool import FAISSTool
+from src.tools.faiss_index import IndexSpec, recall_latency_report, unwrap_ids
+from src.tools.embedding_service import EmbeddingCache, EmbeddingService, shared_embedding_service
+from src.tools.bm25_index import BM25Index, tokenize
+from src.tools.hybrid_search import HybridRetriever
+from src.tools.metadata_index import MetadataIndex, filter_fields
+from src.tools.sharded_faiss import ShardedFAISSTool, shard_of
+from src.tools.ingestion import IngestionPipeline, iter_files
+from src.tools.multi_source_search import (
+    ArxivSource,
+    FAISSSource,
+    MultiSourceSearch,
+    fuse_results,
+    normalize_arxiv_id,
+    query_variants,
+)
+import json
+import pickle
+import time
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 
 class DummyEmbeddings:
     def embed_query(self, text):
         # Return a fixed-size dummy vector
         return [0.1] * 10
 
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings that count how often they are called."""
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = 0
+        self.texts = []
+
+    def _vec(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return rng.standard_normal(self.dim).tolist()
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self._vec(text)
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts.extend(texts)
+        return [self._vec(t) for t in texts]
+
 class TestTools(unittest.TestCase):
 
     @patch('src.tools.tavily_tool.TavilySearch')
@@ -22,7 +69,7 @@ class TestTools(unittest.TestCase):
         self.assertGreater(len(results), 0)
         self.assertIn('title', results[0])
 
-    @patch('src.tools.arxiv_tool.ArxivAPIWrapper')
+    @patch('langchain_community.utilities.arxiv.ArxivAPIWrapper')
     def test_arxiv_tool(self, MockArxivAPIWrapper):
         # Mock ArxivAPIWrapper.run to return a dummy string
         mock_instance = MockArxivAPIWrapper.return_value
@@ -46,5 +93,732 @@ class TestTools(unittest.TestCase):
         results = tool.similarity_search("test query")
         self.assertIsInstance(results, list)
 
+class TestPersistentFAISSTool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "vector")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot_and_warm_start(self):
+        embeddings = HashEmbeddings()
+        tool = FAISSTool(embeddings, persist_path=self.path, dimension=8, snapshot_every=2)
+        self.assertEqual(embeddings.calls, 0)
+        tool.add_documents([Document(page_content="alpha"), Document(page_content="beta")],
+                           ids=["a", "b"])
+        tool.add_documents([Document(page_content="gamma")], ids=["c"])
+        tool.close()
+
+        restarted = HashEmbeddings()
+        warm = FAISSTool(restarted, persist_path=self.path, snapshot_every=2)
+        self.assertEqual(restarted.calls, 0)
+        self.assertEqual(warm.dimension, 8)
+        self.assertEqual(warm.vector_store.index.ntotal, 3)
+        results = warm.similarity_search("beta", k=1)
+        self.assertEqual(results[0].page_content, "beta")
+
+        warm.add_documents([Document(page_content="delta")], ids=["d"])
+        warm.close()
+        again = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(again.vector_store.index.ntotal, 4)
+        snapshots = os.listdir(os.path.join(self.path, "snapshots"))
+        self.assertLessEqual(len(snapshots), 2)
+
+    def test_replays_log_after_unclean_stop(self):
+        docs = [Document(page_content=f"note {i}", metadata={"i": i}) for i in range(30)]
+        tool = FAISSTool(HashEmbeddings(), persist_path=self.path, dimension=8)
+        tool.add_documents(docs[:20], ids=[f"n{i}" for i in range(20)])
+        tool.snapshot()
+        tool.add_documents(docs[20:], ids=[f"n{i}" for i in range(20, 30)])
+        tool.delete(["n3", "n25"])
+        # No close(): the ten adds and two deletes after the snapshot exist only in the log.
+        snapshot = os.path.join(self.path, "snapshots", os.listdir(os.path.join(self.path, "snapshots"))[0])
+        self.assertNotIn("index.pkl", os.listdir(snapshot))
+
+        warm = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(warm.vector_store.index.ntotal, 20)      # the mapped snapshot
+        self.assertEqual(len(warm.index_to_docstore_id), 28)
+        self.assertEqual(warm.similarity_search("note 27", k=1)[0].page_content, "note 27")
+        self.assertNotIn("note 3", [d.page_content for d in warm.similarity_search("note 3", k=5)])
+        self.assertEqual(warm.filter_ids({"i": {"$in": [3, 4, 25, 26]}}), {"n4", "n26"})
+        self.assertEqual(warm.keyword_index.search("25", k=1), [])
+        warm.delete(["n4"])
+        warm.add_documents([Document(page_content="note 30")], ids=["n30"])
+        warm.close()
+
+        again = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(again.vector_store.index.ntotal, 28)
+        self.assertFalse(again.contains("n4"))
+        self.assertEqual(again.similarity_search("note 30", k=1)[0].page_content, "note 30")
+
+    def test_compacts_in_background(self):
+        release = threading.Event()
+        real_write = FAISSTool._write_snapshot
+
+        def slow_write(tool, index, job):
+            release.wait(30)
+            return real_write(tool, index, job)
+
+        docs = [Document(page_content=f"note {i}") for i in range(12)]
+        tool = FAISSTool(HashEmbeddings(), persist_path=self.path, dimension=8, snapshot_every=5)
+        with patch.object(FAISSTool, "_write_snapshot", slow_write):
+            tool.add_documents(docs[:5], ids=[f"n{i}" for i in range(5)])   # starts a compaction
+            # The snapshot is still being written: reads and writes do not wait for it.
+            self.assertEqual(tool.similarity_search("note 2", k=1)[0].page_content, "note 2")
+            tool.add_documents(docs[5:], ids=[f"n{i}" for i in range(5, 12)])
+            tool.delete(["n1", "n6"])
+            self.assertEqual(len(tool.similarity_search("note", k=20)), 10)
+            release.set()
+            self.assertTrue(tool.wait_for_migration(timeout=30))
+        self.assertEqual(tool.vector_store.index.ntotal, 5)
+        self.assertEqual(len(tool.similarity_search("note", k=20)), 10)
+        self.assertNotIn("note 1", [d.page_content for d in tool.similarity_search("note 1", k=3)])
+        tool.close()
+        reopened = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(reopened.vector_store.index.ntotal, 10)
+
+    def test_imports_pickled_docstore_snapshot(self):
+        snapshot = os.path.join(self.path, "snapshots", "00000000000000000001")
+        os.makedirs(snapshot)
+        embeddings = HashEmbeddings()
+        texts = ["alpha", "beta", "gamma"]
+        index = faiss.IndexFlatL2(8)
+        index.add(np.array(embeddings.embed_documents(texts), dtype=np.float32))
+        faiss.write_index(index, os.path.join(snapshot, "index.faiss"))
+        docstore = InMemoryDocstore({f"t{i}": Document(page_content=text) for i, text in enumerate(texts)})
+        with open(os.path.join(snapshot, "index.pkl"), "wb") as f:
+            pickle.dump((docstore, {i: f"t{i}" for i in range(3)}), f)
+        with open(os.path.join(snapshot, "meta.json"), "w") as f:
+            json.dump({"dimension": 8, "ntotal": 3}, f)
+        with open(os.path.join(self.path, "CURRENT"), "w") as f:
+            f.write("00000000000000000001")
+
+        tool = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(tool.similarity_search("beta", k=1)[0].page_content, "beta")
+        tool.delete(["t0"])
+        tool.add_documents([Document(page_content="delta")], ids=["t3"])
+        self.assertEqual(sorted(tool.index_to_docstore_id), [1, 2, 3])
+        tool.close()
+        reopened = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(sorted(d.page_content for d in reopened.similarity_search("alpha", k=5)),
+                         ["beta", "delta", "gamma"])
+
+    def test_no_snapshot_without_changes(self):
+        tool = FAISSTool(HashEmbeddings(), persist_path=self.path, dimension=8)
+        tool.close()
+        self.assertFalse(os.path.exists(os.path.join(self.path, "CURRENT")))
+
+class TestFAISSIndexTypes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _docs(self, n, offset=0):
+        return [Document(page_content=f"doc {i}") for i in range(offset, offset + n)]
+
+    def test_factory_strings(self):
+        self.assertEqual(IndexSpec(type="ivf_flat", nlist=8).factory_string(16), "IVF8,Flat")
+        self.assertEqual(IndexSpec(type="ivf_pq", nlist=8, pq_m=4, opq=True).factory_string(16),
+                         "OPQ4,IVF8,PQ4x8")
+        self.assertEqual(IndexSpec(type="hnsw", scalar_quantizer="SQ8").factory_string(16), "HNSW32_SQ8")
+        with self.assertRaises(ValueError):
+            IndexSpec(type="ivf_pq", pq_m=5).factory_string(16)
+        with self.assertRaises(ValueError):
+            IndexSpec.from_config({"type": "annoy"})
+
+    def test_migrates_from_flat_at_threshold(self):
+        spec = {"type": "ivf_flat", "nlist": 4, "nprobe": 4, "migrate_threshold": 300}
+        tool = FAISSTool(HashEmbeddings(), dimension=8, index_spec=spec)
+        tool.add_documents(self._docs(200))
+        self.assertEqual(type(unwrap_ids(tool.vector_store.index)).__name__, "IndexFlatL2")
+        tool.add_documents(self._docs(200, offset=200))
+        self.assertTrue(tool.wait_for_migration(timeout=60))
+        self.assertEqual(type(unwrap_ids(tool.vector_store.index)).__name__, "IndexIVFFlat")
+        self.assertEqual(tool.vector_store.index.ntotal, 400)
+        self.assertEqual(tool.vector_store.index.nprobe, 4)
+        self.assertEqual(tool.similarity_search("doc 123", k=1)[0].page_content, "doc 123")
+        tool.tune(nprobe=2)
+        self.assertEqual(tool.vector_store.index.nprobe, 2)
+
+    def test_mmapped_ivf_snapshot_accepts_appends(self):
+        path = os.path.join(self.tmp.name, "vector")
+        spec = {"type": "ivf_flat", "nlist": 4, "migrate_threshold": 300}
+        tool = FAISSTool(HashEmbeddings(), persist_path=path, dimension=8, index_spec=spec)
+        tool.add_documents(self._docs(300))
+        tool.close()
+        reopened = FAISSTool(HashEmbeddings(), persist_path=path, index_spec=spec)
+        reopened.add_documents(self._docs(5, offset=300))
+        self.assertEqual(len(reopened.index_to_docstore_id), 305)
+        self.assertEqual(reopened.similarity_search("doc 302", k=1)[0].page_content, "doc 302")
+        reopened.close()
+        compacted = FAISSTool(HashEmbeddings(), persist_path=path, index_spec=spec)
+        self.assertEqual(type(unwrap_ids(compacted.vector_store.index)).__name__, "IndexIVFFlat")
+        self.assertEqual(compacted.vector_store.index.ntotal, 305)
+
+    def test_hnsw_needs_no_migration(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8, index_spec={"type": "hnsw", "ef_search": 32})
+        self.assertEqual(type(unwrap_ids(tool.vector_store.index)).__name__, "IndexHNSWFlat")
+        tool.add_documents(self._docs(20), ids=[f"d{i}" for i in range(20)])
+        self.assertEqual(unwrap_ids(tool.vector_store.index).hnsw.efSearch, 32)
+        with self.assertRaises(NotImplementedError):
+            tool.delete(["d0"])
+        self.assertTrue(tool.contains("d0"))
+
+    def test_writes_during_background_migration(self):
+        from src.tools import faiss_tool
+        release = threading.Event()
+        real_build = faiss_tool.build_trained_index
+
+        def slow_build(*args, **kwargs):
+            release.wait(30)
+            return real_build(*args, **kwargs)
+
+        spec = {"type": "ivf_flat", "nlist": 4, "nprobe": 4, "migrate_threshold": 200}
+        tool = FAISSTool(HashEmbeddings(), dimension=8, index_spec=spec)
+        with patch.object(faiss_tool, "build_trained_index", slow_build):
+            tool.add_documents(self._docs(200), ids=[f"d{i}" for i in range(200)])
+            # Training is blocked: searches and writes still go to the flat index.
+            self.assertEqual(tool.similarity_search("doc 5", k=1)[0].page_content, "doc 5")
+            tool.add_documents(self._docs(20, offset=200), ids=[f"d{i}" for i in range(200, 220)])
+            tool.delete(["d3", "d210"])
+            self.assertFalse(tool.wait_for_migration(timeout=0.1))
+            release.set()
+            self.assertTrue(tool.wait_for_migration(timeout=60))
+        self.assertEqual(type(unwrap_ids(tool.vector_store.index)).__name__, "IndexIVFFlat")
+        self.assertEqual(tool.vector_store.index.ntotal, 218)
+        self.assertEqual(tool.similarity_search("doc 215", k=1)[0].page_content, "doc 215")
+        self.assertNotIn("doc 3", [doc.page_content for doc in tool.similarity_search("doc 3", k=5)])
+
+    def test_delete_after_migration(self):
+        spec = {"type": "ivf_flat", "nlist": 4, "nprobe": 4, "migrate_threshold": 200}
+        tool = FAISSTool(HashEmbeddings(), dimension=8, index_spec=spec)
+        docs = [Document(page_content=f"doc {i}", metadata={"i": i}) for i in range(300)]
+        tool.add_documents(docs, ids=[f"d{i}" for i in range(300)])
+        self.assertTrue(tool.wait_for_migration(timeout=60))
+        self.assertEqual(type(unwrap_ids(tool.vector_store.index)).__name__, "IndexIVFFlat")
+        tool.delete([f"d{i}" for i in range(50)])
+        self.assertEqual(tool.vector_store.index.ntotal, 250)
+        self.assertEqual(tool.similarity_search("doc 123", k=3)[0].page_content, "doc 123")
+        self.assertFalse(any(doc.metadata["i"] < 50 for doc, _ in tool.similarity_search_with_score("doc 7", k=3)))
+        [(doc, score)] = tool.similarity_search_with_score("doc 200", k=1, filter={"i": 200})
+        self.assertEqual(doc.page_content, "doc 200")
+        self.assertAlmostEqual(score, 0.0, places=4)
+        with self.assertRaises(ValueError):
+            tool.delete(["d0"])
+        # Ids are never reused, so new documents cannot collide with remaining ones.
+        tool.add_documents([Document(page_content="doc new", metadata={"i": 300})], ids=["new"])
+        self.assertEqual(tool.similarity_search("doc new", k=1, filter={"i": 300})[0].page_content, "doc new")
+        self.assertEqual(tool.similarity_search("doc 299", k=1)[0].page_content, "doc 299")
+
+    def test_recall_latency_report(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((1000, 16), dtype=np.float32)
+        specs = [IndexSpec(type="flat"), IndexSpec(type="ivf_flat", nlist=8)]
+        rows = recall_latency_report(vectors, vectors[:20], specs, k=5,
+                                     sweeps={"ivf_flat": [{"nprobe": 1}, {"nprobe": 8}]})
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["recall@5"], 1.0)
+        self.assertEqual(rows[2]["recall@5"], 1.0)
+        self.assertLessEqual(rows[1]["recall@5"], rows[2]["recall@5"])
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dedup_within_and_across_calls(self):
+        provider = HashEmbeddings()
+        service = EmbeddingService(provider, model_name="fake", batch_size=2)
+        first = service.embed_documents(["a", "b", "a", "c"])
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(sorted(provider.texts), ["a", "b", "c"])
+        self.assertEqual(provider.calls, 2)
+        service.embed_documents(["c", "b"])
+        service.embed_query("a")
+        self.assertEqual(provider.calls, 2)
+        stats = service.stats()
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["hits"], 4)
+
+    def test_disk_cache_survives_restart(self):
+        provider = HashEmbeddings()
+        service = EmbeddingService(provider, model_name="fake/model", cache_dir=self.tmp.name)
+        vectors = service.embed_documents(["x", "y"])
+        restarted = HashEmbeddings()
+        again = EmbeddingService(restarted, model_name="fake/model", cache_dir=self.tmp.name)
+        self.assertEqual(again.embed_documents(["y", "x"]), [vectors[1], vectors[0]])
+        self.assertEqual(restarted.calls, 0)
+        again.embed_documents(["z"])
+        self.assertEqual(restarted.texts, ["z"])
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp.name, "fake_model")))
+
+    def test_disk_cache_rows_after_crash_and_across_processes(self):
+        path = os.path.join(self.tmp.name, "model")
+        first = EmbeddingCache(path, dtype="float32")
+        vec = lambda value: np.full(4, value, dtype=np.float32)
+        first.put_many({"a": vec(1), "b": vec(2)})
+        # A crash between the appends: an unkeyed vector row and a torn key line.
+        with open(os.path.join(path, "vectors.bin"), "ab") as f:
+            f.write(vec(9).tobytes())
+        with open(os.path.join(path, "keys.txt"), "a") as f:
+            f.write("c")
+
+        second = EmbeddingCache(path, dtype="float32")     # e.g. an ingestion run next to the server
+        self.assertEqual(len(second), 2)
+        second.put_many({"c": vec(3)})
+        first.put_many({"d": vec(4), "c": vec(7)})           # "c" is picked up from the other writer
+        self.assertEqual({k: v[0] for k, v in first.get_many(["a", "b", "c", "d"]).items()},
+                         {"a": 1, "b": 2, "c": 3, "d": 4})
+        self.assertEqual(second.get_many(["d"])["d"][0], 4)
+        reloaded = EmbeddingCache(path)
+        self.assertEqual({k: v[0] for k, v in reloaded.get_many(["a", "b", "c", "d"]).items()},
+                         {"a": 1, "b": 2, "c": 3, "d": 4})
+        self.assertEqual(os.path.getsize(os.path.join(path, "vectors.bin")), 4 * 4 * 4)
+
+    def test_shared_service_per_provider_override(self):
+        cfg = {"dir": self.tmp.name}
+        custom = HashEmbeddings()
+        service = shared_embedding_service("fake-shared", cfg, embeddings=custom)
+        self.assertIs(shared_embedding_service("fake-shared", cfg, embeddings=custom), service)
+        other = shared_embedding_service("fake-shared", cfg, embeddings=HashEmbeddings())
+        self.assertIsNot(other, service)
+        self.assertIs(service.embeddings, custom)
+
+    def test_faiss_tool_routes_through_service(self):
+        provider = HashEmbeddings()
+        service = EmbeddingService(provider, model_name="fake")
+        tool = FAISSTool(service, dimension=8)
+        tool.add_documents([Document(page_content="alpha")])
+        tool.add_documents([Document(page_content="alpha")])
+        self.assertEqual(provider.texts, ["alpha"])
+
+class FailingEmbeddings(HashEmbeddings):
+    def embed_documents(self, texts):
+        raise RuntimeError("provider down")
+
+class TestIngestionPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        for i in range(5):
+            with open(os.path.join(self.root, f"paper{i}.txt"), "w") as f:
+                f.write("\n\n".join(f"Paper {i} paragraph {j}. " + "word " * 40 for j in range(6)))
+        with open(os.path.join(self.root, "notes.csv"), "w") as f:
+            f.write("ignored")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _pipeline(self, embeddings=None, **kwargs):
+        embeddings = embeddings or HashEmbeddings()
+        tool = FAISSTool(embeddings, dimension=8)
+        settings = dict(chunk_size=300, chunk_overlap=0, batch_size=4, queue_size=1)
+        settings.update(kwargs)
+        return tool, IngestionPipeline(tool, **settings)
+
+    def test_iter_files_filters_by_pattern(self):
+        names = [p.name for p in iter_files([self.root])]
+        self.assertEqual(names, [f"paper{i}.txt" for i in range(5)])
+
+    def test_ingest_chunks_batches_and_skips_indexed_content(self):
+        tool, pipeline = self._pipeline()
+        report = pipeline.ingest_paths([self.root])
+        self.assertEqual(report.documents, 5)
+        self.assertGreater(report.chunks, 5)
+        self.assertEqual(report.indexed, report.chunks)
+        self.assertEqual(tool.vector_store.index.ntotal, report.chunks)
+        self.assertTrue(all(len(t) <= 300 for t in tool.embeddings.texts))
+        chunk = next(t for t in tool.embeddings.texts if t.startswith("Paper 3 paragraph 2."))
+        hit = tool.similarity_search(chunk, k=1)[0]
+        self.assertEqual(hit.metadata["title"], "paper3")
+
+        embedded = len(tool.embeddings.texts)
+        with patch.object(tool, "contains_many", wraps=tool.contains_many) as lookup:
+            again = pipeline.ingest_paths([self.root])
+        self.assertEqual((again.indexed, again.skipped), (0, again.chunks))
+        self.assertEqual(lookup.call_count, -(-again.chunks // 4))   # one lookup per batch of 4
+        self.assertEqual(len(tool.embeddings.texts), embedded)
+
+    def test_process_pool_matches_in_process(self):
+        _, serial = self._pipeline()
+        _, parallel = self._pipeline(workers=2)
+        self.assertEqual(serial.ingest_paths([self.root]).indexed, parallel.ingest_paths([self.root]).indexed)
+
+    def test_records_keep_bibliographic_metadata(self):
+        tool, pipeline = self._pipeline()
+        records = [{"title": "Sparse Attention", "abstract": "We study sparse attention.",
+                    "url": "http://arxiv.org/abs/2401.00001", "source": "arxiv"}] * 2
+        report = pipeline.ingest_records(records)
+        self.assertEqual((report.documents, report.indexed, report.skipped), (2, 1, 1))
+        doc = tool.similarity_search("Sparse Attention", k=1)[0]
+        self.assertEqual(doc.metadata["url"], "http://arxiv.org/abs/2401.00001")
+
+    def test_repeats_across_batches_are_indexed_once(self):
+        tool, pipeline = self._pipeline()
+        records = [{"title": f"Paper {i}", "abstract": f"Abstract {i}."} for i in range(3)] * 10
+        report = pipeline.ingest_records(records)
+        self.assertEqual((report.indexed, report.skipped), (3, 27))
+        self.assertEqual(tool.vector_store.index.ntotal, 3)
+
+    def test_embedding_failure_is_raised(self):
+        _, pipeline = self._pipeline(embeddings=FailingEmbeddings())
+        with self.assertRaises(RuntimeError):
+            pipeline.ingest_paths([self.root])
+
+class StaticSource:
+    """Local stand-in for a search backend."""
+    def __init__(self, name, records, delay=0.0, fail=False, timeout=5.0):
+        self.name = name
+        self.records = records
+        self.delay = delay
+        self.fail = fail
+        self.timeout = timeout
+        self.queries = []
+
+    def search(self, query, k):
+        self.queries.append(query)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return [dict(r, source=self.name) for r in self.records[:k]]
+
+class TestMultiSourceSearch(unittest.TestCase):
+
+    def test_normalize_arxiv_id(self):
+        self.assertEqual(normalize_arxiv_id("http://arxiv.org/abs/2101.00001v3"), "2101.00001")
+        self.assertEqual(normalize_arxiv_id("2101.00001"), "2101.00001")
+        self.assertEqual(normalize_arxiv_id("https://arxiv.org/abs/hep-th/9901001v1"), "hep-th/9901001")
+        self.assertIsNone(normalize_arxiv_id("https://example.com/2101.00001"))
+
+    def test_query_variants(self):
+        variants = query_variants("What are the latest advances in protein folding?", "protein folding")
+        self.assertEqual(variants[0], "What are the latest advances in protein folding?")
+        self.assertIn("protein folding", variants)
+        self.assertIn("advances protein folding", variants)
+
+    def test_fuse_deduplicates_and_ranks(self):
+        arxiv = [
+            {"title": "Attention Is All You Need", "url": "http://arxiv.org/abs/1706.03762v5", "source": "arxiv"},
+            {"title": "Only On arXiv", "arxiv_id": "2001.00001", "source": "arxiv"},
+        ]
+        web = [
+            {"title": "Attention is all you need!", "doi": "10.5555/3295222.3295349", "source": "tavily"},
+            {"title": "Web Only", "url": "https://example.com/x", "source": "tavily"},
+        ]
+        local = [{"title": "Something else", "arxiv_id": "1706.03762", "doi": "10.5555/3295222.3295349",
+                  "abstract": "local abstract", "source": "faiss"}]
+        fused = fuse_results([arxiv, web, local])
+        self.assertEqual(len(fused), 3)
+        top = fused[0]
+        self.assertEqual(top["title"], "Attention Is All You Need")
+        self.assertEqual(top["abstract"], "local abstract")
+        self.assertEqual(sorted(top["sources"]), ["arxiv", "faiss", "tavily"])
+
+    def test_returns_partial_results_at_deadline(self):
+        fast = StaticSource("fast", [{"title": "Fast Paper"}])
+        slow = StaticSource("slow", [{"title": "Slow Paper"}], delay=1.0)
+        broken = StaticSource("broken", [], fail=True)
+        searcher = MultiSourceSearch([fast, slow, broken], deadline=0.2, max_variants=1)
+        start = time.perf_counter()
+        report = searcher.search("graph neural networks")
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual([r["title"] for r in report["results"]], ["Fast Paper"])
+        self.assertEqual(report["timed_out"], ["slow:graph neural networks"])
+        self.assertEqual(report["failed"], ["broken:graph neural networks"])
+
+    def test_per_source_timeout(self):
+        quick = StaticSource("quick", [{"title": "A"}])
+        laggy = StaticSource("laggy", [{"title": "B"}], delay=0.5, timeout=0.1)
+        report = MultiSourceSearch([quick, laggy], deadline=5, max_variants=1).search("q")
+        self.assertEqual([r["title"] for r in report["results"]], ["A"])
+
+    def test_slow_source_does_not_starve_others(self):
+        # One worker per source: the local calls run one after another, so the
+        # last starts after its own timeout has passed since submission.
+        local = StaticSource("local", [{"title": "A"}], delay=0.15, timeout=0.25)
+        remote = StaticSource("remote", [{"title": "B"}], delay=2.0)
+        searcher = MultiSourceSearch([remote, local], deadline=0.8, workers_per_source=1)
+        report = searcher.search("What are the latest advances in protein folding?", "protein folding")
+        self.assertEqual(len(report["queries"]), 3)
+        self.assertEqual(sorted(report["completed"]), sorted(f"local:{q}" for q in report["queries"]))
+        self.assertEqual(sorted(report["timed_out"]), sorted(f"remote:{q}" for q in report["queries"]))
+
+    def test_faiss_source(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8)
+        tool.add_documents([Document(page_content="body", metadata={"title": "Local Paper", "arxiv_id": "2101.00001"})])
+        records = FAISSSource(tool).search("body", 3)
+        self.assertEqual(records[0]["title"], "Local Paper")
+        self.assertEqual(records[0]["source"], "faiss")
+
+class LengthReranker:
+    """Stand-in cross-encoder: prefers shorter texts."""
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, pairs):
+        self.calls += 1
+        return [-len(text) for _, text in pairs]
+
+class TestHybridSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "vector")
+        self.docs = [Document(page_content=f"study {i} of attention for retrieval", metadata={"year": 2019 + i % 6})
+                     for i in range(60)]
+        self.docs.append(Document(page_content="BigBird sparse attention evaluated on TriviaQA",
+                                  metadata={"year": 2021}))
+        self.ids = [f"d{i}" for i in range(len(self.docs))]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bm25_terms_ranking_and_removal(self):
+        self.assertEqual(tokenize("BERT-base and GPT-4 on v1.5"), ["bert-base", "gpt-4", "v1.5"])
+        index = BM25Index.from_documents([("a", "sparse attention"), ("b", "dense attention attention"), ("c", "lora")])
+        self.assertEqual(index.search("sparse attention", k=1)[0][0], "a")
+        self.assertEqual([d for d, _ in index.search("attention", k=5, accept=lambda d: d != "a")], ["b"])
+        index.remove(["a"])
+        self.assertNotIn("a", index)
+        self.assertEqual(index.search("sparse", k=5), [])
+
+    def test_exact_terms_found_by_hybrid_search(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8)
+        tool.add_documents(self.docs, ids=self.ids)
+        dense = tool.similarity_search("BigBird TriviaQA", k=1)
+        hybrid = HybridRetriever(tool).search("BigBird TriviaQA", k=1)
+        self.assertNotEqual(dense[0].page_content, self.docs[-1].page_content)
+        self.assertEqual(hybrid[0].page_content, self.docs[-1].page_content)
+
+        filtered = HybridRetriever(tool).search("attention", k=5, filter={"year": 2024})
+        self.assertEqual(len(filtered), 5)
+        self.assertTrue(all(doc.metadata["year"] == 2024 for doc in filtered))
+
+    def test_batch_matches_single_queries_and_reranks_once(self):
+        embeddings = HashEmbeddings()
+        tool = FAISSTool(embeddings, dimension=8)
+        tool.add_documents(self.docs, ids=self.ids)
+        retriever = HybridRetriever(tool)
+        queries = ["BigBird TriviaQA", "study 7 of attention"]
+        single = [[d.page_content for d in retriever.search(q, k=4)] for q in queries]
+        calls = embeddings.calls
+        batch = [[d.page_content for d in hits] for hits in retriever.search_batch(queries, k=4)]
+        self.assertEqual(batch, single)
+        self.assertEqual(embeddings.calls, calls + 1)
+
+        reranker = LengthReranker()
+        reranked = HybridRetriever(tool, reranker=reranker, rerank_top=10).search_batch(queries, k=2)
+        self.assertEqual(reranker.calls, 1)
+        for hits in reranked:
+            self.assertLessEqual(len(hits[0].page_content), len(hits[1].page_content))
+
+    def test_keyword_index_follows_store_and_snapshots(self):
+        tool = FAISSTool(HashEmbeddings(), persist_path=self.path, dimension=8)
+        tool.add_documents(self.docs, ids=self.ids)
+        tool.delete(["d60"])
+        self.assertEqual(tool.keyword_index.search("TriviaQA", k=1), [])
+        tool.close()
+        self.assertTrue(any(f == "bm25.pkl" for _, _, files in os.walk(self.path) for f in files))
+
+        warm = FAISSTool(HashEmbeddings(), persist_path=self.path)
+        self.assertEqual(len(warm.keyword_index), 60)
+        warm.add_documents([Document(page_content="QLoRA 4-bit finetuning")], ids=["q"])
+        self.assertEqual(warm.keyword_index.search("qlora", k=1)[0][0], "q")
+
+        legacy = FAISSTool(HashEmbeddings(), dimension=8)
+        legacy.add_documents(self.docs[:3], ids=self.ids[:3])
+        legacy.save_local(os.path.join(self.tmp.name, "legacy"))
+        loaded = FAISSTool.load_local(os.path.join(self.tmp.name, "legacy"), HashEmbeddings())
+        self.assertEqual(len(loaded.keyword_index), 3)
+
+class TestMetadataFilters(unittest.TestCase):
+
+    FILTERS = [
+        {"category": "cs.CL"},
+        {"category": ["cs.CL", "cs.IR"]},
+        {"year": {"$gte": 2021, "$lt": 2023}},
+        {"year": {"$nin": [2019, 2020]}, "category": {"$neq": "cs.LG"}},
+        {"published": {"$gt": "2022-06"}},
+        {"$or": [{"year": 2019}, {"category": "cs.IR"}]},
+        {"$not": {"year": {"$in": [2020, 2021]}}},
+        {"venue": "ACL"},
+    ]
+
+    def _docs(self, n):
+        return [Document(page_content=f"paper {i}",
+                         metadata={"year": 2019 + i % 6, "category": ["cs.CL", "cs.IR", "cs.LG"][i % 3],
+                                   "published": f"{2019 + i % 6}-{1 + i % 12:02d}", **({"venue": "ACL"} if i % 7 == 0 else {})})
+                for i in range(n)]
+
+    def test_filters_match_langchain_semantics(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8)
+        tool.add_documents(self._docs(300))
+        for flt in self.FILTERS:
+            with self.subTest(filter=flt):
+                expected = tool.vector_store.similarity_search("paper", k=15, filter=flt, fetch_k=300)
+                self.assertEqual(tool.similarity_search("paper", k=15, filter=flt), expected)
+        self.assertIsNone(filter_fields(lambda metadata: True))
+        with self.assertRaises(ValueError):
+            filter_fields({"year": {"$regex": "20"}})
+
+    def test_selective_filter_returns_k_documents(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8)
+        docs = self._docs(2000)
+        docs[1234].metadata["venue"] = "NeurIPS"
+        docs[1500].metadata["venue"] = "NeurIPS"
+        tool.add_documents(docs)
+        hits = tool.similarity_search("paper", k=5, filter={"venue": "NeurIPS"})
+        self.assertEqual(sorted(d.page_content for d in hits), ["paper 1234", "paper 1500"])
+        hits = tool.similarity_search("paper", k=10, filter={"year": 2024, "category": "cs.LG"})
+        self.assertEqual(len(hits), 10)
+        # Post-filtering the default fetch_k=20 neighbours finds fewer.
+        self.assertLess(len(tool.vector_store.similarity_search("paper", k=10, filter={"year": 2024, "category": "cs.LG"})), 10)
+
+    def test_selectors_on_ivf_and_hnsw(self):
+        for spec in ({"type": "ivf_flat", "nlist": 4, "nprobe": 4, "migrate_threshold": 200},
+                     {"type": "hnsw", "ef_search": 64}):
+            with self.subTest(type=spec["type"]):
+                tool = FAISSTool(HashEmbeddings(), dimension=8, index_spec=spec)
+                tool.add_documents(self._docs(400))
+                tool.wait_for_migration()
+                hits = tool.similarity_search_with_relevance_scores("paper 7", k=8, filter={"year": {"$lte": 2020}})
+                self.assertEqual(len(hits), 8)
+                self.assertTrue(all(doc.metadata["year"] <= 2020 for doc, _ in hits))
+
+    def test_incremental_adds_and_deletes(self):
+        tool = FAISSTool(HashEmbeddings(), dimension=8)
+        tool.add_documents(self._docs(30), ids=[f"d{i}" for i in range(30)])
+        self.assertEqual(len(tool.filter_ids({"year": 2019})), 5)
+        tool.add_embeddings(["new paper"], [HashEmbeddings()._vec("new paper")], metadatas=[{"year": 2019}], ids=["new"])
+        self.assertEqual(tool._metadata_index.size, 31)
+        self.assertIn("new", tool.filter_ids({"year": 2019}))
+        tool.delete(["d0", "d6"])
+        self.assertEqual(tool.filter_ids({"year": 2019}), {"d12", "d18", "d24", "new"})
+        hits = tool.similarity_search("paper", k=10, filter={"year": 2019})
+        self.assertEqual(len(hits), 4)
+
+        index = MetadataIndex(["year"], [{"year": 2020}, {}, {"year": "2021"}, {"year": 2022.5}])
+        self.assertEqual(list(index.mask({"year": {"$gt": 2020}})), [False, False, False, True])
+        self.assertEqual(index.select({"year": {"$neq": 2020}}).count, 3)
+
+class TestShardedFAISSTool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "vector")
+        self.docs = [Document(page_content=f"study {i} of attention for retrieval", metadata={"year": 2019 + i % 6})
+                     for i in range(200)]
+        self.docs.append(Document(page_content="BigBird sparse attention evaluated on TriviaQA",
+                                  metadata={"year": 2021}))
+        self.ids = [f"d{i}" for i in range(len(self.docs))]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_results_match_a_single_store(self):
+        single = FAISSTool(HashEmbeddings(), dimension=8)
+        single.add_documents(self.docs, ids=self.ids)
+        with ShardedFAISSTool(HashEmbeddings(), shards=3, dimension=8) as sharded:
+            sharded.add_documents(self.docs, ids=self.ids)
+            self.assertEqual(len({shard_of(doc_id, 3) for doc_id in self.ids}), 3)
+            for flt in (None, {"year": {"$gte": 2022}}):
+                self.assertEqual(sharded.similarity_search("study 42", k=10, filter=flt),
+                                 single.similarity_search("study 42", k=10, filter=flt))
+            vectors = HashEmbeddings().embed_documents(["study 1", "study 2"])
+            self.assertEqual(sharded.similarity_search_by_vectors(vectors, k=5),
+                             single.similarity_search_by_vectors(vectors, k=5))
+            self.assertEqual(sharded.keyword_search("BigBird", k=3)[0][0], self.ids[-1])
+            hybrid = HybridRetriever(sharded).search("BigBird TriviaQA", k=1)
+            self.assertEqual(hybrid[0].page_content, self.docs[-1].page_content)
+            with self.assertRaises(ValueError):
+                sharded.similarity_search("study", k=5, filter=lambda metadata: True)
+
+    def test_writes_are_routed_and_persisted(self):
+        with ShardedFAISSTool(HashEmbeddings(), shards=2, persist_path=self.path, dimension=8) as sharded:
+            sharded.add_documents(self.docs, ids=self.ids)
+            self.assertTrue(sharded.contains("d7"))
+            self.assertTrue(sharded.delete(["d7", "d8"]))
+            self.assertFalse(sharded.contains("d7"))
+            self.assertEqual(set(sharded.get_documents(["d7", "d9", "d10"])), {"d9", "d10"})
+            with self.assertRaises(ValueError):
+                sharded.delete(["missing"])
+            # IDs on two shards plus a missing one: nothing is deleted.
+            spanning = [self.ids[0]] + [i for i in self.ids if shard_of(i, 2) != shard_of(self.ids[0], 2)][:1]
+            with self.assertRaises(ValueError):
+                sharded.delete(spanning + ["missing"])
+            self.assertEqual(sharded.contains_many(spanning + ["missing"]), set(spanning))
+        with ShardedFAISSTool(HashEmbeddings(), shards=2, persist_path=self.path) as reopened:
+            self.assertEqual(len(reopened.filter_ids({"year": {"$gte": 2019}})), len(self.docs) - 2)
+        with self.assertRaises(ValueError):
+            ShardedFAISSTool(HashEmbeddings(), shards=4, persist_path=self.path)
+
+        unsharded = os.path.join(self.tmp.name, "unsharded")
+        tool = FAISSTool(HashEmbeddings(), persist_path=unsharded, dimension=8, snapshot_every=1)
+        tool.add_documents(self.docs[:2])
+        tool.close()   # joins the background compaction before the directory is checked
+        with self.assertRaises(ValueError):
+            ShardedFAISSTool(HashEmbeddings(), shards=2, persist_path=unsharded)
+
+def fake_arxiv_result(n):
+    import arxiv
+    from datetime import datetime, timezone
+    return arxiv.Result(
+        entry_id=f"http://arxiv.org/abs/2401.0000{n}v1",
+        published=datetime(2024, 1, n, tzinfo=timezone.utc),
+        title=f"Paper {n}",
+        authors=[arxiv.Result.Author("Ada Lovelace"), arxiv.Result.Author("Alan Turing")],
+        summary="abstract " * 100,
+        links=[arxiv.Result.Link(f"http://arxiv.org/pdf/2401.0000{n}v1", title="pdf")],
+    )
+
+class TestArxivSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.pulled = 0
+
+        def results(search, offset=0):
+            for n in range(1, search.max_results + 1):
+                self.pulled += 1
+                yield fake_arxiv_result(n)
+
+        patcher = patch("arxiv.Client")
+        self.client = patcher.start().return_value
+        self.client.results.side_effect = results
+        self.addCleanup(patcher.stop)
+
+    def test_search_streams_lazily(self):
+        papers = ArxivTool().search("graph neural networks", max_results=5)
+        self.assertEqual(self.pulled, 0)
+        first = next(papers)
+        self.assertEqual(self.pulled, 1)
+        self.assertIsInstance(first, ArxivPaper)
+        self.assertEqual(first.arxiv_id, "2401.00001v1")
+        self.assertEqual(first.authors, ["Ada Lovelace", "Alan Turing"])
+        self.assertEqual(first.published, "2024-01-01")
+        self.assertEqual(first.pdf_url, "http://arxiv.org/pdf/2401.00001v1")
+
+    def test_full_text_fetched_once_on_demand(self):
+        paper = next(ArxivTool({"doc_content_chars_max": 9}).search("q", max_results=1))
+        with patch("src.tools.arxiv_tool._pdf_text", return_value="full text of the paper") as fetch:
+            self.assertEqual(paper.full_text(), "full text")
+            paper.full_text()
+        fetch.assert_called_once_with(paper.pdf_url)
+
+    def test_arxiv_source_records(self):
+        records = ArxivSource(ArxivTool()).search("q", 2)
+        self.assertEqual([r["title"] for r in records], ["Paper 1", "Paper 2"])
+        self.assertEqual(records[0]["authors"], "Ada Lovelace, Alan Turing")
+        self.assertEqual(normalize_arxiv_id(records[0]["url"]), "2401.00001")
+        self.assertEqual(records[0]["source"], "arxiv")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file